@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from gevent import spawn
+from gevent.event import AsyncResult
+from gevent.queue import Queue
+from wtforms.validators import ValidationError
+
+from openprocurement.auction.texas.forms import check_bid
+from openprocurement.auction.texas.metrics import Histogram
+from openprocurement.auction.texas.utils import RoundState, lock_server
+
+
+LOGGER = logging.getLogger('Auction Worker Texas')
+
+
+class BidQueueStopped(Exception):
+    pass
+
+
+class BidQueue(object):
+    """
+    FIFO queue of bids which passed form validation. Single committer
+    greenlet takes bids in order of admission, validates each of them
+    against the current round state and adds it, so bids posted at the same
+    moment are decided one after another instead of being rejected.
+
+    Attributes:
+        stats: queue depth, number of processed bids and time bids spent in
+        the queue in seconds
+        :type stats: dict
+        rejections: number of rejected bids by reason, including bids
+        rejected by form validation before admission
+        :type rejections: dict
+        latency: time bids spent waiting in the queue and being committed
+        :type latency: Histogram
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._queue = Queue()
+        self._committer = None
+        self._committing = None
+        self._stopped = False
+        self.stats = {
+            'depth': 0,
+            'max_depth': 0,
+            'submitted': 0,
+            'accepted': 0,
+            'rejected': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+        }
+        self.rejections = {}
+        self.latency = Histogram()
+
+    def start(self):
+        if self._committer is None or self._committer.dead:
+            self._committer = spawn(self._commit_bids)
+        return self._committer
+
+    def stop(self):
+        """
+        Stop committer and reject bids which are waiting in the queue or
+        being committed, so their submitters do not wait forever
+        """
+        self._stopped = True
+        if self._committer is not None:
+            self._committer.kill()
+            self._committer = None
+        pending = [self._committing] if self._committing is not None else []
+        self._committing = None
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait()[2])
+        for result in pending:
+            if not result.ready():
+                self.stats['rejected'] += 1
+                self.reject(BidQueueStopped.__name__)
+                result.set(BidQueueStopped('Auction does not accept bids anymore'))
+        self.stats['depth'] = 0
+
+    def submit(self, bid):
+        """
+        Put bid to the queue and wait for decision
+
+        :return: True if bid was added, ValidationError if it is not valid
+        anymore or exception raised while adding it
+        """
+        if self._stopped:
+            self.reject(BidQueueStopped.__name__)
+            return BidQueueStopped('Auction does not accept bids anymore')
+        self.start()
+        result = AsyncResult()
+        self._queue.put((time.time(), bid, result))
+        self.stats['submitted'] += 1
+        self.stats['depth'] = self._queue.qsize()
+        self.stats['max_depth'] = max(self.stats['max_depth'], self.stats['depth'])
+        return result.get()
+
+    def reject(self, reason):
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+
+    def _commit_bids(self):
+        for admitted, bid, result in self._queue:
+            self._committing = result
+            self.stats['depth'] = self._queue.qsize()
+            try:
+                outcome = self._commit(admitted, bid)
+            except Exception as e:
+                LOGGER.error('Failed to commit bid of {}: {}'.format(bid['bidder_id'], e))
+                outcome = e
+            if outcome is True:
+                self.stats['accepted'] += 1
+            else:
+                self.stats['rejected'] += 1
+                self.reject(outcome.args[0] if isinstance(outcome, ValidationError) else type(outcome).__name__)
+            self._committing = None
+            result.set(outcome)
+
+    def _commit(self, admitted, bid):
+        context = self.app.context
+        with lock_server(context['server_actions']):
+            waited = time.time() - admitted
+            self.stats['wait_total'] += waited
+            self.stats['wait_max'] = max(self.stats['wait_max'], waited)
+            self.latency.observe(waited, 'wait')
+
+            state = context.get('round_state')
+            if state is None:
+                state = RoundState.from_document(context.snapshot('auction_document'))
+            try:
+                check_bid(state, bid['amount'])
+            except ValidationError as e:
+                return e
+            with self.latency.time('commit'):
+                return self.app.bids_handler.add_bid(state.stage_id, bid)
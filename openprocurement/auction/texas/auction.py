@@ -1,10 +1,10 @@
 import logging
 import sys
 from copy import deepcopy
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from zope.component.globalregistry import getGlobalSiteManager
-from yaml import safe_dump as yaml_dump
+import gevent
 from gevent.event import Event
 
 from openprocurement.auction.texas.journal import (
@@ -23,7 +23,7 @@ from openprocurement.auction.utils import (
 )
 from openprocurement.auction.worker_core.constants import TIMEZONE
 
-from openprocurement.auction.texas import utils
+from openprocurement.auction.texas import clock, utils
 from openprocurement.auction.texas.constants import (
     MULTILINGUAL_FIELDS,
     ADDITIONAL_LANGUAGES,
@@ -33,10 +33,10 @@ from openprocurement.auction.texas.constants import (
 )
 from openprocurement.auction.texas.context import IContext
 from openprocurement.auction.texas.datasource import IDataSource
-from openprocurement.auction.texas.database import IDatabase
-from openprocurement.auction.texas.scheduler import IJobService
-from openprocurement.auction.texas.server import run_server
-from openprocurement.auction.texas.scheduler import SCHEDULER
+from openprocurement.auction.texas.database import IDatabase, IJournaledDatabase
+from openprocurement.auction.texas.interfaces import IJobService
+from openprocurement.auction.texas.payload import LazyPayload
+from openprocurement.auction.texas.protocol import serialize_protocol
 
 LOGGER = logging.getLogger('Auction Worker Texas')
 
@@ -44,7 +44,7 @@ LOGGER = logging.getLogger('Auction Worker Texas')
 class Auction(object):
     """Auction Worker Class"""
 
-    def __init__(self, tender_id, worker_defaults={}, debug=False):
+    def __init__(self, tender_id, worker_defaults={}, debug=False, registry=None, router=None):
         super(Auction, self).__init__()
         self.tender_id = tender_id
         self.debug = debug
@@ -55,8 +55,13 @@ class Auction(object):
         self.bidders_count = 0
         self.bidders_data = []
         self.bids_mapping = {}
+        self.bidders_index = frozenset()
+        # Router of shared server if auction is hosted with other auctions
+        # in one process, own server is started otherwise
+        self.router = router
 
-        gsm = getGlobalSiteManager()
+        gsm = registry if registry is not None else getGlobalSiteManager()
+        self.registry = gsm
 
         self.datasource = gsm.queryUtility(IDataSource)
         self.database = gsm.queryUtility(IDatabase)
@@ -66,6 +71,9 @@ class Auction(object):
         self.context['end_auction_event'] = self._end_auction_event
 
     def schedule_auction(self):
+        if IJournaledDatabase.providedBy(self.database):
+            # Persist document states acknowledged before restart
+            self.database.replay_journal(self.context['auction_doc_id'])
         self.context['auction_document'] = self.database.get_auction_document(
             self.context['auction_doc_id']
         )
@@ -79,6 +87,7 @@ class Auction(object):
             self.context['auction_data'] = deepcopy(self._auction_data)
             self.context['bidders_data'] = deepcopy(self.bidders_data)
             self.context['bids_mapping'] = deepcopy(self.bids_mapping)
+            self.context['bidders_index'] = self.bidders_index
             self.auction_protocol = utils.prepare_auction_protocol(self.context)
             self.context['auction_protocol'] = deepcopy(self.auction_protocol)
 
@@ -88,14 +97,11 @@ class Auction(object):
             utils.set_absolute_deadline(self.context, self.startDate)
 
         # Add job that starts auction server
-        SCHEDULER.add_job(
+        self.job_service.add_start_auction_job(
             self.start_auction,
-            'date',
-            run_date=utils.convert_datetime(
+            utils.convert_datetime(
                 self.context['auction_document']['stages'][0]['start']
-            ),
-            name="Start of Auction",
-            id="auction:start"
+            )
         )
 
         # Add job that switch current_stage to round stage
@@ -106,24 +112,37 @@ class Auction(object):
         start = utils.convert_datetime(self.context['auction_document']['stages'][1]['start']) + timedelta(seconds=ROUND_DURATION)
         self.job_service.add_ending_main_round_job(start)
 
-        self.server = run_server(
-            self,
-            None,  # TODO: add mapping expire
-            LOGGER
-        )
+        # Server is imported only by commands which run auction
+        if self.router is not None:
+            from openprocurement.auction.texas.server import mount_server
+            self.server = mount_server(
+                self,
+                self.router,
+                None,  # TODO: add mapping expire
+                LOGGER
+            )
+        else:
+            from openprocurement.auction.texas.server import run_server
+            self.server = run_server(
+                self,
+                None,  # TODO: add mapping expire
+                LOGGER
+            )
         self.context['server'] = self.server
 
     def wait_to_end(self):
         request_id = generate_request_id()
 
         self._end_auction_event.wait()
+        if IJournaledDatabase.providedBy(self.database):
+            self.database.close()
         LOGGER.info("Stop auction worker",
                     extra={"JOURNAL_REQUEST_ID": request_id,
                            "MESSAGE_ID": AUCTION_WORKER_SERVICE_STOP_AUCTION_WORKER})
 
     def start_auction(self):
         request_id = generate_request_id()
-        self.auction_protocol['timeline']['auction_start']['time'] = datetime.now(TIMEZONE).isoformat()
+        self.auction_protocol['timeline']['auction_start']['time'] = clock.now(TIMEZONE).isoformat()
 
         LOGGER.info(
             '---------------- Start auction  ----------------',
@@ -147,7 +166,7 @@ class Auction(object):
                 LOGGER.info("Auction {} canceled".format(self.context['auction_doc_id']),
                             extra={'MESSAGE_ID': AUCTION_WORKER_SERVICE_AUCTION_CANCELED})
                 auction_document["current_stage"] = -100
-                auction_document["endDate"] = datetime.now(TIMEZONE).isoformat()
+                auction_document["endDate"] = clock.now(TIMEZONE).isoformat()
                 LOGGER.info("Change auction {} status to 'canceled'".format(self.context['auction_doc_id']),
                             extra={'MESSAGE_ID': AUCTION_WORKER_SERVICE_AUCTION_STATUS_CANCELED})
         else:
@@ -209,10 +228,9 @@ class Auction(object):
         auction_protocol['timeline']['auction_start']['time'] = auction_document['stages'][0]['start']
         auction_protocol['timeline']['results']['time'] = auction_document['stages'][-1]['start']
         LOGGER.info(
-            'Audit data: \n {}'.format(yaml_dump(auction_protocol)),
+            'Audit data: \n %s', LazyPayload(auction_protocol, serialize_protocol, audit=True),
             extra={"JOURNAL_REQUEST_ID": request_id}
         )
-        LOGGER.info(auction_protocol)
         self.context['auction_document'] = auction_document
         self.context['auction_protocol'] = auction_protocol
 
@@ -275,19 +293,11 @@ class Auction(object):
 
         self._prepare_auction_document_data(auction_document)
 
-        if self.worker_defaults.get('sandbox_mode', False):
-            pause, main_round = utils.prepare_auction_stages(
-                self.startDate,
-                deepcopy(auction_document),
-                self.context.get('deadline'),
-                fast_forward=True
-            )
-        else:
-            pause, main_round = utils.prepare_auction_stages(
-                self.startDate,
-                deepcopy(auction_document),
-                self.context.get('deadline')
-            )
+        pause, main_round = utils.prepare_auction_stages(
+            self.startDate,
+            deepcopy(auction_document),
+            self.context.get('deadline')
+        )
 
         auction_document['stages'] = [pause, main_round]
         self.database.save_auction_document(
@@ -366,11 +376,15 @@ class Auction(object):
         # Get auction from api and set it to _auction_data
         request_id = generate_request_id()
         if prepare:
-            self._auction_data = self.datasource.get_data()
+            # Public and private views are independent, so fetch them concurrently
+            public = gevent.spawn(self.datasource.get_data)
+            private = gevent.spawn(self.datasource.get_data, public=False)
+            gevent.joinall([public, private])
+            self._auction_data = public.get()
+            auction_data = private.get()
         else:
             self._auction_data = {'data': {}}
-
-        auction_data = self.datasource.get_data(public=False)
+            auction_data = self.datasource.get_data(public=False)
 
         if auction_data:
             self._auction_data['data'].update(auction_data['data'])
@@ -395,6 +409,9 @@ class Auction(object):
                     "MESSAGE_ID": AUCTION_WORKER_API_AUCTION_NOT_EXIST
                 })
                 self._end_auction_event.set()
+                if self.router is not None:
+                    # Hosted auction must not stop other auctions of the process
+                    raise RuntimeError("Auction {} not exists".format(self.context['auction_doc_id']))
                 sys.exit(1)
 
     def _set_start_date(self):
@@ -434,6 +451,8 @@ class Auction(object):
                 self.bids_mapping[self.bidders_data[index]['id']] = generated_bid_number
                 bid['bidNumber'] = generated_bid_number
                 existed_numbers.append(generated_bid_number)
+        # Immutable, so it is shared with the server without copying
+        self.bidders_index = frozenset(bid['id'] for bid in self.bidders_data)
 
     @property
     def relative_deadline_for_sandbox_mode(self):
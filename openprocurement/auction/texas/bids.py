@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import logging
+from bisect import bisect_left, bisect_right
 
 from zope.component import getGlobalSiteManager
 
@@ -10,7 +11,6 @@ from openprocurement.auction.texas.context import IContext
 from openprocurement.auction.texas.constants import ROUND_DURATION
 from openprocurement.auction.texas.database import IDatabase
 from openprocurement.auction.texas.scheduler import IJobService
-from openprocurement.auction.texas.scheduler import SCHEDULER
 from openprocurement.auction.texas.journal import (
     AUCTION_WORKER_SERVICE_END_BID_STAGE,
     AUCTION_WORKER_SERVICE_START_NEXT_STAGE
@@ -23,88 +23,178 @@ from openprocurement.auction.texas.utils import (
 LOGGER = logging.getLogger("Auction Worker Texas")
 
 
+class ResultsIndex(object):
+    """
+    Index of auction results ordered by amount in descending order
+
+    Keeps the order produced by sorting_by_amount: results with equal
+    amounts stay in the order they had before the update, a result of new
+    bidder goes after them.
+
+    Position of result is found by binary search, but results list is
+    still updated with list.insert and del, which are linear. Results hold
+    one entry per bidder, so the lists stay short.
+
+    Attributes:
+        keys: Negated amounts of results in the same order as results
+        :type keys: list
+        bidders: Bidder identifiers in the same order as results
+        :type bidders: list
+        amounts: Mapping of bidder identifier to negated amount of result
+        :type amounts: dict
+    """
+
+    def __init__(self, results):
+        self.keys = [-result['amount'] for result in results]
+        self.bidders = [result['bidder_id'] for result in results]
+        self.amounts = dict(zip(self.bidders, self.keys))
+
+    @staticmethod
+    def is_ordered(results):
+        return all(
+            results[i]['amount'] >= results[i + 1]['amount']
+            for i in xrange(len(results) - 1)
+        )
+
+    def matches(self, results):
+        """
+        Check that index describes provided results list: every result has
+        the bidder and the amount kept by index at its position
+        """
+        if len(results) != len(self.bidders):
+            return False
+        return all(
+            result['bidder_id'] == bidder_id and -result['amount'] == key
+            for result, bidder_id, key in zip(results, self.bidders, self.keys)
+        )
+
+    def _position(self, bidder_id):
+        key = self.amounts.get(bidder_id)
+        if key is None:
+            return None
+        lo = bisect_left(self.keys, key)
+        hi = bisect_right(self.keys, key, lo)
+        return lo + self.bidders[lo:hi].index(bidder_id)
+
+    def update(self, results, result):
+        """
+        Replace result of the same bidder or add new one keeping results ordered
+
+        :param results: ordered results list described by this index
+        :param result: new result of bidder
+        :return:
+        """
+        bidder_id = result['bidder_id']
+        key = -result['amount']
+        index = self._position(bidder_id)
+        if index is None:
+            index = len(results)
+        else:
+            del results[index], self.keys[index], self.bidders[index]
+        lo = bisect_left(self.keys, key)
+        hi = bisect_right(self.keys, key, lo)
+        position = min(max(index, lo), hi)
+        results.insert(position, result)
+        self.keys.insert(position, key)
+        self.bidders.insert(position, bidder_id)
+        self.amounts[bidder_id] = key
+
+
 class BidsHandler(object):
     """
     Class for work with bids data
     """
-    def __init__(self):
-        gsm = getGlobalSiteManager()
+    def __init__(self, registry=None):
+        gsm = registry if registry is not None else getGlobalSiteManager()
         self.context = gsm.queryUtility(IContext)
         self.database = gsm.queryUtility(IDatabase)
         self.job_service = gsm.queryUtility(IJobService)
+        self._results_index = None
+
+    def _get_results_index(self, results):
+        if self._results_index is None or not self._results_index.matches(results):
+            if not ResultsIndex.is_ordered(results):
+                results[:] = sorting_by_amount(results)
+            self._results_index = ResultsIndex(results)
+        return self._results_index
 
     def add_bid(self, current_stage, bid):
+        request_id = generate_request_id()
         LOGGER.info(
             '------------------ Adding bid ------------------',
         )
-        # Updating auction document with bid data
-        with utils.update_auction_document(self.context, self.database) as auction_document:
-            try:
-                bid['bidder_name'] = self.context['bids_mapping'].get(bid['bidder_id'], False)
-                result = utils.prepare_results_stage(**bid)
-                auction_document['stages'][current_stage].update(result)
-                results = auction_document['results']
-                bid_index = next((i for i, res in enumerate(results)
-                                  if res['bidder_id'] == bid['bidder_id']), None)
-                if bid_index is not None:
-                    results[bid_index] = result
-                else:
-                    results.append(result)
-                auction_document['results'] = sorting_by_amount(results)
-            except Exception as e:
-                LOGGER.fatal(
-                    "Exception during adding bid. "
-                    "Error: {}".format(e)
+        # Bid result, auction protocol entry and new stages are prepared
+        # in memory and saved to database with one write
+        try:
+            with utils.update_auction_document(self.context, self.database) as auction_document:
+                self.apply_bid(auction_document, current_stage, bid)
+                auction_protocol = approve_auction_protocol_info_on_bids_stage(
+                    auction_document, self.context['auction_protocol']
                 )
-                return e
-        self.end_bid_stage(bid)
+                main_round = self.end_bid_stage(auction_document, bid, request_id)
+        except Exception as e:
+            # Document was not saved, so index may describe unsaved results
+            self._results_index = None
+            LOGGER.fatal(
+                "Exception during adding bid. "
+                "Error: {}".format(e)
+            )
+            return e
+        self.context['auction_protocol'] = auction_protocol
+
+        LOGGER.info('---------------- Start stage {0} ----------------'.format(
+            auction_document["current_stage"]),
+            extra={"JOURNAL_REQUEST_ID": request_id,
+                   "MESSAGE_ID": AUCTION_WORKER_SERVICE_START_NEXT_STAGE}
+        )
+        self.schedule_next_stage(main_round)
         return True
 
-    def end_bid_stage(self, bid):
-        request_id = generate_request_id()
+    def apply_bid(self, auction_document, current_stage, bid):
+        """
+        Update bid stage and auction results with bid data
+        """
+        bid['bidder_name'] = self.context['bids_mapping'].get(bid['bidder_id'], False)
+        result = utils.prepare_results_stage(**bid)
+        auction_document['stages'][current_stage].update(result)
+        results = auction_document['results']
+        self._get_results_index(results).update(results, result)
+
+    def end_bid_stage(self, auction_document, bid, request_id=None):
+        """
+        Append pause and next main round stages to auction document and
+        switch current stage to the pause
+
+        :return: next main round stage or empty dict if round can't start
+                 before deadline
+        """
         LOGGER.info(
             '---------------- End Bids Stage ----------------',
             extra={"JOURNAL_REQUEST_ID": request_id,
                    "MESSAGE_ID": AUCTION_WORKER_SERVICE_END_BID_STAGE}
         )
-
-        # Cleaning up preplanned jobs
-        SCHEDULER.remove_all_jobs()
-
-        # Update auction protocol
-        auction_protocol = approve_auction_protocol_info_on_bids_stage(
-            self.context['auction_document'], self.context['auction_protocol']
+        # Creating new stages
+        bid_document = {
+            'value': {'amount': bid['amount']},
+            'minimalStep': auction_document['minimalStep']
+        }
+
+        pause, main_round = utils.prepare_auction_stages(
+            utils.convert_datetime(bid['time']),
+            bid_document,
+            self.context.get('deadline')
         )
-        self.context['auction_protocol'] = auction_protocol
 
-        with utils.update_auction_document(self.context, self.database) as auction_document:
-            # Creating new stages
-            bid_document = {
-                'value': {'amount': bid['amount']},
-                'minimalStep': auction_document['minimalStep']
-            }
-
-            pause, main_round = utils.prepare_auction_stages(
-                utils.convert_datetime(bid['time']),
-                bid_document,
-                self.context.get('deadline'),
-                fast_forward=self.context['worker_defaults'].get('sandbox_mode', False)
-            )
-
-            auction_document['stages'].append(pause)
-            if main_round:
-                auction_document['stages'].append(main_round)
-
-            # Updating current stage
-            auction_document["current_stage"] += 1
+        auction_document['stages'].append(pause)
+        if main_round:
+            auction_document['stages'].append(main_round)
 
-        LOGGER.info('---------------- Start stage {0} ----------------'.format(
-            self.context['auction_document']["current_stage"]),
-            extra={"JOURNAL_REQUEST_ID": request_id,
-                   "MESSAGE_ID": AUCTION_WORKER_SERVICE_START_NEXT_STAGE}
-        )
+        # Updating current stage
+        auction_document["current_stage"] += 1
+        return main_round
 
-        # Adding jobs to scheduler
+    def schedule_next_stage(self, main_round):
+        # Moving preplanned jobs, jobs of other auctions are left untouched
         deadline = self.context.get('deadline')
 
         if main_round:
@@ -116,4 +206,5 @@ class BidsHandler(object):
             self.job_service.add_pause_job(round_start_date)
             self.job_service.add_ending_main_round_job(round_end_date)
         else:
+            self.job_service.remove_job('pause')
             self.job_service.add_ending_main_round_job(deadline)
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+from collections import deque
+
+from gevent import sleep, spawn, spawn_later
+from gevent.queue import Queue, Full, Empty
+
+from openprocurement.auction.texas import clock
+from openprocurement.auction.texas.snapshot import freeze
+
+
+LOGGER = logging.getLogger('Auction Worker Texas')
+
+SSE_BUFFER_SIZE = 100
+SSE_RETRY = 2000
+DELTAS_HISTORY_SIZE = 500
+
+# Marker which ends stream of a closed channel
+CLOSE = object()
+
+
+def encode_event(event, data):
+    """
+    Encode SSE frame. The result is the same for every client, so it is
+    computed once per event and shared by all channels.
+    """
+    lines = ['event: {}'.format(event)] if event else []
+    lines.extend('data: {}'.format(line) for line in json.dumps(data).splitlines())
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def encode_retry(retry):
+    return 'retry: {}\n\n'.format(retry).encode('utf-8')
+
+
+class Channel(object):
+    """
+    Bounded buffer of encoded frames of one client. Client which does not
+    read frames fast enough is dropped when the buffer is full, its stream
+    is ended and the browser reconnects.
+    """
+
+    def __init__(self, size=SSE_BUFFER_SIZE):
+        self._queue = Queue(size + 1)  # one more slot is reserved for CLOSE
+        self.size = size
+        self.closed = False
+
+    def put(self, frame):
+        if self.closed:
+            return False
+        if self._queue.qsize() >= self.size:
+            self.close()
+            return False
+        self._queue.put_nowait(frame)
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                break
+        try:
+            self._queue.put_nowait(CLOSE)
+        except Full:
+            pass
+
+    def __iter__(self):
+        while True:
+            frame = self._queue.get()
+            if frame is CLOSE:
+                return
+            yield frame
+
+
+class BroadcastBus(object):
+    """
+    Fan-out of SSE events to connected clients of one auction.
+
+    Every event is encoded once and the same bytes object is put to the
+    channels of all recipients.
+
+    Attributes:
+        buffer_size: max number of frames waiting to be sent to a client
+        :type buffer_size: int
+        stats: counters of published frames, deliveries and dropped clients
+        :type stats: dict
+    """
+
+    def __init__(self, buffer_size=SSE_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._channels = {}
+        self.stats = {'frames': 0, 'deliveries': 0, 'dropped': 0}
+
+    def subscribe(self, bidder_id, client_id):
+        """
+        Create channel for client, previous channel of the same client is
+        closed
+        """
+        channels = self._channels.setdefault(bidder_id, {})
+        previous = channels.get(client_id)
+        if previous is not None:
+            previous.close()
+        channel = channels[client_id] = Channel(self.buffer_size)
+        return channel
+
+    def unsubscribe(self, bidder_id, client_id, channel=None):
+        """
+        Close channel of client. If channel is given, it is closed only if it
+        is still the current channel of client
+        """
+        channels = self._channels.get(bidder_id, {})
+        current = channels.get(client_id)
+        if current is None or (channel is not None and current is not channel):
+            return
+        del channels[client_id]
+        if not channels:
+            del self._channels[bidder_id]
+        current.close()
+
+    def clients(self, bidder_id=None):
+        if bidder_id is not None:
+            return self._channels.get(bidder_id, {}).keys()
+        return [
+            (bidder, client) for bidder, channels in self._channels.items()
+            for client in channels
+        ]
+
+    def publish(self, event, data, bidder_id=None):
+        """
+        Send event to all clients of bidder or to everyone if bidder is not
+        given
+        """
+        self.publish_frame(encode_event(event, data), bidder_id)
+
+    def publish_frame(self, frame, bidder_id=None):
+        self.stats['frames'] += 1
+        if bidder_id is not None:
+            recipients = [(bidder_id, self._channels.get(bidder_id, {}))]
+        else:
+            recipients = self._channels.items()
+        for bidder, channels in recipients:
+            for client, channel in channels.items():
+                self._deliver(bidder, client, channel, frame)
+
+    def send(self, bidder_id, client_id, event, data):
+        return self.send_frame(bidder_id, client_id, encode_event(event, data))
+
+    def send_frame(self, bidder_id, client_id, frame):
+        channel = self._channels.get(bidder_id, {}).get(client_id)
+        if channel is None:
+            return False
+        self.stats['frames'] += 1
+        return self._deliver(bidder_id, client_id, channel, frame)
+
+    def _deliver(self, bidder_id, client_id, channel, frame):
+        if channel.put(frame):
+            self.stats['deliveries'] += 1
+            return True
+        self.stats['dropped'] += 1
+        LOGGER.warning('Drop slow client {} of bidder {}'.format(client_id, bidder_id))
+        self.unsubscribe(bidder_id, client_id, channel)
+        return False
+
+
+def _escape(key):
+    return unicode(key).replace('~', '~0').replace('/', '~1')
+
+
+def document_diff(old, new, path=''):
+    """
+    Return list of JSON patch operations which turn old document into new
+    one. Changed items of lists are replaced as a whole, so a changed stage
+    or result is sent in one operation. Shared nodes are skipped without
+    comparison.
+    """
+    if old is new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = []
+        for key in old:
+            if key not in new:
+                patch.append({'op': 'remove', 'path': '{}/{}'.format(path, _escape(key))})
+        for key in new:
+            key_path = '{}/{}'.format(path, _escape(key))
+            if key not in old:
+                patch.append({'op': 'add', 'path': key_path, 'value': new[key]})
+            else:
+                patch.extend(document_diff(old[key], new[key], key_path))
+        return patch
+    if isinstance(old, list) and isinstance(new, list):
+        patch = []
+        for index in range(min(len(old), len(new))):
+            if old[index] is not new[index] and old[index] != new[index]:
+                patch.append({'op': 'replace', 'path': '{}/{}'.format(path, index), 'value': new[index]})
+        for index in range(len(old), len(new)):
+            patch.append({'op': 'add', 'path': '{}/{}'.format(path, index), 'value': new[index]})
+        for index in reversed(range(len(new), len(old))):
+            patch.append({'op': 'remove', 'path': '{}/{}'.format(path, index)})
+        return patch
+    if old != new:
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    return []
+
+
+class DocumentFeed(object):
+    """
+    Publishes changes of auction document to connected clients as numbered
+    deltas. Last deltas are kept, so reconnected client which passes
+    sequence number of the last received delta gets only the missed ones.
+
+    Published document is kept as a frozen snapshot which shares unchanged
+    stages and results with the previous one, so neither copying of the
+    whole document nor diff of its unchanged parts is needed.
+
+    Committers, which change document under server lock, schedule it for
+    publishing instead, so the document is compared with the published
+    one after the lock is released.
+    """
+
+    def __init__(self, bus, document=None, history_size=DELTAS_HISTORY_SIZE):
+        self.bus = bus
+        self.seq = 0
+        self._document = freeze(document or {})
+        self._history = deque(maxlen=history_size)
+        self._pending = None
+        self._publisher = None
+
+    def schedule(self, document):
+        """
+        Publish document when current greenlet yields. Documents scheduled
+        before that are published as one delta.
+
+        :param document: committed auction document, which must not be
+            changed afterwards
+        """
+        self._pending = document
+        if self._publisher is None:
+            self._publisher = spawn(self.flush)
+
+    def flush(self):
+        """
+        Publish scheduled document now
+
+        :return: published delta or None
+        """
+        document, self._pending = self._pending, None
+        self._publisher = None
+        if document is None:
+            return None
+        return self.publish(document)
+
+    def publish(self, document):
+        snapshot = freeze(document, self._document)
+        if snapshot is self._document:
+            return None
+        patch = document_diff(self._document, snapshot)
+        self._document = snapshot
+        if not patch:
+            return None
+        self.seq += 1
+        delta = {'seq': self.seq, 'patch': patch}
+        frame = encode_event('DocumentDelta', delta)
+        self._history.append((self.seq, frame))
+        self.bus.publish_frame(frame)
+        return delta
+
+    def resume(self, bidder_id, client_id, seq):
+        """
+        Send client deltas published after seq, or the whole document if
+        they are not kept anymore
+        """
+        if seq == self.seq:
+            return
+        if self._history and self._history[0][0] <= seq + 1 <= self.seq:
+            for delta_seq, frame in self._history:
+                if delta_seq > seq:
+                    self.bus.send_frame(bidder_id, client_id, frame)
+        else:
+            self.bus.send(
+                bidder_id, client_id, 'DocumentSnapshot',
+                {'seq': self.seq, 'document': self._document}
+            )
+
+
+class BroadcastStream(object):
+    """
+    Iterable response body which sends frames of a channel to the client
+    and unsubscribes it when the connection is closed
+
+    :param timeout: seconds after which stream is closed, 0 for endless stream
+    :param clients: connected clients of bidder, client is removed from them
+                    and the rest of clients get new ClientsList when the
+                    stream is closed and the client has not reconnected
+    """
+
+    def __init__(self, bus, bidder_id, client_id, channel, timeout=0, clients=None):
+        self.bus = bus
+        self.bidder_id = bidder_id
+        self.client_id = client_id
+        self.channel = channel
+        self.clients = clients
+        self.retry = 0 if timeout else SSE_RETRY
+        if timeout:
+            spawn_later(timeout, channel.close)
+
+    def __iter__(self):
+        yield encode_retry(self.retry)
+        for frame in self.channel:
+            yield frame
+        self.close()
+
+    def close(self):
+        self.bus.unsubscribe(self.bidder_id, self.client_id, self.channel)
+        if self.clients is None or self.client_id in self.bus.clients(self.bidder_id):
+            return
+        if self.clients.pop(self.client_id, None) is not None:
+            self.bus.publish('ClientsList', self.clients, bidder_id=self.bidder_id)
+
+
+def push_timestamps_events(app):
+    # Tick is sent to every client every second, so it is the main user of
+    # the single encoding
+    while True:
+        sleep(1)
+        app.broadcast_bus.publish('Tick', {'time': clock.now(app.config['timezone']).isoformat()})
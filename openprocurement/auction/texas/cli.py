@@ -1,25 +1,52 @@
 # -*- coding: utf-8 -*-
+import time
+STARTED_AT = time.time()
+
 from gevent import monkey
 monkey.patch_all()
 
 import argparse
+import json
 import logging.config
 import os
+import signal
 import sys
+from copy import copy, deepcopy
 
+import gevent
 import yaml
+from gevent.fileobject import FileObject
 from gevent.lock import BoundedSemaphore
+from gevent.pool import Pool
 from zope.component.globalregistry import getGlobalSiteManager
+from zope.interface.registry import Components
 
 from openprocurement.auction.utils import check
 from openprocurement.auction.worker_core import constants as C
 
-from openprocurement.auction.texas.auction import Auction, SCHEDULER
-from openprocurement.auction.texas.constants import DEADLINE_HOUR
+from openprocurement.auction.texas.auction import Auction
+from openprocurement.auction.texas.clock import prepare_clock, set_clock
+from openprocurement.auction.texas.payload import configure_payload_logging
+from openprocurement.auction.texas.constants import (
+    BATCH_PLANNING_CONCURRENCY, DEADLINE_HOUR, STARTUP_TIME_BUDGET
+)
 from openprocurement.auction.texas.context import prepare_context, IContext
 from openprocurement.auction.texas.database import prepare_database, IDatabase
-from openprocurement.auction.texas.datasource import prepare_datasource, IDataSource
-from openprocurement.auction.texas.scheduler import prepare_job_service, IJobService
+from openprocurement.auction.texas.datasource import (
+    prepare_datasource, prepare_datasource_resources, IDataSource
+)
+from openprocurement.auction.texas.interfaces import IJobService
+from openprocurement.auction.texas.journal import AUCTION_WORKER_SERVICE_STARTUP
+from openprocurement.auction.texas.router import AuctionsRouter
+
+# Server and scheduler are imported only by commands which use them, so
+# short commands like planning, announce or cancel do not load Flask,
+# WTForms and APScheduler
+
+try:
+    from gevent import signal_handler
+except ImportError:  # gevent < 1.5
+    from gevent import signal as signal_handler
 
 
 logging.addLevelName(25, 'CHECK')
@@ -27,14 +54,92 @@ logging.Logger.check = check
 
 LOGGER = logging.getLogger('Auction Worker Texas')
 
+# Commands which are executed by worker daemon and methods of Auction
+# which implement them
+DAEMON_COMMANDS_MAPPING = {
+    'planning': 'prepare_auction_document',
+    'announce': 'post_announce',
+    'post_results': 'post_auction_results',
+    'cancel': 'cancel_auction',
+    'reschedule': 'reschedule_auction',
+    'post_auction_protocol': 'post_auction_protocol',
+}
+
+# Commands which wait for end of auctions and so flush journaled documents
+# of write-behind database before exit, other commands save documents
+# directly
+WRITE_BEHIND_COMMANDS = ('run', 'host')
+
+
+class StartupReport(object):
+    """
+    Time spent by command before it starts its work, split into phases.
+    The first phase is measured from the import of this module, so it
+    covers modules imported by it, but not start of the interpreter.
+
+    Attributes:
+        phases: list of (name, duration in seconds) pairs
+        :type phases: list
+        budget: total start-up time in seconds, the report is logged as
+        warning when it is exceeded
+        :type budget: float
+    """
 
-def register_utilities(worker_config, args):
+    def __init__(self, started_at=STARTED_AT, budget=STARTUP_TIME_BUDGET):
+        self.started_at = self._last = started_at
+        self.budget = budget
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.time()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.started_at
+
+    def log(self, cmd):
+        extra = {
+            'MESSAGE_ID': AUCTION_WORKER_SERVICE_STARTUP,
+            'JOURNAL_COMMAND': cmd,
+            'JOURNAL_STARTUP_DURATION': '{:.6f}'.format(self.total),
+        }
+        for phase, duration in self.phases:
+            extra['JOURNAL_STARTUP_{}'.format(phase.upper())] = '{:.6f}'.format(duration)
+        log = LOGGER.warning if self.total > self.budget else LOGGER.info
+        log(
+            'Command {} started in {:.3f}s ({})'.format(
+                cmd, self.total, ', '.join('{} {:.3f}s'.format(phase, duration) for phase, duration in self.phases)
+            ),
+            extra=extra
+        )
+
+
+def register_utilities(worker_config, args, registry=None, resources=None, with_job_service=True):
+    """
+    Prepare auction utilities and register them in global site manager or
+    in provided registry. Job service of auction with own registry adds jobs
+    to the shared SCHEDULER with auction specific identifiers.
+
+    Auctions registered with the same 'resources' dict share one database
+    and HTTP sessions of datasource. Job service and the scheduler are not
+    prepared for commands which do not schedule jobs.
+    """
     auction_id = args.auction_doc_id
-    gsm = getGlobalSiteManager()
+    if registry is None:
+        gsm = getGlobalSiteManager()
+    else:
+        gsm = registry
     exceptions = []
     init_functions = []
 
-    database = prepare_database(worker_config.get('database', {}))
+    if resources is not None and 'database' in resources:
+        database = resources['database']
+    else:
+        database = prepare_database(worker_config.get('database', {}))
+        if resources is not None:
+            resources['database'] = database
     doc = database.get_auction_document(auction_id)
 
     # Initializing datasource
@@ -45,15 +150,21 @@ def register_utilities(worker_config, args):
         datasource_config = worker_config.get('datasource', {})
     datasource_config.update(auction_id=auction_id)
     worker_config['datasource'] = datasource_config
+    datasource_args = (datasource_config,) if resources is None else (datasource_config, resources)
     init_functions.append(
-        (prepare_datasource, (datasource_config,), 'datasource', IDataSource)
+        (prepare_datasource, datasource_args, 'datasource', IDataSource)
     )
 
     # Initializing database
-    database_config = worker_config.get('database', {})
-    init_functions.append(
-        (prepare_database, (database_config,), 'database', IDatabase)
-    )
+    if resources is None:
+        database_config = worker_config.get('database', {})
+        init_functions.append(
+            (prepare_database, (database_config,), 'database', IDatabase)
+        )
+    else:
+        init_functions.append(
+            (lambda: database, (), 'database', IDatabase)
+        )
 
     # Initializing context
     context_config = worker_config.get('context', {})
@@ -62,9 +173,15 @@ def register_utilities(worker_config, args):
     )
 
     # Initializing JobService
-    init_functions.append(
-        (prepare_job_service, (), 'job_service', IJobService)
-    )
+    if with_job_service:
+        from openprocurement.auction.texas.scheduler import prepare_job_service, SCHEDULER
+        if registry is None:
+            job_service_args = ()
+        else:
+            job_service_args = (registry, SCHEDULER, 'auction:{}'.format(auction_id))
+        init_functions.append(
+            (prepare_job_service, job_service_args, 'job_service', IJobService)
+        )
 
     # Checking and registering utilities
     for init_function, args, utility_name, interface in init_functions:
@@ -102,10 +219,190 @@ def register_utilities(worker_config, args):
     context['server_actions'] = BoundedSemaphore()
 
 
+def iter_auction_ids(value):
+    """
+    Auction identifiers for host and batch modes are passed as comma
+    separated list, path to file with one identifier per line or '-' to
+    read them from stdin. Identifiers from stdin are yielded as soon as
+    they are read, without blocking other greenlets.
+    """
+    if value == '-':
+        lines = FileObject(sys.stdin)
+    elif os.path.isfile(value):
+        with open(value) as auction_ids_file:
+            lines = auction_ids_file.read().splitlines()
+    else:
+        lines = value.split(',')
+    for line in lines:
+        for auction_id in line.split():
+            yield auction_id
+
+
+def parse_auction_ids(value):
+    return list(iter_auction_ids(value))
+
+
+def release_hosted_auction(auction):
+    server = auction.context.get('server')
+    if server:
+        server.stop()
+    auction.job_service.remove_jobs()
+
+
+def wait_hosted_auction(auction):
+    auction.wait_to_end()
+    release_hosted_auction(auction)
+
+
+def host_auctions(worker_defaults, args, report=None):
+    """
+    Run several auctions in one process. Auctions share one server, which
+    routes requests by auction_doc_id, and one scheduler, every auction has
+    own context, database, datasource and job service.
+    """
+    from openprocurement.auction.texas.scheduler import SCHEDULER
+    from openprocurement.auction.texas.server import run_router_server
+
+    router = AuctionsRouter()
+    server = run_router_server(router, worker_defaults, LOGGER)
+    SCHEDULER.start()
+    if report is not None:
+        report.mark('server')
+        report.log(args.cmd)
+
+    auctions = []
+    for auction_doc_id in parse_auction_ids(args.auction_doc_id):
+        auction_args = copy(args)
+        auction_args.auction_doc_id = auction_doc_id
+        auction_config = deepcopy(worker_defaults)
+        registry = Components(auction_doc_id)
+        auction = None
+        try:
+            register_utilities(auction_config, auction_args, registry=registry)
+            auction = Auction(auction_doc_id, worker_defaults=auction_config, debug=args.debug,
+                              registry=registry, router=router)
+            auction.schedule_auction()
+        except (Exception, SystemExit) as e:
+            LOGGER.error("Auction {} was not scheduled: {!r}".format(auction_doc_id, e))
+            if auction is not None:
+                release_hosted_auction(auction)
+            continue
+        auctions.append(auction)
+
+    gevent.joinall([gevent.spawn(wait_hosted_auction, auction) for auction in auctions])
+    SCHEDULER.shutdown()
+    server.stop()
+
+
+def prepare_resources(worker_defaults, args):
+    """
+    Prepare database and HTTP sessions of datasource which are shared by
+    auctions executed in one process. They are prepared before auctions are
+    spawned, so concurrent auctions neither race to create them nor check
+    availability of the same services. If the services can not be checked
+    now, every auction checks them itself.
+    """
+    resources = {'database': prepare_database(worker_defaults.get('database', {}))}
+    if not args.standalone:
+        try:
+            prepare_datasource_resources(worker_defaults.get('datasource', {}), resources)
+        except Exception as e:
+            LOGGER.error("Resources of datasource were not prepared: {!r}".format(e))
+    return resources
+
+
+def execute_command(cmd, auction_doc_id, worker_defaults, args, resources):
+    """
+    Execute one of DAEMON_COMMANDS_MAPPING for auction with own registry.
+    Auctions executed with the same 'resources' share database and HTTP
+    sessions of datasource.
+
+    :return: result of command, which is reported as a line of JSON
+    """
+    started = time.time()
+    auction_args = copy(args)
+    auction_args.auction_doc_id = auction_doc_id
+    auction_config = deepcopy(worker_defaults)
+    registry = Components(auction_doc_id)
+    result = {'cmd': cmd, 'auction_id': auction_doc_id, 'status': 'ok'}
+    try:
+        register_utilities(auction_config, auction_args, registry=registry, resources=resources,
+                           with_job_service=False)
+        auction = Auction(auction_doc_id, worker_defaults=auction_config, debug=args.debug, registry=registry)
+        method = getattr(auction, DAEMON_COMMANDS_MAPPING[cmd])
+        if cmd == 'post_auction_protocol':
+            result['result'] = method(auction_args.doc_id)
+        else:
+            method()
+    except (Exception, SystemExit) as e:
+        LOGGER.error("Command {} of auction {} failed: {!r}".format(cmd, auction_doc_id, e))
+        result.update(status='failed', error=repr(e))
+    result['duration'] = round(time.time() - started, 3)
+    return result
+
+
+def plan_auction(auction_doc_id, worker_defaults, args, resources):
+    """
+    Prepare auction document of one auction of the batch
+    """
+    return execute_command('planning', auction_doc_id, worker_defaults, args, resources)
+
+
+def plan_auctions(worker_defaults, args, output=None):
+    """
+    Prepare auction documents of many auctions in one process. At most
+    'args.concurrency' auctions are planned at the same time, all of them
+    use one database and HTTP sessions of datasource. Result of every
+    auction is written to output as soon as it is planned.
+
+    :return: number of auctions which were not planned
+    """
+    output = output or sys.stdout
+    resources = prepare_resources(worker_defaults, args)
+    failed = 0
+    pool = Pool(args.concurrency)
+    auction_ids = iter_auction_ids(args.auction_doc_id)
+    for result in pool.imap_unordered(
+            lambda auction_doc_id: plan_auction(auction_doc_id, worker_defaults, args, resources), auction_ids):
+        if result['status'] != 'ok':
+            failed += 1
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+    return failed
+
+
+def serve_commands(worker_defaults, args, report=None):
+    """
+    Run worker daemon which executes commands of chronograph received over
+    Unix socket at 'args.auction_doc_id' until SIGTERM or SIGINT. Database
+    and HTTP sessions of datasource are shared by all commands.
+    """
+    from openprocurement.auction.texas.daemon import WorkerDaemon
+
+    resources = prepare_resources(worker_defaults, args)
+
+    def execute(request):
+        command_args = copy(args)
+        command_args.doc_id = request.get('doc_id')
+        return execute_command(request['cmd'], request['auction_id'], worker_defaults, command_args, resources)
+
+    daemon = WorkerDaemon(args.auction_doc_id, execute, DAEMON_COMMANDS_MAPPING, concurrency=args.concurrency)
+    daemon.start()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal_handler(signum, daemon.stop)
+    if report is not None:
+        report.mark('server')
+        report.log(args.cmd)
+    daemon.serve_forever()
+
+
 def main():
     parser = argparse.ArgumentParser(description='---- Auction ----')
     parser.add_argument('cmd', type=str, help='')
-    parser.add_argument('auction_doc_id', type=str, help='auction_doc_id')
+    parser.add_argument('auction_doc_id', type=str,
+                        help='auction_doc_id, for host and batch_planning commands comma separated '
+                             'ids, path to file with ids or - to read ids from stdin, for serve command '
+                             'path of Unix socket')
     parser.add_argument('auction_worker_config', type=str,
                         help='Auction Worker Configuration File')
     parser.add_argument('--with_api_version', type=str, help='Tender Api Version')
@@ -119,14 +416,19 @@ def main():
                         help='Use TestingFileDataSource for auction')
     parser.add_argument('--doc_id', dest='doc_id', type=str, default=False,
                         help='id of existing auction protocol document')
+    parser.add_argument('--concurrency', dest='concurrency', type=int, default=BATCH_PLANNING_CONCURRENCY,
+                        help='Number of auctions planned at the same time by batch_planning command '
+                             'or served at the same time by serve command')
 
+    report = StartupReport()
+    report.mark('imports')
     args = parser.parse_args()
 
     if os.path.isfile(args.auction_worker_config):
         worker_defaults = yaml.load(open(args.auction_worker_config))
         if args.with_api_version:
             worker_defaults['resource_api_version'] = args.with_api_version
-        if args.cmd != 'cleanup':
+        if args.cmd not in ('cleanup', 'host', 'batch_planning', 'serve'):
             worker_defaults['handlers']['journal']['TENDER_ID'] = args.auction_doc_id
 
         worker_defaults['handlers']['journal']['TENDERS_API_VERSION'] = worker_defaults['resource_api_version']
@@ -137,11 +439,33 @@ def main():
         print "Auction worker defaults config not exists!!!"
         sys.exit(1)
 
-    register_utilities(worker_defaults, args)
+    if args.cmd not in WRITE_BEHIND_COMMANDS:
+        worker_defaults.get('database', {}).pop('write_behind', None)
+    set_clock(prepare_clock(worker_defaults.get('clock', {})))
+    configure_payload_logging(worker_defaults.get('payload_logging', {}))
+    report.budget = worker_defaults.get('startup_time_budget', report.budget)
+    report.mark('config')
+
+    if args.cmd == 'host':
+        host_auctions(worker_defaults, args, report=report)
+        return
+    if args.cmd == 'serve':
+        serve_commands(worker_defaults, args, report=report)
+        return
+    if args.cmd == 'batch_planning':
+        report.log(args.cmd)
+        if plan_auctions(worker_defaults, args):
+            sys.exit(1)
+        return
+
+    register_utilities(worker_defaults, args, with_job_service=args.cmd == 'run')
     auction = Auction(args.auction_doc_id, worker_defaults=worker_defaults, debug=args.debug)
+    report.mark('utilities')
+    report.log(args.cmd)
     if args.cmd == 'check':
         exit()
     if args.cmd == 'run':
+        from openprocurement.auction.texas.scheduler import SCHEDULER
         SCHEDULER.start()
         auction.schedule_auction()
         auction.wait_to_end()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import calendar
+import time
+from datetime import datetime, timedelta
+from pkg_resources import iter_entry_points
+
+import iso8601
+from zope.interface import (
+    Interface,
+    implementer,
+)
+
+from openprocurement.auction.worker_core.constants import TIMEZONE
+
+
+class IClock(Interface):
+    """
+    Interface for objects which are source of current time for auction worker
+    """
+    def now(self, tz=TIMEZONE):
+        """
+        Return current time
+
+        :param tz: timezone of returned datetime
+        :return: timezone aware datetime
+        """
+        raise NotImplementedError
+
+    def to_real(self, moment):
+        """
+        Convert moment of this clock to the wall-clock moment
+
+        :param moment: timezone aware datetime
+        :return: timezone aware datetime
+        """
+        raise NotImplementedError
+
+    def to_virtual(self, moment):
+        """
+        Convert wall-clock moment to the moment of this clock
+
+        :param moment: timezone aware datetime
+        :return: timezone aware datetime
+        """
+        raise NotImplementedError
+
+
+def _localize(moment):
+    if moment.tzinfo is None:
+        return TIMEZONE.localize(moment)
+    return moment
+
+
+def _timestamp(moment):
+    moment = _localize(moment)
+    return calendar.timegm(moment.utctimetuple()) + moment.microsecond / 1e6
+
+
+@implementer(IClock)
+class WallClock(object):
+    """
+    Clock which returns system time
+    """
+
+    def __init__(self, config=None):
+        pass
+
+    def now(self, tz=TIMEZONE):
+        return datetime.now(tz)
+
+    def to_real(self, moment):
+        return moment
+
+    def to_virtual(self, moment):
+        return moment
+
+
+@implementer(IClock)
+class VirtualClock(object):
+    """
+    Clock which runs 'speedup' times faster than the wall clock starting
+    from 'start' moment (current time by default)
+
+    Attributes:
+        speedup: Number of virtual seconds passing during one real second
+        :type speedup: float
+    """
+    speedup = 1.0
+
+    def __init__(self, config):
+        self.speedup = float(config.get('speedup', self.speedup))
+        if self.speedup <= 0:
+            raise ValueError('Clock speedup must be positive, got {}'.format(self.speedup))
+        start = config.get('start')
+        if start is None:
+            start = datetime.now(TIMEZONE)
+        elif not isinstance(start, datetime):
+            start = iso8601.parse_date(start)
+        self._virtual_origin = _localize(start)
+        self._real_origin = time.time()
+
+    def now(self, tz=TIMEZONE):
+        elapsed = (time.time() - self._real_origin) * self.speedup
+        return (self._virtual_origin + timedelta(seconds=elapsed)).astimezone(tz)
+
+    def to_real(self, moment):
+        moment = _localize(moment)
+        offset = (_timestamp(moment) - _timestamp(self._virtual_origin)) / self.speedup
+        return datetime.fromtimestamp(self._real_origin + offset, moment.tzinfo)
+
+    def to_virtual(self, moment):
+        moment = _localize(moment)
+        offset = (_timestamp(moment) - self._real_origin) * self.speedup
+        return (self._virtual_origin + timedelta(seconds=offset)).astimezone(moment.tzinfo)
+
+
+CLOCK_MAPPING = {
+    'wall': WallClock,
+    'virtual': VirtualClock,
+}
+
+PKG_NAMESPACE = "openprocurement.auction.texas.clock"
+
+for entry_point in iter_entry_points(PKG_NAMESPACE):
+    plugin = entry_point.load()
+    CLOCK_MAPPING[entry_point.name] = plugin()
+
+
+def prepare_clock(config):
+    clock_type = config.get('type', 'wall')
+    clock_class = CLOCK_MAPPING.get(clock_type, None)
+
+    if clock_class is None:
+        raise AttributeError(
+            'There is no clock for such type {}. Available types {}'.format(
+                clock_type,
+                CLOCK_MAPPING.keys()
+            )
+        )
+
+    return clock_class(config)
+
+
+# Clock used by the worker process, all auctions of the process share it
+CLOCK = WallClock()
+
+
+def set_clock(clock):
+    global CLOCK
+    CLOCK = clock
+
+
+def now(tz=TIMEZONE):
+    return CLOCK.now(tz)
+
+
+def to_real(moment):
+    return CLOCK.to_real(moment)
+
+
+def to_virtual(moment):
+    return CLOCK.to_virtual(moment)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from openprocurement.auction.texas.database import IDatabase
+from openprocurement.auction.texas.datasource import IDataSource
+from openprocurement.auction.texas.metrics import MetricsWriter
+from openprocurement.auction.texas.retry import CLOSED, HALF_OPEN, OPEN
+from openprocurement.auction.texas.scheduler import SCHEDULER_MONITOR
+
+
+def collect_bids(writer, app):
+    bid_queue = app.bid_queue
+    writer.metric('bids_accepted_total', 'counter', 'Number of accepted bids', [([], bid_queue.stats['accepted'])])
+    writer.metric(
+        'bids_rejected_total', 'counter', 'Number of rejected bids by reason',
+        [([('reason', reason)], count) for reason, count in sorted(bid_queue.rejections.items())]
+    )
+    writer.metric('bid_queue_depth', 'gauge', 'Number of bids waiting for commit', [([], bid_queue.stats['depth'])])
+    writer.histogram(
+        'bid_commit_seconds', 'Time bid spent waiting in the queue and being committed',
+        bid_queue.latency, 'phase'
+    )
+
+
+def collect_clients(writer, app):
+    clients = {}
+    for bidder_id, _ in app.broadcast_bus.clients():
+        clients[bidder_id] = clients.get(bidder_id, 0) + 1
+    writer.metric(
+        'sse_clients', 'gauge', 'Number of connected SSE clients per bidder',
+        [([('bidder', bidder_id)], count) for bidder_id, count in sorted(clients.items())]
+    )
+    writer.metric(
+        'sse_dropped_clients_total', 'counter', 'Number of slow SSE clients dropped',
+        [([], app.broadcast_bus.stats['dropped'])]
+    )
+
+
+def collect_database(writer, app):
+    database = app.gsm.queryUtility(IDatabase)
+    latency = getattr(database, 'latency', None)
+    if latency is None:
+        return
+    writer.histogram('couchdb_request_seconds', 'Latency of CouchDB requests', latency, 'operation')
+    writer.metric(
+        'couchdb_retries_total', 'counter', 'Number of retried CouchDB requests',
+        [([('operation', operation)], count) for operation, count in sorted(database.retry_stats.items())]
+    )
+    writer.metric(
+        'couchdb_retries_exhausted_total', 'counter', 'Number of CouchDB operations given up after retries',
+        [([('operation', operation)], count) for operation, count in sorted(database.exhausted_stats.items())]
+    )
+    breaker = database.circuit_breaker.stats
+    writer.metric(
+        'couchdb_circuit_state', 'gauge', 'State of CouchDB circuit breaker',
+        [([('state', state)], int(breaker['state'] == state)) for state in (CLOSED, HALF_OPEN, OPEN)]
+    )
+    writer.metric(
+        'couchdb_circuit_opened_total', 'counter', 'Number of times CouchDB circuit was opened',
+        [([], breaker['opened'])]
+    )
+    writer.metric(
+        'couchdb_circuit_refused_total', 'counter', 'Number of CouchDB requests refused by open circuit',
+        [([], breaker['refused'])]
+    )
+
+
+def collect_datasource(writer, app):
+    datasource = app.gsm.queryUtility(IDataSource)
+    latency = getattr(datasource, 'latency', None)
+    if latency is None:
+        return
+    writer.histogram('datasource_request_seconds', 'Latency of API requests', latency, 'operation')
+
+
+def collect_document(writer, app):
+    # Auction document is not read, its size is recorded by database when it
+    # is saved and the current stage is taken from round state
+    sizes = getattr(app.gsm.queryUtility(IDatabase), 'document_sizes', {})
+    size = sizes.get(app.context.get('auction_doc_id'))
+    writer.metric(
+        'document_size_bytes', 'gauge', 'Size of serialized auction document',
+        [([], size)] if size is not None else []
+    )
+    round_state = app.context.get('round_state')
+    writer.metric(
+        'current_stage', 'gauge', 'Index of the current stage of auction',
+        [([], round_state.stage_id if round_state is not None else -1)]
+    )
+
+
+SCHEDULER_METRICS = (
+    ('runs', 'scheduler_job_runs_total', 'counter', 'Number of executed scheduler jobs'),
+    ('errors', 'scheduler_job_errors_total', 'counter', 'Number of failed scheduler jobs'),
+    ('misfires', 'scheduler_job_misfires_total', 'counter', 'Number of missed scheduler jobs'),
+    ('lag_last', 'scheduler_job_lag_seconds', 'gauge', 'Delay of the last run after planned time'),
+    ('lag_max', 'scheduler_job_lag_max_seconds', 'gauge', 'Max delay of run after planned time'),
+    ('lag_total', 'scheduler_job_lag_seconds_total', 'counter', 'Total delay of runs after planned time'),
+    ('duration_max', 'scheduler_job_duration_max_seconds', 'gauge', 'Max execution time of job'),
+    ('duration_total', 'scheduler_job_duration_seconds_total', 'counter', 'Total execution time of jobs'),
+)
+
+
+def collect_scheduler(writer, app):
+    stats = sorted(SCHEDULER_MONITOR.stats.items())
+    for key, name, metric_type, help_text in SCHEDULER_METRICS:
+        writer.metric(name, metric_type, help_text, [([('job', job)], job_stats[key]) for job, job_stats in stats])
+
+
+COLLECTORS = (
+    collect_bids,
+    collect_clients,
+    collect_database,
+    collect_datasource,
+    collect_document,
+    collect_scheduler,
+)
+
+
+def render_metrics(app, collectors=COLLECTORS):
+    """
+    Render metrics of auction application in Prometheus text format.
+    Components only update their counters and histograms, all formatting is
+    done here when metrics are requested.
+    """
+    writer = MetricsWriter()
+    for collect in collectors:
+        collect(writer, app)
+    return writer.render()
@@ -19,3 +19,14 @@ DEADLINE_HOUR = 17
 SANDBOX_AUCTION_DURATION = timedelta(minutes=30)
 
 DEFAULT_AUCTION_TYPE = 'texas'
+
+INVALIDATE_GRANT = timedelta(0, 230)
+IDENTITY_CACHE_SIZE = 1000
+IDENTITY_CACHE_TTL = 60
+
+SCHEDULER_LAG_WARNING = 1.0
+
+BATCH_PLANNING_CONCURRENCY = 10
+DAEMON_CONCURRENCY = 10
+
+STARTUP_TIME_BUDGET = 1.0
@@ -11,6 +11,11 @@ from zope.interface import (
     implementer,
 )
 
+from openprocurement.auction.texas.broadcast import DocumentFeed
+from openprocurement.auction.texas.router import MountedApp
+from openprocurement.auction.texas.snapshot import freeze, thaw
+from openprocurement.auction.texas.utils import RoundState
+
 
 class ContextException(Exception):
     pass
@@ -25,6 +30,11 @@ class IContext(Interface):
         # Should return default value if key does not exist
         raise NotImplementedError
 
+    def snapshot(self, key, default=None):
+        # Should return value for reading only, which must not be changed
+        # by caller, or default value if key does not exist
+        raise NotImplementedError
+
 
 @implementer(IContext)
 class DictContext(object):
@@ -43,6 +53,9 @@ class DictContext(object):
     stored in context mapping as a keys and type of value which this field should contain
     :type acceptable_fields: dict
 
+    round_state is derived from auction_document whenever the document is
+    stored, so it never describes a replaced document
+
     """
     _mapping = None
     types_to_return_copy_of = (list, dict, set)
@@ -53,11 +66,14 @@ class DictContext(object):
         'auction_protocol': {'type': dict},
         'bidders_data': {'type': list},
         'bids_mapping': {'type': dict},
+        'bidders_index': {'type': frozenset},
         'end_auction_event': {'type': Event},
-        'server': {'type': WSGIServer},
+        'server': {'type': (WSGIServer, MountedApp)},
         'server_actions': {'type': BoundedSemaphore},
         'worker_defaults': {'type': dict},
         'deadline': {'type': datetime},
+        'document_feed': {'type': DocumentFeed},
+        'round_state': {'type': RoundState},
     }
 
     error_messages = {
@@ -85,6 +101,8 @@ class DictContext(object):
                 key, self.acceptable_fields[key]['type'])
             )
         self._mapping[key] = value
+        if key == 'auction_document':
+            self._mapping['round_state'] = RoundState.from_document(value)
 
     def get(self, key, default=None):
         value = self._mapping.get(key, default)
@@ -93,6 +111,46 @@ class DictContext(object):
             return deepcopy(value)
         return value
 
+    def snapshot(self, key, default=None):
+        # Stored objects are mutable, so even readers get a copy
+        return self.get(key, default)
+
+
+@implementer(IContext)
+class SnapshotContext(DictContext):
+    """
+    Implementation of AuctionWorker context which stores mutable values as
+    immutable snapshots with structural sharing.
+
+    Getting returns plain mutable copy of the snapshot, which is built
+    without the bookkeeping of deepcopy, so changes made to returned object
+    are not visible to other components until it is stored back to context.
+    Storing reuses unchanged nodes of the previous snapshot.
+
+    Components which only read values use snapshot method, which returns
+    the read-only snapshot itself without copying.
+    """
+
+    def __getitem__(self, key):
+        return thaw(self._mapping[key])
+
+    def __setitem__(self, key, value):
+        previous = self._mapping.get(key)
+        super(SnapshotContext, self).__setitem__(key, value)
+        if isinstance(value, self.types_to_return_copy_of):
+            self._mapping[key] = freeze(value, previous)
+
+    def get(self, key, default=None):
+        return thaw(self._mapping.get(key, default))
+
+    def snapshot(self, key, default=None):
+        return self._mapping.get(key, default)
+
+
+def snapshot_context():
+    # Factory for 'openprocurement.auction.texas.context' entry point
+    return SnapshotContext
+
 
 CONTEXT_MAPPING = {
     'dict': DictContext,
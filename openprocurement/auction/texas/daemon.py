@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import errno
+import json
+import logging
+import os
+
+from gevent import socket
+from gevent.event import Event
+from gevent.pool import Pool
+from gevent.server import StreamServer
+
+from openprocurement.auction.texas.constants import DAEMON_CONCURRENCY
+from openprocurement.auction.texas.journal import (
+    AUCTION_WORKER_DAEMON_STARTED,
+    AUCTION_WORKER_DAEMON_STOPPED,
+)
+
+
+LOGGER = logging.getLogger('Auction Worker Texas')
+
+
+class DaemonException(Exception):
+    pass
+
+
+def bind_unix_socket(path):
+    """
+    Bind listening Unix socket. Socket file left by daemon which was not
+    stopped properly is removed, socket of running daemon is not.
+    """
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except socket.error as e:
+            if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+                raise
+            os.unlink(path)
+        else:
+            raise DaemonException('Daemon is already listening on {}'.format(path))
+        finally:
+            probe.close()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(socket.SOMAXCONN)
+    return listener
+
+
+class WorkerDaemon(object):
+    """
+    Resident worker which executes auction commands received over a Unix
+    socket, so utilities, HTTP sessions and database connections prepared
+    for one command are reused by the next ones.
+
+    Every line sent to the socket is a JSON request:
+
+        {"cmd": "planning", "auction_id": "...", "doc_id": null}
+
+    and the daemon answers every request with a line of JSON result in the
+    same order. Commands of one auction are executed one after another,
+    commands of different auctions run concurrently.
+
+    :param execute: callable which takes request and returns result of
+                    command, it should not raise
+    :param commands: names of accepted commands
+
+    Attributes:
+        stats: number of received, failed and rejected requests and
+        requests being executed
+        :type stats: dict
+    """
+
+    def __init__(self, path, execute, commands, concurrency=DAEMON_CONCURRENCY):
+        self.path = path
+        self.execute = execute
+        self.commands = frozenset(commands)
+        self.concurrency = concurrency
+        self._server = None
+        self._running = {}
+        self.stats = {
+            'requests': 0,
+            'failed': 0,
+            'rejected': 0,
+            'active': 0,
+        }
+
+    def start(self):
+        self._server = StreamServer(bind_unix_socket(self.path), self.handle, spawn=Pool(self.concurrency))
+        self._server.start()
+        LOGGER.info('Worker daemon is listening on {}'.format(self.path),
+                    extra={'MESSAGE_ID': AUCTION_WORKER_DAEMON_STARTED})
+
+    def serve_forever(self):
+        if self._server is None:
+            self.start()
+        self._server.serve_forever()
+
+    def stop(self, timeout=None):
+        if self._server is None:
+            return
+        self._server.stop(timeout)
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        LOGGER.info('Worker daemon stopped',
+                    extra={'MESSAGE_ID': AUCTION_WORKER_DAEMON_STOPPED})
+
+    def handle(self, connection, address):
+        stream = connection.makefile('rb')
+        try:
+            for line in stream:
+                if not line.strip():
+                    continue
+                result = self.process(line)
+                connection.sendall(json.dumps(result) + '\n')
+        except socket.error as e:
+            LOGGER.warning('Daemon client disconnected: {}'.format(e))
+        finally:
+            stream.close()
+            connection.close()
+
+    def process(self, line):
+        self.stats['requests'] += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Request must be an object')
+            if request.get('cmd') not in self.commands:
+                raise ValueError('Unknown command {!r}'.format(request.get('cmd')))
+            if not request.get('auction_id'):
+                raise ValueError('Request has no auction_id')
+        except ValueError as e:
+            self.stats['rejected'] += 1
+            LOGGER.error('Daemon request rejected: {}'.format(e))
+            return {'status': 'rejected', 'error': str(e)}
+
+        result = self._execute(request)
+        if result.get('status') != 'ok':
+            self.stats['failed'] += 1
+        return result
+
+    def _execute(self, request):
+        auction_id = request['auction_id']
+        while auction_id in self._running:
+            self._running[auction_id].wait()
+        done = self._running[auction_id] = Event()
+        self.stats['active'] += 1
+        try:
+            return self.execute(request)
+        finally:
+            self.stats['active'] -= 1
+            del self._running[auction_id]
+            done.set()
+
+
+def send_command(path, request, timeout=None):
+    """
+    Send request to worker daemon listening on Unix socket and wait for
+    its result
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(path)
+        connection.sendall(json.dumps(request) + '\n')
+        stream = connection.makefile('rb')
+        try:
+            line = stream.readline()
+        finally:
+            stream.close()
+    finally:
+        connection.close()
+    if not line:
+        raise DaemonException('Daemon closed connection without result')
+    return json.loads(line)
@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
+import errno
+import json
 import logging
+import os
+import random
+import uuid
 from pkg_resources import iter_entry_points
 
+import gevent
 from copy import deepcopy
+from gevent.event import Event
+from gevent.lock import Semaphore
 from couchdb import Session, Server
-from couchdb.http import HTTPError, RETRYABLE_ERRORS
+from couchdb.http import HTTPError, ResourceConflict, ServerError, RETRYABLE_ERRORS
 
 from zope.interface import (
     Interface,
@@ -13,10 +21,15 @@ from zope.interface import (
 
 from openprocurement.auction.utils import generate_request_id
 
+from openprocurement.auction.texas.metrics import Histogram
+from openprocurement.auction.texas.retry import CircuitBreaker, RetryPolicy
+
 from openprocurement.auction.texas.journal import (
     AUCTION_WORKER_DB_GET_DOC,
     AUCTION_WORKER_DB_GET_DOC_ERROR, AUCTION_WORKER_DB_GET_DOC_UNHANDLED_ERROR, AUCTION_WORKER_DB_SAVE_DOC,
-    AUCTION_WORKER_DB_SAVE_DOC_ERROR, AUCTION_WORKER_DB_SAVE_DOC_UNHANDLED_ERROR)
+    AUCTION_WORKER_DB_SAVE_DOC_ERROR, AUCTION_WORKER_DB_SAVE_DOC_UNHANDLED_ERROR,
+    AUCTION_WORKER_DB_SAVE_DOC_CONFLICT, AUCTION_WORKER_DB_JOURNAL_APPEND, AUCTION_WORKER_DB_JOURNAL_REPLAY,
+    AUCTION_WORKER_DB_JOURNAL_FLUSH_ERROR, AUCTION_WORKER_DB_CIRCUIT_OPENED, AUCTION_WORKER_DB_CIRCUIT_CLOSED)
 
 LOGGER = logging.getLogger("Auction Worker Texas")
 
@@ -45,29 +58,127 @@ class IDatabase(Interface):
         raise NotImplementedError
 
 
+class IJournaledDatabase(IDatabase):
+    """
+    Interface for databases which acknowledge saves after writing them to
+    a local journal and persist them to the underlying database later
+    """
+    def replay_journal(self, auction_doc_id):
+        """
+        Persist document states left in the journal by a previous run
+
+        :param auction_doc_id: identifier of document in database
+        :return: last journaled auction document or None
+        """
+        raise NotImplementedError
+
+    def flush(self, auction_doc_id=None):
+        """
+        Synchronously persist pending document states
+
+        :param auction_doc_id: identifier of document to flush, all
+                               pending documents are flushed if omitted
+        :return:
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Persist pending document states and stop background persisting
+
+        :return:
+        """
+        raise NotImplementedError
+
+
 @implementer(IDatabase)
 class CouchDB(object):
     """
     This class is responsible for work with CouchDB
 
+    Failed requests are retried with policies configured per operation in
+    'retry' config option, e.g. {'get': {'attempts': 5, 'budget': 10}}, see
+    RetryPolicy for available options. All operations share one circuit
+    breaker configured with 'circuit_breaker' option, requests refused by
+    open circuit are not sent, but are retried as failed ones.
+
     Attributes:
         _db: Representation of a database to work with on a CouchDB server
         :type _db: couchdb.Database
-        db_request_retries: Number of retries of database requesting in case
-                            error occurred during getting or saving document
-        :type db_request_retries: int
+        retry_policies: Retry policies of get and save operations
+        :type retry_policies: dict
+        circuit_breaker: Circuit breaker of database requests
+        :type circuit_breaker: CircuitBreaker
+        cached_revision: If True, document is saved with the last '_rev' known
+                         to this object and revision is fetched from database
+                         only after conflict. Otherwise revision is fetched
+                         before every save.
+        :type cached_revision: bool
+        revision_stats: Counters of saves, conflicts and revision refetches
+        :type revision_stats: dict
+        latency: Durations of get and save requests
+        :type latency: Histogram
+        retry_stats: Counters of retried get and save requests
+        :type retry_stats: dict
+        exhausted_stats: Counters of get and save operations given up after
+                         all attempts or retry budget were spent
+        :type exhausted_stats: dict
+        document_sizes: Size of the last saved state of every document in
+                        bytes of JSON
+        :type document_sizes: dict
     """
     _db = None
-    db_request_retries = 10
+    cached_revision = False
 
     def __init__(self, config):
         """
         Check CouchDB availability and set _db attribute
         """
         server, db = config.get("COUCH_DATABASE").rsplit('/', 1)
-        server = Server(server, session=Session(retry_delays=range(10)))
+        # Requests are retried by retry policies, not by session
+        server = Server(server, session=Session(retry_delays=config.get('session_retry_delays', [])))
         database = server[db] if db in server else server.create(db)
         self._db = database
+        self._prepare_state(config)
+
+    def _prepare_state(self, config):
+        self.cached_revision = config.get('cached_revision', False)
+        self._revisions = {}
+        self.revision_stats = {'saves': 0, 'conflicts': 0, 'refetches': 0}
+        self.latency = Histogram()
+        retry_config = config.get('retry', {})
+        self.retry_policies = {
+            operation: RetryPolicy(**retry_config.get(operation, {})) for operation in ('get', 'save')
+        }
+        self.circuit_breaker = CircuitBreaker(**config.get('circuit_breaker', {}))
+        self.retry_stats = {'get': 0, 'save': 0}
+        self.exhausted_stats = {'get': 0, 'save': 0}
+        self.document_sizes = {}
+
+    def _record_success(self):
+        if self.circuit_breaker.record_success():
+            LOGGER.info("Database circuit closed",
+                        extra={'MESSAGE_ID': AUCTION_WORKER_DB_CIRCUIT_CLOSED})
+
+    def _record_failure(self):
+        if self.circuit_breaker.record_failure():
+            LOGGER.error("Database circuit opened after {} failed requests".format(
+                             self.circuit_breaker.stats['failures']),
+                         extra={'MESSAGE_ID': AUCTION_WORKER_DB_CIRCUIT_OPENED})
+
+    def _wait_retry(self, operation, delays):
+        """
+        Sleep before next retry of operation
+
+        :return: False if operation should be given up
+        """
+        delay = next(delays, None)
+        if delay is None:
+            self.exhausted_stats[operation] += 1
+            return False
+        self.retry_stats[operation] += 1
+        gevent.sleep(delay)
+        return True
 
     def _update_revision(self, auction_document, auction_doc_id):
         """
@@ -79,10 +190,24 @@ class CouchDB(object):
         :param auction_doc_id: identifier of document in database
         :return:
         """
+        self.revision_stats['refetches'] += 1
         public_document = self.get_auction_document(auction_doc_id)
         if public_document and public_document.get('_rev') != auction_document['_rev']:
             auction_document["_rev"] = public_document["_rev"]
 
+    def _set_cached_revision(self, auction_document, auction_doc_id):
+        """
+        Set '_rev' field value of provided document to the last revision
+        received from or saved to couchdb database by this object
+
+        :param auction_document: auction document object
+        :param auction_doc_id: identifier of document in database
+        :return:
+        """
+        revision = self._revisions.get(auction_doc_id)
+        if revision:
+            auction_document['_rev'] = revision
+
     def get_auction_document(self, auction_doc_id):
         """
         Retrieve auction document from couchdb database using provided identifier
@@ -91,28 +216,40 @@ class CouchDB(object):
         :return: auction document object from couchdb database
         """
         request_id = generate_request_id()
-        retries = self.db_request_retries
-        while retries:
-            try:
-                public_document = self._db.get(auction_doc_id)
-                if public_document:
+        delays = self.retry_policies['get'].delays()
+        while True:
+            if self.circuit_breaker.allow():
+                try:
+                    with self.latency.time('get'):
+                        public_document = self._db.get(auction_doc_id)
+                    self._record_success()
+                    if not public_document:
+                        # Missing document is not retried
+                        return {}
+                    self._revisions[auction_doc_id] = public_document.get('_rev')
                     LOGGER.info("Get auction document {0[_id]} with rev {0[_rev]}".format(public_document),
                                 extra={"JOURNAL_REQUEST_ID": request_id,
                                        "MESSAGE_ID": AUCTION_WORKER_DB_GET_DOC})
                     return public_document
 
-            except HTTPError, e:
-                LOGGER.error("Error while get document: {}".format(e),
-                             extra={'MESSAGE_ID': AUCTION_WORKER_DB_GET_DOC_ERROR})
-            except Exception, e:
-                errcode = e.args[0]
-                if errcode in RETRYABLE_ERRORS:
+                except HTTPError, e:
+                    self._record_failure()
                     LOGGER.error("Error while get document: {}".format(e),
                                  extra={'MESSAGE_ID': AUCTION_WORKER_DB_GET_DOC_ERROR})
-                else:
-                    LOGGER.critical("Unhandled error: {}".format(e),
-                                    extra={'MESSAGE_ID': AUCTION_WORKER_DB_GET_DOC_UNHANDLED_ERROR})
-            retries -= 1
+                except Exception, e:
+                    self._record_failure()
+                    errcode = e.args[0]
+                    if errcode in RETRYABLE_ERRORS:
+                        LOGGER.error("Error while get document: {}".format(e),
+                                     extra={'MESSAGE_ID': AUCTION_WORKER_DB_GET_DOC_ERROR})
+                    else:
+                        LOGGER.critical("Unhandled error: {}".format(e),
+                                        extra={'MESSAGE_ID': AUCTION_WORKER_DB_GET_DOC_UNHANDLED_ERROR})
+            if not self._wait_retry('get', delays):
+                break
+        LOGGER.error("Gave up getting auction document {}".format(auction_doc_id),
+                     extra={"JOURNAL_REQUEST_ID": request_id,
+                            'MESSAGE_ID': AUCTION_WORKER_DB_GET_DOC_ERROR})
         return {}
 
     def save_auction_document(self, auction_document, auction_doc_id):
@@ -125,21 +262,50 @@ class CouchDB(object):
         """
         request_id = generate_request_id()
         public_document = deepcopy(dict(auction_document))
-        retries = self.db_request_retries
-        while retries:
-            try:
+        if self.cached_revision:
+            self._set_cached_revision(public_document, auction_doc_id)
+        # Revision is fetched before the first attempt unless it is cached
+        # and again only after conflict
+        refetch_revision = not self.cached_revision
+        delays = self.retry_policies['save'].delays()
+        while True:
+            if refetch_revision:
+                # Getting document is retried and guarded by circuit breaker
                 self._update_revision(public_document, auction_doc_id)
-                response = self._db.save(public_document)
+                refetch_revision = False
+            if not self.circuit_breaker.allow():
+                if not self._wait_retry('save', delays):
+                    break
+                continue
+            try:
+                with self.latency.time('save'):
+                    response = self._db.save(public_document)
+                self._record_success()
                 if len(response) == 2:
+                    self.revision_stats['saves'] += 1
                     LOGGER.info("Saved auction document {0} with rev {1}".format(*response),
                                 extra={"JOURNAL_REQUEST_ID": request_id,
-                                       "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC})
+                                       "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC,
+                                       "JOURNAL_DB_SAVES": self.revision_stats['saves'],
+                                       "JOURNAL_DB_CONFLICTS": self.revision_stats['conflicts'],
+                                       "JOURNAL_DB_REFETCHES": self.revision_stats['refetches']})
                     auction_document['_rev'] = response[1]
+                    self._revisions[auction_doc_id] = response[1]
+                    self.document_sizes[auction_doc_id] = len(json.dumps(public_document, separators=(',', ':')))
                     return response
+            except ResourceConflict, e:
+                # Database is available, only revision is stale
+                self._record_success()
+                self.revision_stats['conflicts'] += 1
+                refetch_revision = True
+                LOGGER.warning("Conflict while save document: {}".format(e),
+                               extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_CONFLICT})
             except HTTPError, e:
+                self._record_failure()
                 LOGGER.error("Error while save document: {}".format(e),
                              extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_ERROR})
             except Exception, e:
+                self._record_failure()
                 errcode = e.args[0]
                 if errcode in RETRYABLE_ERRORS:
                     LOGGER.error("Error while save document: {}".format(e),
@@ -147,13 +313,309 @@ class CouchDB(object):
                 else:
                     LOGGER.critical("Unhandled error: {}".format(e),
                                     extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_UNHANDLED_ERROR})
+            if not self._wait_retry('save', delays):
+                break
             if "_rev" in public_document:
                 LOGGER.debug("Retry save document changes")
-            retries -= 1
+        LOGGER.error("Gave up saving auction document {}".format(auction_doc_id),
+                     extra={"JOURNAL_REQUEST_ID": request_id,
+                            'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_ERROR})
+
+
+class MemoryStore(object):
+    """
+    In-process document store with the part of couchdb.Database interface
+    used by CouchDB class: get() and save() with '_rev' checks
+
+    Attributes:
+        latency: Delay of every request in seconds, or (min, max) range
+        :type latency: float or tuple
+        failure_rate: Probability of request to fail with ServerError
+        :type failure_rate: float
+        conflict_rate: Probability of save to fail with ResourceConflict
+                       even if revision matches
+        :type conflict_rate: float
+        stats: Counters of requests and injected errors
+        :type stats: dict
+    """
+
+    def __init__(self, latency=0, failure_rate=0, conflict_rate=0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.conflict_rate = conflict_rate
+        self._random = random.Random(seed)
+        self._docs = {}
+        self.stats = {'gets': 0, 'saves': 0, 'conflicts': 0, 'failures': 0}
+
+    def _request(self):
+        latency = self.latency
+        if isinstance(latency, (list, tuple)):
+            latency = self._random.uniform(*latency)
+        if latency:
+            gevent.sleep(latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.stats['failures'] += 1
+            raise ServerError((500, ('internal_server_error', 'Injected failure')))
+
+    @staticmethod
+    def _copy(doc):
+        # Documents are stored as JSON like in CouchDB
+        return json.loads(json.dumps(doc))
+
+    def get(self, id, default=None):
+        self._request()
+        self.stats['gets'] += 1
+        doc = self._docs.get(id)
+        return self._copy(doc) if doc is not None else default
+
+    def save(self, doc):
+        self._request()
+        doc_id = doc.get('_id') or uuid.uuid4().hex
+        current = self._docs.get(doc_id)
+        current_rev = current['_rev'] if current is not None else None
+        injected = self.conflict_rate and self._random.random() < self.conflict_rate
+        if doc.get('_rev') != current_rev or injected:
+            self.stats['conflicts'] += 1
+            raise ResourceConflict(('conflict', 'Document update conflict.'))
+        number = int(current_rev.split('-', 1)[0]) + 1 if current_rev else 1
+        rev = '{}-{}'.format(number, uuid.uuid4().hex)
+        stored = self._copy(doc)
+        stored.update(_id=doc_id, _rev=rev)
+        self._docs[doc_id] = stored
+        doc['_id'] = doc_id
+        doc['_rev'] = rev
+        self.stats['saves'] += 1
+        return doc_id, rev
+
+
+MEMORY_STORES = {}
+
+
+class InMemoryDatabase(CouchDB):
+    """
+    CouchDB database working with in-process MemoryStore instead of
+    CouchDB server. Databases with the same 'name' in config share one
+    store, so documents are visible to all of them within the process.
+
+    Config options 'latency', 'failure_rate', 'conflict_rate' and 'seed'
+    are passed to MemoryStore when store is created.
+    """
+
+    def __init__(self, config):
+        name = config.get('name', 'auctions')
+        if name not in MEMORY_STORES:
+            MEMORY_STORES[name] = MemoryStore(
+                latency=config.get('latency', 0),
+                failure_rate=config.get('failure_rate', 0),
+                conflict_rate=config.get('conflict_rate', 0),
+                seed=config.get('seed'),
+            )
+        self._db = MEMORY_STORES[name]
+        self._prepare_state(config)
+
+
+@implementer(IJournaledDatabase)
+class WriteBehindDatabase(object):
+    """
+    Write-behind wrapper around another IDatabase implementation
+
+    Every saved document state is appended to a per-document journal file
+    as the whole document (one JSON object per line, fsync'ed before the
+    save returns) and the save is acknowledged right away. Acknowledged
+    document keeps its '_rev', revision is resolved by the wrapped database
+    when the document is persisted. A background greenlet persists only the
+    latest pending state of each document to the wrapped database and
+    truncates the journal once it has caught up.
+
+    Attributes:
+        database: Wrapped database object
+        :type database: IDatabase
+        journal_dir: Directory where journal files are kept
+        :type journal_dir: str
+        flush_interval: Seconds to wait before retrying a failed flush
+        :type flush_interval: float
+        document_sizes: Size of the last journaled state of every document
+                        in bytes of JSON
+        :type document_sizes: dict
+    """
+    flush_interval = 1
+
+    def __init__(self, database, config):
+        self.database = database
+        self.journal_dir = config['journal_dir']
+        self.flush_interval = config.get('flush_interval', self.flush_interval)
+        if not os.path.isdir(self.journal_dir):
+            os.makedirs(self.journal_dir)
+        self._pending = {}
+        self._seq = {}
+        self._journals = {}
+        self._locks = {}
+        self.document_sizes = {}
+        self._wakeup = Event()
+        self._flusher = None
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def _journal_path(self, auction_doc_id):
+        return os.path.join(self.journal_dir, '{}.journal'.format(auction_doc_id))
+
+    def _journal_fd(self, auction_doc_id):
+        if auction_doc_id not in self._journals:
+            self._journals[auction_doc_id] = os.open(
+                self._journal_path(auction_doc_id),
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600
+            )
+        return self._journals[auction_doc_id]
+
+    def _append(self, auction_document, auction_doc_id):
+        self._seq[auction_doc_id] = self._seq.get(auction_doc_id, 0) + 1
+        document = json.dumps(auction_document, separators=(',', ':'))
+        self.document_sizes[auction_doc_id] = len(document)
+        line = '{{"seq":{},"document":{}}}'.format(self._seq[auction_doc_id], document)
+        fd = self._journal_fd(auction_doc_id)
+        os.write(fd, line + '\n')
+        os.fsync(fd)
+
+    def _truncate(self, auction_doc_id):
+        os.ftruncate(self._journal_fd(auction_doc_id), 0)
+
+    def _read_journal(self, auction_doc_id):
+        """
+        Return last complete entry of the journal, a torn trailing line
+        left by a crash during append is ignored
+        """
+        try:
+            with open(self._journal_path(auction_doc_id)) as journal:
+                lines = journal.read().splitlines()
+        except IOError, e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+        for line in reversed(lines):
+            try:
+                return json.loads(line)
+            except ValueError:
+                continue
+        return None
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.dead:
+            self._flusher = gevent.spawn(self._run_flusher)
+
+    def _run_flusher(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if not self.flush():
+                gevent.sleep(self.flush_interval)
+                self._wakeup.set()
+
+    def _flush_document(self, auction_doc_id):
+        # Background flusher and explicit flush() must not persist the same
+        # state twice
+        with self._locks.setdefault(auction_doc_id, Semaphore()):
+            if auction_doc_id not in self._pending:
+                return True
+            seq = self._seq[auction_doc_id]
+            response = self.database.save_auction_document(
+                deepcopy(self._pending[auction_doc_id]), auction_doc_id
+            )
+            if not response:
+                LOGGER.error("Failed to flush auction document {}, journal is kept".format(auction_doc_id),
+                             extra={'MESSAGE_ID': AUCTION_WORKER_DB_JOURNAL_FLUSH_ERROR})
+                return False
+            # Document could be saved again while flushing, keep newer state
+            if self._seq[auction_doc_id] == seq:
+                self._pending.pop(auction_doc_id, None)
+                self._truncate(auction_doc_id)
+            return True
+
+    def get_auction_document(self, auction_doc_id):
+        """
+        Return pending document state if it was not flushed yet,
+        otherwise retrieve document from wrapped database
+
+        :param auction_doc_id: identifier of document in database
+        :return: auction document object
+        """
+        if auction_doc_id in self._pending:
+            return deepcopy(self._pending[auction_doc_id])
+        return self.database.get_auction_document(auction_doc_id)
+
+    def save_auction_document(self, auction_document, auction_doc_id):
+        """
+        Append provided document to journal and schedule it for flushing
+
+        :param auction_document: auction document object
+        :param auction_doc_id: identifier of document in database
+        :return: identifier of document and None, as revision is known only
+            after the document is flushed to wrapped database. '_rev' of
+            provided document is not updated, it is resolved by wrapped
+            database on flush
+        """
+        public_document = deepcopy(dict(auction_document))
+        self._append(public_document, auction_doc_id)
+        self._pending[auction_doc_id] = public_document
+        LOGGER.debug("Journaled auction document {} with seq {}".format(auction_doc_id, self._seq[auction_doc_id]),
+                     extra={'MESSAGE_ID': AUCTION_WORKER_DB_JOURNAL_APPEND})
+        self._ensure_flusher()
+        self._wakeup.set()
+        return auction_doc_id, None
+
+    def replay_journal(self, auction_doc_id):
+        """
+        Persist last document state found in journal to wrapped database
+
+        :param auction_doc_id: identifier of document in database
+        :return: last journaled auction document or None
+        """
+        entry = self._read_journal(auction_doc_id)
+        if entry is None:
+            return None
+        LOGGER.info("Replay journaled auction document {} with seq {}".format(auction_doc_id, entry['seq']),
+                    extra={'MESSAGE_ID': AUCTION_WORKER_DB_JOURNAL_REPLAY})
+        self._seq[auction_doc_id] = entry['seq']
+        self._pending[auction_doc_id] = entry['document']
+        self.flush(auction_doc_id)
+        return deepcopy(entry['document'])
+
+    def flush(self, auction_doc_id=None):
+        """
+        Synchronously persist pending document states to wrapped database
+
+        :param auction_doc_id: identifier of document to flush, all
+                               pending documents are flushed if omitted
+        :return: True if all requested documents were persisted
+        """
+        doc_ids = [auction_doc_id] if auction_doc_id else self._pending.keys()
+        flushed = True
+        for doc_id in doc_ids:
+            if doc_id in self._pending:
+                flushed = self._flush_document(doc_id) and flushed
+        return flushed
+
+    def close(self):
+        """
+        Persist pending document states, stop background flusher and close
+        journal files. Journal of document which was not persisted is kept
+        and replayed by the next run.
+
+        :return: True if all pending documents were persisted
+        """
+        flushed = self.flush()
+        if self._flusher is not None:
+            self._flusher.kill()
+            self._flusher = None
+        for fd in self._journals.values():
+            os.close(fd)
+        self._journals.clear()
+        return flushed
 
 
 DATABASE_MAPPING = {
     'couchdb': CouchDB,
+    'memory': InMemoryDatabase,
 }
 
 PKG_NAMESPACE = "openprocurement.auction.texas.database"
@@ -176,4 +638,6 @@ def prepare_database(config):
         )
 
     database = database_class(config)
+    if config.get('write_behind'):
+        database = WriteBehindDatabase(database, config['write_behind'])
     return database
@@ -1,27 +1,33 @@
 # -*- coding: utf-8 -*-
 import logging
 import json
+import time
 
 from pkg_resources import iter_entry_points
-from datetime import datetime, timedelta
+from datetime import timedelta
 from urlparse import urljoin
 from copy import deepcopy
-from yaml import safe_dump as yaml_dump
 from zope.interface import (
     Interface,
     implementer,
     Attribute
 )
 from dateutil.tz import tzlocal
+from gevent import sleep
 from requests import Session as RequestsSession, request
+from requests.exceptions import RequestException
 
 from openprocurement.auction.utils import (
     generate_request_id,
-    get_tender_data,
     make_request,
     get_latest_bid_for_bidder,
     calculate_hash
 )
+from openprocurement.auction.texas import clock
+from openprocurement.auction.texas.metrics import Histogram
+from openprocurement.auction.texas.payload import LazyPayload
+from openprocurement.auction.texas.protocol import serialize_protocol
+from openprocurement.auction.texas.retry import RetryPolicy
 from openprocurement.auction.texas.utils import (
     get_bids,
     open_bidders_name,
@@ -93,7 +99,7 @@ class SimpleTestingFileDataSource(object):
             auction_data = json.load(f)
 
         pause_seconds = timedelta(seconds=120)
-        new_start_time = (datetime.now(tzlocal()) + pause_seconds).isoformat()
+        new_start_time = (clock.now(tzlocal()) + pause_seconds).isoformat()
         auction_data['data']['title'] = '[TEST]' + auction_data['data']['title']
         if 'title_en' in auction_data['data']:
             auction_data['data']['title_en'] = '[TEST]' + auction_data['data']['title_en']
@@ -143,7 +149,7 @@ class FileDataSource(object):
     post_result = False
     post_history_document = False
 
-    def __init__(self, config):
+    def __init__(self, config, resources=None):
         self.path = config['path'] if config['path'].endswith('/') else config['path'] + '/'
         self.file_name = 'auction_' + config['auction_id'] + '.json'
 
@@ -162,6 +168,46 @@ class FileDataSource(object):
         raise NotImplementedError
 
 
+class CachedResponse(object):
+    """
+    Body of API response together with its validators
+    """
+    __slots__ = ('data', 'etag', 'last_modified', 'fetched_at')
+
+    def __init__(self, data, etag=None, last_modified=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time()
+
+
+class ResponseCache(object):
+    """
+    Cache of API responses of one worker keyed by url and credential mode.
+
+    Response younger than 'ttl' seconds is returned without request, older
+    one is revalidated with If-None-Match/If-Modified-Since headers, so
+    unchanged tender is not downloaded again.
+    """
+
+    def __init__(self, ttl=0):
+        self.ttl = ttl
+        self._responses = {}
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+
+    def get(self, url, credentials):
+        return self._responses.get((url, bool(credentials)))
+
+    def is_fresh(self, response):
+        return time.time() - response.fetched_at < self.ttl
+
+    def store(self, url, credentials, response):
+        self._responses[(url, bool(credentials))] = response
+
+    def clear(self):
+        self._responses.clear()
+
+
 @implementer(IDataSource)
 class OpenProcurementAPIDataSource(object):
     """
@@ -173,6 +219,12 @@ class OpenProcurementAPIDataSource(object):
     :parameter ds_credential credential for working with document service
     :parameter HASH_SECRET secret to generate participation url
     :parameter AUCTIONS_URL url of auction module
+    :parameter cache_ttl seconds during which fetched data is used without revalidation
+    :parameter retry options of RetryPolicy of requests for data
+    :parameter latency histogram of request durations by operation
+
+    Datasources created with the same 'resources' dict share HTTP sessions,
+    and availability of API and document service is checked only once.
     """
     source_id = ''
     api_url = ''
@@ -186,16 +238,8 @@ class OpenProcurementAPIDataSource(object):
     post_result = True
     post_history_document = True
 
-    def __init__(self, config):
-
-        # Checking API availability
-        health_url = urljoin(
-            config['resource_api_server'],
-            "/api/{resource_api_version}/health"
-        )
-        response = make_request(url=health_url.format(**config), method="get", retry_count=5)
-        if not response:
-            raise Exception("API can't be reached")
+    def __init__(self, config, resources=None):
+        resources = self.prepare_resources(config, {} if resources is None else resources)
 
         self.api_url = urljoin(
             config['resource_api_server'],
@@ -212,38 +256,122 @@ class OpenProcurementAPIDataSource(object):
         self.hash_secret = config["HASH_SECRET"]
 
         self.with_document_service = config.get('with_document_service', False)
-        self.session = RequestsSession()
+        self.session = resources['session']
+        self.cache = ResponseCache(config.get('cache_ttl', 0))
+        self.retry_policy = RetryPolicy(**config.get('retry', {}))
+        self.latency = Histogram()
         if config.get('with_document_service', False):
             self.ds_credential['username'] = config['DOCUMENT_SERVICE']['username']
             self.ds_credential['password'] = config['DOCUMENT_SERVICE']['password']
             self.document_service_url = config['DOCUMENT_SERVICE']['url']
+            self.session_ds = resources['session_ds']
 
-            # Checking DS availability and setting session_ds attribute
-            request("GET", self.document_service_url, timeout=5)
-            self.session_ds = RequestsSession()
+    @staticmethod
+    def prepare_resources(config, resources):
+        """
+        Check availability of API and document service and create HTTP
+        sessions in 'resources'. Services which were already checked are
+        not checked again.
+        """
+        checked_urls = resources.setdefault('checked_urls', set())
+
+        # Checking API availability
+        health_url = urljoin(
+            config['resource_api_server'],
+            "/api/{resource_api_version}/health"
+        ).format(**config)
+        if health_url not in checked_urls:
+            response = make_request(url=health_url, method="get", retry_count=5)
+            if not response:
+                raise Exception("API can't be reached")
+            checked_urls.add(health_url)
+        if 'session' not in resources:
+            resources['session'] = RequestsSession()
+
+        if config.get('with_document_service', False):
+            # Checking DS availability
+            document_service_url = config['DOCUMENT_SERVICE']['url']
+            if document_service_url not in checked_urls:
+                request("GET", document_service_url, timeout=5)
+                checked_urls.add(document_service_url)
+            if 'session_ds' not in resources:
+                resources['session_ds'] = RequestsSession()
+        return resources
 
     def get_data(self, public=True, with_credentials=False):
         request_id = generate_request_id()
 
         if not public:
-            auction_data = get_tender_data(
-                self.api_url + '/auction',
-                user=self.api_token,
-                request_id=request_id,
-                session=self.session
-            )
-            return auction_data
-        else:
-            credentials = self.api_token if with_credentials else ''
-            auction_data = get_tender_data(
-                self.api_url,
-                request_id=request_id,
-                user=credentials,
-                session=self.session
-            )
-
+            return self._get_cached_data(self.api_url + '/auction', self.api_token, request_id)
+        credentials = self.api_token if with_credentials else ''
+        return self._get_cached_data(self.api_url, credentials, request_id)
+
+    def _get_cached_data(self, url, credentials, request_id):
+        cached = self.cache.get(url, credentials)
+        if cached is not None and self.cache.is_fresh(cached):
+            self.cache.stats['hits'] += 1
+            return deepcopy(cached.data)
+
+        response = self._conditional_get(url, credentials, request_id, cached)
+        if cached is not None and response is not None and response.status_code == 304:
+            self.cache.stats['revalidated'] += 1
+            cached.fetched_at = time.time()
+            return deepcopy(cached.data)
+
+        self.cache.stats['misses'] += 1
+        if response is None:
+            return None
+        auction_data = response.json()
+        self.cache.store(url, credentials, CachedResponse(
+            deepcopy(auction_data),
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified')
+        ))
         return auction_data
 
+    def _conditional_get(self, url, credentials, request_id, cached=None):
+        """
+        Get data, revalidating cached response if it is given. Failed
+        requests are retried with retry policy of datasource, client errors
+        other than 429 are not retried.
+
+        :return: response with data or 304 response, None if data was not
+                 received
+        """
+        headers = {'content-type': 'application/json', 'X-Client-Request-ID': request_id}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+        delays = self.retry_policy.delays()
+        while True:
+            LOGGER.info("Get data from {}".format(url), extra={"JOURNAL_REQUEST_ID": request_id})
+            try:
+                with self.latency.time('get'):
+                    response = self.session.get(
+                        url,
+                        auth=(credentials, '') if credentials else None,
+                        headers=headers,
+                        timeout=300
+                    )
+            except RequestException, e:
+                LOGGER.error("Request error {} error: {}".format(url, e),
+                             extra={"JOURNAL_REQUEST_ID": request_id})
+            else:
+                if response.ok or response.status_code == 304:
+                    return response
+                LOGGER.error("Response from {}: status: {} text: {}".format(url, response.status_code, response.text),
+                             extra={"JOURNAL_REQUEST_ID": request_id})
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    return None
+            delay = next(delays, None)
+            if delay is None:
+                LOGGER.error("Gave up getting data from {}".format(url),
+                             extra={"JOURNAL_REQUEST_ID": request_id})
+                return None
+            sleep(delay)
+
     def update_source_object(self, external_data, db_document, auction_protocol):
         """
         :param external_data: data that has been gotten from api
@@ -301,18 +429,22 @@ class OpenProcurementAPIDataSource(object):
 
         data = {'data': {'bids': posted_result_data}}
         LOGGER.info(
-            "Approved data: {}".format(data),
+            "Approved data: %s", LazyPayload(data),
             extra={"JOURNAL_REQUEST_ID": request_id,
                    "MESSAGE_ID": AUCTION_WORKER_API_APPROVED_DATA}
         )
-        return make_request(
-            self.api_url + '/auction', data=data,
-            user=self.api_token,
-            method='post',
-            request_id=request_id, session=self.session
-        )
+        self.cache.clear()
+        with self.latency.time('post_results'):
+            return make_request(
+                self.api_url + '/auction', data=data,
+                user=self.api_token,
+                method='post',
+                request_id=request_id, session=self.session
+            )
 
     def upload_auction_history_document(self, history_data, doc_id=None):
+        # Tender is going to be changed, so cached views become stale
+        self.cache.clear()
         if self.with_document_service:
             doc_id = self._upload_audit_file_with_document_service(history_data, doc_id)
         else:
@@ -321,13 +453,13 @@ class OpenProcurementAPIDataSource(object):
 
     def _upload_audit_file_with_document_service(self, history_data, doc_id=None):
         request_id = generate_request_id()
-        files = {'file': ('audit_{}.yaml'.format(self.source_id),
-                          yaml_dump(history_data, default_flow_style=False))}
-        ds_response = make_request(self.document_service_url,
-                                   files=files, method='post',
-                                   user=self.ds_credential["username"],
-                                   password=self.ds_credential["password"],
-                                   session=self.session_ds, retry_count=3)
+        files = {'file': ('audit_{}.yaml'.format(self.source_id), serialize_protocol(history_data))}
+        with self.latency.time('document_service'):
+            ds_response = make_request(self.document_service_url,
+                                       files=files, method='post',
+                                       user=self.ds_credential["username"],
+                                       password=self.ds_credential["password"],
+                                       session=self.session_ds, retry_count=3)
 
         if doc_id:
             method = 'put'
@@ -336,11 +468,12 @@ class OpenProcurementAPIDataSource(object):
             method = 'post'
             path = self.api_url + '/documents'
 
-        response = make_request(path, data=ds_response,
-                                user=self.api_token,
-                                method=method, request_id=request_id, session=self.session,
-                                retry_count=2
-                                )
+        with self.latency.time('upload_document'):
+            response = make_request(path, data=ds_response,
+                                    user=self.api_token,
+                                    method=method, request_id=request_id, session=self.session,
+                                    retry_count=2
+                                    )
         if response:
             doc_id = response["data"]['id']
             LOGGER.info(
@@ -357,8 +490,7 @@ class OpenProcurementAPIDataSource(object):
 
     def _upload_audit_file_without_document_service(self, history_data, doc_id=None):
         request_id = generate_request_id()
-        files = {'file': ('audit_{}.yaml'.format(self.source_id),
-                          yaml_dump(history_data, default_flow_style=False))}
+        files = {'file': ('audit_{}.yaml'.format(self.source_id), serialize_protocol(history_data))}
         if doc_id:
             method = 'put'
             path = self.api_url + '/documents/{}'.format(doc_id)
@@ -366,11 +498,12 @@ class OpenProcurementAPIDataSource(object):
             method = 'post'
             path = self.api_url + '/documents'
 
-        response = make_request(path, files=files,
-                                user=self.api_token,
-                                method=method, request_id=request_id, session=self.session,
-                                retry_count=2
-                                )
+        with self.latency.time('upload_document'):
+            response = make_request(path, files=files,
+                                    user=self.api_token,
+                                    method=method, request_id=request_id, session=self.session,
+                                    retry_count=2
+                                    )
         if response:
             doc_id = response["data"]['id']
             LOGGER.info(
@@ -404,10 +537,12 @@ class OpenProcurementAPIDataSource(object):
         LOGGER.info("Set auction and participation urls for tender {}".format(self.source_id),
                     extra={"JOURNAL_REQUEST_ID": request_id,
                            "MESSAGE_ID": AUCTION_WORKER_SET_AUCTION_URLS})
-        LOGGER.info(repr(patch_data))
-        make_request(self.api_url + '/auction', patch_data,
-                     user=self.api_token,
-                     request_id=request_id, session=self.session)
+        LOGGER.info('%s', LazyPayload(patch_data))
+        self.cache.clear()
+        with self.latency.time('set_participation_urls'):
+            make_request(self.api_url + '/auction', patch_data,
+                         user=self.api_token,
+                         request_id=request_id, session=self.session)
 
 
 DATASOURCE_MAPPING = {
@@ -423,7 +558,7 @@ for entry_point in iter_entry_points(PKG_NAMESPACE):
     DATASOURCE_MAPPING[entry_point.name] = plugin()
 
 
-def prepare_datasource(config):
+def prepare_datasource(config, resources=None):
     datasource_type = config.get('type')
     datasource_class = DATASOURCE_MAPPING.get(datasource_type, None)
 
@@ -435,5 +570,18 @@ def prepare_datasource(config):
             )
         )
 
-    datasource = datasource_class(config)
-    return datasource
+    if resources is None:
+        return datasource_class(config)
+    return datasource_class(config, resources=resources)
+
+
+def prepare_datasource_resources(config, resources):
+    """
+    Prepare resources shared by datasources of type from config, so
+    datasources created concurrently with these resources find them ready
+    """
+    datasource_class = DATASOURCE_MAPPING.get(config.get('type'), None)
+    prepare_resources = getattr(datasource_class, 'prepare_resources', None)
+    if prepare_resources is not None:
+        prepare_resources(config, resources)
+    return resources
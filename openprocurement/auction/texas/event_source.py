@@ -1,15 +1,11 @@
 from sse import Sse as PySse
-from gevent.queue import Queue
 from flask import (
     current_app, Blueprint, request,
     session, Response, jsonify, abort
 )
-from openprocurement.auction.event_source import (
-    send_event_to_client, send_event, SseStream
-)
-from openprocurement.auction.utils import (
-    prepare_extra_journal_fields, get_bidder_id
-)
+from openprocurement.auction.utils import prepare_extra_journal_fields
+from openprocurement.auction.texas.broadcast import BroadcastStream
+from openprocurement.auction.texas.identity import get_bidder_id
 
 
 sse = Blueprint('sse', __name__)
@@ -30,10 +26,8 @@ def set_sse_timeout():
             bidder = bidder_data['bidder_id']
             if 'timeout' in request.json:
                 session["sse_timeout"] = int(request.json['timeout'])
-                send_event_to_client(
-                    bidder, session['client_id'], '',
-                    event='StopSSE'
-                )
+                # Current stream is closed, so client reconnects with new timeout
+                current_app.broadcast_bus.unsubscribe(bidder, session['client_id'])
                 return jsonify({'timeout': session["sse_timeout"]})
     return abort(401)
 
@@ -47,19 +41,12 @@ def event_source():
     if 'remote_oauth' in session and 'client_id' in session:
         bidder_data = get_bidder_id(current_app, session)
         if bidder_data:
-            valid_bidder = False
             client_hash = session['client_id']
             bidder = bidder_data['bidder_id']
-            for bidder_info in current_app.context['bidders_data']:
-                if bidder_info['id'] == bidder:
-                    valid_bidder = True
-                    break
-
-            if valid_bidder:
+            if bidder in current_app.context['bidders_index']:
                 if bidder not in current_app.auction_bidders:
                     current_app.auction_bidders[bidder] = {
-                        "clients": {},
-                        "channels": {}
+                        "clients": {}
                     }
 
                 if client_hash not in current_app.auction_bidders[bidder]:
@@ -72,7 +59,6 @@ def event_source():
                         ),
                         'User-Agent': request.headers.get('User-Agent'),
                     }
-                    current_app.auction_bidders[bidder]["channels"][client_hash] = Queue()
 
                 current_app.logger.info(
                     'Send identification for bidder: {} with client_hash {}'.format(bidder, client_hash),
@@ -82,22 +68,26 @@ def event_source():
                                        "client_id": client_hash,
                                        "return_url": session.get('return_url', '')}
 
-                send_event_to_client(bidder, client_hash, identification_data,
-                                     "Identification")
+                bus = current_app.broadcast_bus
+                channel = bus.subscribe(bidder, client_hash)
+                bus.send(bidder, client_hash, "Identification", identification_data)
+
+                feed = current_app.context.get('document_feed')
+                if feed is not None and request.args.get('seq', '').isdigit():
+                    feed.resume(bidder, client_hash, int(request.args['seq']))
 
                 if not session.get("sse_timeout", 0):
                     current_app.logger.debug('Send ClientsList')
-                    send_event(
-                        bidder,
+                    bus.publish(
+                        "ClientsList",
                         current_app.auction_bidders[bidder]["clients"],
-                        "ClientsList"
+                        bidder_id=bidder
                     )
                 response = Response(
-                    SseStream(
-                        current_app.auction_bidders[bidder]["channels"][client_hash],
-                        bidder_id=bidder,
-                        client_id=client_hash,
-                        timeout=session.get("sse_timeout", 0)
+                    BroadcastStream(
+                        bus, bidder, client_hash, channel,
+                        timeout=session.get("sse_timeout", 0),
+                        clients=current_app.auction_bidders[bidder]["clients"]
                     ),
                     direct_passthrough=True,
                     mimetype='text/event-stream',
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime
 from decimal import Decimal
 
 import wtforms_json
@@ -10,35 +9,45 @@ from wtforms.validators import DataRequired, ValidationError
 from openprocurement.auction.utils import prepare_extra_journal_fields
 from openprocurement.auction.worker_core.constants import TIMEZONE
 
+from openprocurement.auction.texas import clock
 from openprocurement.auction.texas.constants import MAIN_ROUND
-from openprocurement.auction.texas.utils import lock_server
+from openprocurement.auction.texas.utils import RoundState
 
 
 wtforms_json.init()
 
 
-def validate_bid_value(form, field):
+def check_bid(state, amount):
     """
     Bid must be higher or equal to previous bidder bid amount plus minimalStep
     amount. Bid amount should also be multiple of minimalStep amount.
+
+    :param state: RoundState of auction
+    :raises ValidationError: if bid is not valid
     """
-    stage_id = form.document['current_stage'] if form.document['current_stage'] >= 0 else 0
-    minimal_step = form.document['minimalStep']['amount']
-    current_amount = form.document['stages'][stage_id].get('amount')
-    if app.context['server_actions'].locked():
-        raise ValidationError(u'Another bid is already processing')
-    if form.document['stages'][stage_id]['type'] != MAIN_ROUND:
+    if state.stage_type != MAIN_ROUND:
         raise ValidationError(u'Current stage does not allow bidding')
-    if field.data < current_amount:
+    if amount < state.amount:
         raise ValidationError(u'Too low value')
-    if Decimal(field.data).quantize(Decimal('0.01')) % Decimal(minimal_step).quantize(Decimal('0.01')) and field.data != current_amount:
+    if amount != state.amount and Decimal(amount).quantize(Decimal('0.01')) % state.quantized_step:
         raise ValidationError(
-            u'Value should be a multiplier of ' 
-            u'a minimalStep amount ({})'.format(minimal_step)
+            u'Value should be a multiplier of '
+            u'a minimalStep amount ({})'.format(state.minimal_step)
         )
 
 
+def validate_bid_value(form, field):
+    """
+    Pre-validation of bid against form.round_state, so invalid bids are
+    rejected without reading the auction document or waiting for the server
+    lock. Bids which pass it are checked again by the bid queue.
+    """
+    check_bid(form.round_state, field.data)
+
+
 class BidsForm(Form):
+    round_state = None
+
     bidder_id = StringField(
         'bidder_id',
         validators=[
@@ -56,31 +65,33 @@ class BidsForm(Form):
 
 def form_handler():
     form = app.bids_form.from_json(request.json)
-    form.document = app.context['auction_document']
-    current_time = datetime.now(TIMEZONE)
+    form.round_state = app.context.get('round_state')
+    if form.round_state is None:
+        form.round_state = RoundState.from_document(app.context.snapshot('auction_document'))
+    current_time = clock.now(TIMEZONE)
     if form.validate():
-        with lock_server(app.context['server_actions']):
-            ok = app.bids_handler.add_bid(form.document['current_stage'],
-                                          {'amount': form.data['bid'],
-                                           'bidder_id': form.data['bidder_id'],
-                                           'time': current_time.isoformat()})
-            if not isinstance(ok, Exception):
-                app.logger.info(
-                    "Bidder {} with client_id {} placed bid {} in {}".format(
-                        form.data['bidder_id'], session['client_id'],
-                        form.data['bid'], current_time.isoformat()
-                    ), extra=prepare_extra_journal_fields(request.headers)
-                )
-                return {'status': 'ok', 'data': form.data}
-            else:
-                app.logger.info(
-                    "Bidder {} with client_id {} wants place "
-                    "bid {} in {} with errors {}".format(
-                        form.data['bidder_id'], session['client_id'],
-                        form.data['bid'], current_time.isoformat(), repr(ok)
-                    ), extra=prepare_extra_journal_fields(request.headers)
-                )
-                return {"status": "failed", "errors": [[repr(ok)]]}
+        ok = app.bid_queue.submit({'amount': form.data['bid'],
+                                   'bidder_id': form.data['bidder_id'],
+                                   'time': current_time.isoformat()})
+        if not isinstance(ok, Exception):
+            app.logger.info(
+                "Bidder {} with client_id {} placed bid {} in {}".format(
+                    form.data['bidder_id'], session['client_id'],
+                    form.data['bid'], current_time.isoformat()
+                ), extra=prepare_extra_journal_fields(request.headers)
+            )
+            return {'status': 'ok', 'data': form.data}
+        app.logger.info(
+            "Bidder {} with client_id {} wants place "
+            "bid {} in {} with errors {}".format(
+                form.data['bidder_id'], session['client_id'],
+                form.data['bid'], current_time.isoformat(), repr(ok)
+            ), extra=prepare_extra_journal_fields(request.headers)
+        )
+        if isinstance(ok, ValidationError):
+            # Bid became invalid while it was waiting in the queue
+            return {'status': 'failed', 'errors': {'bid': [ok.args[0]]}}
+        return {"status": "failed", "errors": [[repr(ok)]]}
     else:
         app.logger.info(
             "Bidder {} with client_id {} wants place "
@@ -90,4 +101,7 @@ def form_handler():
                 repr(form.errors)
             ), extra=prepare_extra_journal_fields(request.headers)
         )
+        for messages in form.errors.values():
+            for message in messages:
+                app.bid_queue.reject(message)
         return {'status': 'failed', 'errors': form.errors}
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import iso8601
+from dateutil.tz import tzlocal
+
+from openprocurement.auction.utils import get_bidder_id as resolve_bidder_id
+from openprocurement.auction.texas.constants import (
+    IDENTITY_CACHE_SIZE,
+    IDENTITY_CACHE_TTL,
+    INVALIDATE_GRANT,
+)
+
+
+class IdentityCache(object):
+    """
+    Bounded cache of bidder data resolved by OAuth provider, keyed by access
+    token. Entry is kept for 'ttl' seconds, but never after the moment when
+    grant is about to expire, so check_authorization still asks bidder to
+    re-login in time.
+
+    Attributes:
+        stats: counters of hits and misses
+        :type stats: dict
+    """
+
+    def __init__(self, size=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, token):
+        entry = self._entries.get(token)
+        if entry is not None:
+            expires_at, bidder_data = entry
+            if expires_at > time.time():
+                self.stats['hits'] += 1
+                return bidder_data
+            del self._entries[token]
+        self.stats['misses'] += 1
+
+    def set(self, token, bidder_data):
+        lifetime = self.ttl
+        if bidder_data.get('expires'):
+            grant_timeout = iso8601.parse_date(bidder_data['expires']) - datetime.now(tzlocal())
+            lifetime = min(lifetime, (grant_timeout - INVALIDATE_GRANT).total_seconds())
+        if lifetime <= 0:
+            return
+        self._entries.pop(token, None)
+        self._entries[token] = (time.time() + lifetime, bidder_data)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token):
+        self._entries.pop(token, None)
+
+
+def get_bidder_id(app, session):
+    """
+    Same as openprocurement.auction.utils.get_bidder_id, but bidder data is
+    taken from app.identity_cache when possible
+    """
+    if 'remote_oauth' not in session or 'client_id' not in session:
+        return resolve_bidder_id(app, session)
+    token = tuple(session['remote_oauth'])
+    bidder_data = app.identity_cache.get(token)
+    if bidder_data is None:
+        bidder_data = resolve_bidder_id(app, session)
+        if bidder_data:
+            app.identity_cache.set(token, bidder_data)
+    return bidder_data
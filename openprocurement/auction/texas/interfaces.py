@@ -4,3 +4,11 @@ from zope.interface import Interface
 
 class ITexasAuction(Interface):
     """ Texas Auction """
+
+
+class IJobService(Interface):
+    """
+    Interface of service which schedules auction jobs. It is defined apart
+    from the scheduler, so modules which only look the service up do not
+    import APScheduler.
+    """
@@ -7,6 +7,12 @@ AUCTION_WORKER_DB_SAVE_DOC = uuid.UUID('48b5f9fef4124cf39be6d2e4722a71c3')
 AUCTION_WORKER_DB_SAVE_DOC_ERROR = uuid.UUID('b219ee898b834628be23424d0c27a8b8')
 AUCTION_WORKER_DB_GET_DOC_UNHANDLED_ERROR = uuid.UUID('2188fca7e99a4d409817567f894421cd')
 AUCTION_WORKER_DB_SAVE_DOC_UNHANDLED_ERROR = uuid.UUID('4b650dea8eb84412a4d630265587dbcb')
+AUCTION_WORKER_DB_SAVE_DOC_CONFLICT = uuid.UUID('5a7ea5c773fe46fe84379b5093b845da')
+AUCTION_WORKER_DB_JOURNAL_APPEND = uuid.UUID('292e33adbf4a4dbe960e4bd4f1a23fac')
+AUCTION_WORKER_DB_JOURNAL_REPLAY = uuid.UUID('ac17fbee6d4a4e84b7cbed3c19e03522')
+AUCTION_WORKER_DB_JOURNAL_FLUSH_ERROR = uuid.UUID('79cbb3ae9ce7490db49e0d5b2d69de05')
+AUCTION_WORKER_DB_CIRCUIT_OPENED = uuid.UUID('9abc563734b04206a18fbf998c1f1796')
+AUCTION_WORKER_DB_CIRCUIT_CLOSED = uuid.UUID('0d0c237ee0ee49fdb4fed627d6ffa12a')
 
 AUCTION_WORKER_SERVICE_PREPARE_SERVER = uuid.UUID('7ddc92a966f7492e8dbf59f7916831c4')
 AUCTION_WORKER_SERVICE_STOP_AUCTION_WORKER = uuid.UUID('e7c0a6eb8ec441e2a7cf32bad5ffa57a')
@@ -21,6 +27,11 @@ AUCTION_WORKER_SERVICE_AUCTION_CANCELED = uuid.UUID('77568c4543e24b70a7633d87153
 AUCTION_WORKER_SERVICE_AUCTION_STATUS_CANCELED = uuid.UUID('38b2145fa25d41198493526085168bd2')
 AUCTION_WORKER_SERVICE_AUCTION_RESCHEDULE = uuid.UUID('f11bba4b55d547f1aa2e8cb2e13e4485')
 AUCTION_WORKER_SERVICE_AUCTION_NOT_FOUND = uuid.UUID('ff4a1d5cf0134bf48a458b65805c9a6e')
+AUCTION_WORKER_SERVICE_JOB_EXECUTED = uuid.UUID('8ea097be11cc499aa9fb4ee3f878c9f6')
+AUCTION_WORKER_SERVICE_JOB_MISSED = uuid.UUID('fdab591b885e4fcd8ffdeb0de0bdc7bc')
+AUCTION_WORKER_SERVICE_STARTUP = uuid.UUID('31da523a82f84b3196ed09b6f7b741a5')
+AUCTION_WORKER_DAEMON_STARTED = uuid.UUID('1d273f01b77f4123b25218dacdf8de0a')
+AUCTION_WORKER_DAEMON_STOPPED = uuid.UUID('c487a777a2a249309e86d9b208eb0771')
 
 AUCTION_WORKER_BIDS_LATEST_BID_CANCELLATION = uuid.UUID('c558309b45004ce2bd52ec4845e43b48')
 
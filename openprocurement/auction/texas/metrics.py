@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_PREFIX = 'auction_texas_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram(object):
+    """
+    Histogram of durations in seconds with fixed buckets. Observation is
+    counted in a single bucket, buckets are made cumulative only when
+    metrics are rendered, so observing costs one bisect and three additions.
+
+    Attributes:
+        series: bucket counters, number and sum of observations per label
+        :type series: dict
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, label=''):
+        series = self.series.get(label)
+        if series is None:
+            series = self.series[label] = {'buckets': [0] * (len(self.buckets) + 1), 'count': 0, 'sum': 0.0}
+        series['buckets'][bisect_left(self.buckets, value)] += 1
+        series['count'] += 1
+        series['sum'] += value
+
+    @contextmanager
+    def time(self, label=''):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - started, label)
+
+
+def _escape(value):
+    return unicode(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in labels) + '}'
+
+
+class MetricsWriter(object):
+    """
+    Accumulates lines of Prometheus text exposition format
+    """
+
+    def __init__(self, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self.lines = []
+
+    def metric(self, name, metric_type, help_text, samples):
+        """
+        :param samples: iterable of (labels, value) pairs, where labels is a
+                        sequence of (name, value) pairs
+        """
+        name = self.prefix + name
+        self.lines.append('# HELP {} {}'.format(name, help_text))
+        self.lines.append('# TYPE {} {}'.format(name, metric_type))
+        for labels, value in samples:
+            self.lines.append('{}{} {}'.format(name, _labels(labels), repr(float(value))))
+
+    def histogram(self, name, help_text, histogram, label_name=None):
+        name = self.prefix + name
+        self.lines.append('# HELP {} {}'.format(name, help_text))
+        self.lines.append('# TYPE {} histogram'.format(name))
+        for label, series in sorted(histogram.series.items()):
+            labels = [(label_name, label)] if label_name else []
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), series['buckets']):
+                cumulative += count
+                bucket_labels = labels + [('le', bound if bound == '+Inf' else repr(float(bound)))]
+                self.lines.append('{}_bucket{} {}'.format(name, _labels(bucket_labels), cumulative))
+            self.lines.append('{}_count{} {}'.format(name, _labels(labels), series['count']))
+            self.lines.append('{}_sum{} {}'.format(name, _labels(labels), repr(series['sum'])))
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+
+# Payloads are logged as a whole unless limit is configured
+PAYLOAD_MAX_SIZE = None
+
+SETTINGS = {
+    'max_size': PAYLOAD_MAX_SIZE,
+    'digest_only': False,
+}
+
+
+def configure_payload_logging(config):
+    """
+    Set how logged payloads are rendered
+
+    :param config: 'max_size' - number of bytes of payload text kept in log
+                   record, None or 0 for no limit; 'digest_only' - log only
+                   size and digest of payloads. Neither applies to audit
+                   payloads
+    """
+    SETTINGS['max_size'] = config.get('max_size', PAYLOAD_MAX_SIZE)
+    SETTINGS['digest_only'] = config.get('digest_only', False)
+
+
+class LazyPayload(object):
+    """
+    Argument of log record which serializes payload only when message of
+    the record is formatted, i.e. when a handler emits it. Records dropped
+    by logger or handler levels cost nothing. Text is rendered once and
+    shared by all handlers.
+
+        LOGGER.info('Approved data: %s', LazyPayload(data))
+
+    :param serializer: callable which returns text of payload
+    :param audit: payload is an audit record, e.g. auction protocol, which
+                  is always logged as a whole
+    """
+
+    def __init__(self, payload, serializer=repr, audit=False):
+        self.payload = payload
+        self.serializer = serializer
+        self.audit = audit
+        self._text = None
+
+    def render(self):
+        text = self.serializer(self.payload)
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        else:
+            text = str(text)
+        if self.audit:
+            return text
+        digest = hashlib.sha1(text).hexdigest()
+        if SETTINGS['digest_only']:
+            return '<payload size={} sha1={}>'.format(len(text), digest)
+        max_size = SETTINGS['max_size']
+        if max_size and len(text) > max_size:
+            return '{}... <truncated payload size={} sha1={}>'.format(text[:max_size], len(text), digest)
+        return text
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self.render()
+        return self._text
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+from copy import deepcopy
+from tempfile import SpooledTemporaryFile
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as ProtocolDumper
+except ImportError:  # PyYAML built without LibYAML
+    from yaml import SafeDumper as ProtocolDumper
+
+
+PROTOCOL_SPOOL_SIZE = 1024 * 1024
+PROTOCOL_CACHE_SIZE = 4
+
+
+class ProtocolArtifact(object):
+    """
+    Auction protocol serialized to YAML. Protocol is emitted straight to a
+    spooled temporary file, which is kept in memory until it grows over
+    'spool_size' bytes and is moved to disk after that.
+
+    Artifact is a file-like object, read() always returns the whole
+    document, so it may be passed as a file of multipart upload and sent
+    again when request is retried.
+
+    Attributes:
+        size: size of serialized protocol in bytes
+        :type size: int
+    """
+
+    def __init__(self, protocol, spool_size=PROTOCOL_SPOOL_SIZE):
+        self._file = SpooledTemporaryFile(max_size=spool_size)
+        yaml.dump(protocol, self._file, Dumper=ProtocolDumper, default_flow_style=False, encoding='utf-8')
+        self.size = self._file.tell()
+
+    def read(self, size=-1):
+        self._file.seek(0)
+        return self._file.read(size)
+
+    def __str__(self):
+        return self.read()
+
+    def close(self):
+        self._file.close()
+
+
+class ProtocolSerializer(object):
+    """
+    Serializes protocols and keeps last artifacts, so protocol which is
+    logged and uploaded is emitted only once. Artifact is reused only for
+    protocol equal to the serialized one.
+    """
+
+    def __init__(self, cache_size=PROTOCOL_CACHE_SIZE, spool_size=PROTOCOL_SPOOL_SIZE):
+        self.spool_size = spool_size
+        self._artifacts = deque(maxlen=cache_size)
+        self.stats = {'serialized': 0, 'reused': 0}
+
+    def serialize(self, protocol):
+        if isinstance(protocol, ProtocolArtifact):
+            return protocol
+        for snapshot, artifact in self._artifacts:
+            if snapshot == protocol:
+                self.stats['reused'] += 1
+                return artifact
+        artifact = ProtocolArtifact(protocol, self.spool_size)
+        self.stats['serialized'] += 1
+        self._artifacts.append((deepcopy(protocol), artifact))
+        return artifact
+
+
+PROTOCOL_SERIALIZER = ProtocolSerializer()
+
+
+def serialize_protocol(protocol):
+    return PROTOCOL_SERIALIZER.serialize(protocol)
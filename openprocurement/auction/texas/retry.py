@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import random
+import time
+
+
+RETRY_ATTEMPTS = 10
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 5.0
+RETRY_BUDGET = 30.0
+
+CIRCUIT_FAILURE_THRESHOLD = 20
+CIRCUIT_RESET_TIMEOUT = 30.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class RetryPolicy(object):
+    """
+    Exponential backoff with full jitter. Delay before n-th retry is taken
+    at random from [0, min(max_delay, base_delay * 2 ** n)], so workers which
+    failed at the same moment do not retry in lockstep.
+
+    Operation is given up after 'attempts' attempts or when the next retry
+    would start later than 'budget' seconds after the first attempt.
+    """
+
+    def __init__(self, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 budget=RETRY_BUDGET, jitter=True, seed=None):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def delay(self, retry):
+        delay = min(self.max_delay, self.base_delay * 2 ** retry)
+        if self.jitter:
+            delay = self._random.uniform(0, delay)
+        return delay
+
+    def delays(self):
+        """
+        Delays before retries of operation which is attempted right now,
+        generator is exhausted when operation should be given up
+        """
+        return self._delays(time.time() + self.budget)
+
+    def _delays(self, deadline):
+        for retry in xrange(self.attempts - 1):
+            delay = self.delay(retry)
+            if time.time() + delay > deadline:
+                return
+            yield delay
+
+
+class CircuitBreaker(object):
+    """
+    Refuses requests to a failing service. Circuit opens after
+    'failure_threshold' failed requests in a row and refuses requests for
+    'reset_timeout' seconds, then a single trial request is allowed. Circuit
+    closes after successful request and opens again after failed one.
+    Threshold 0 disables the breaker.
+
+    Attributes:
+        stats: state of circuit, number of failed requests in a row, number
+        of times circuit was opened and number of refused requests
+        :type stats: dict
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._opened_at = None
+        self.stats = {'state': CLOSED, 'failures': 0, 'opened': 0, 'refused': 0}
+
+    def allow(self):
+        if self.stats['state'] == CLOSED:
+            return True
+        # Next trial is allowed only after timeout, also when the previous
+        # trial never reported its outcome
+        if time.time() - self._opened_at >= self.reset_timeout:
+            self.stats['state'] = HALF_OPEN
+            self._opened_at = time.time()
+            return True
+        self.stats['refused'] += 1
+        return False
+
+    def record_success(self):
+        """
+        :return: True if circuit was closed by this request
+        """
+        self.stats['failures'] = 0
+        if self.stats['state'] == CLOSED:
+            return False
+        self.stats['state'] = CLOSED
+        return True
+
+    def record_failure(self):
+        """
+        :return: True if circuit was opened by this request
+        """
+        self.stats['failures'] += 1
+        if not self.failure_threshold:
+            return False
+        if self.stats['state'] == HALF_OPEN or (
+                self.stats['state'] == CLOSED and self.stats['failures'] >= self.failure_threshold):
+            self.stats['state'] = OPEN
+            self.stats['opened'] += 1
+            self._opened_at = time.time()
+            return True
+        return False
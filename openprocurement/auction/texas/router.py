@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from gevent import killall
+from werkzeug.exceptions import NotFound
+from werkzeug.wsgi import pop_path_info, peek_path_info
+
+
+class MountedApp(object):
+    """
+    Handle of auction application served by AuctionsRouter. Provides the
+    same stop() method as WSGIServer, so it can be stored as context server.
+    Services of the application are stopped and its greenlets are killed
+    together with it
+    """
+
+    def __init__(self, router, auction_doc_id, app, greenlets=(), services=()):
+        self.router = router
+        self.auction_doc_id = auction_doc_id
+        self.app = app
+        self.greenlets = list(greenlets)
+        self.services = list(services)
+
+    def stop(self):
+        self.router.unmount(self.auction_doc_id)
+        for service in self.services:
+            service.stop()
+        killall(self.greenlets, block=False)
+        self.greenlets = []
+        self.services = []
+
+
+class AuctionsRouter(object):
+    """
+    WSGI application which dispatches requests to auction applications by
+    the first path segment, i.e. /<auction_doc_id>/postbid is handled by
+    application of auction <auction_doc_id> as /postbid
+    """
+
+    def __init__(self):
+        self.apps = {}
+        self.base_url = None
+
+    def mount(self, auction_doc_id, app, greenlets=(), services=()):
+        self.apps[auction_doc_id] = app
+        return MountedApp(self, auction_doc_id, app, greenlets, services)
+
+    def unmount(self, auction_doc_id):
+        self.apps.pop(auction_doc_id, None)
+
+    def __call__(self, environ, start_response):
+        app = self.apps.get(peek_path_info(environ))
+        if app is None:
+            return NotFound()(environ, start_response)
+        pop_path_info(environ)
+        return app(environ, start_response)
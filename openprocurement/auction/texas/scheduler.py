@@ -1,14 +1,15 @@
 # -*- coding: utf-8 -*-
 import logging
+import time
 from datetime import datetime
-from yaml import safe_dump as yaml_dump
 
-from zope.interface import (
-    Interface,
-    implementer,
-)
+from zope.interface import implementer
 from zope.component import getGlobalSiteManager
 
+from apscheduler.events import (
+    EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+)
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.gevent import GeventScheduler
 from openprocurement.auction.worker_core.constants import TIMEZONE
 from openprocurement.auction.executor import AuctionsExecutor
@@ -16,16 +17,22 @@ from openprocurement.auction.utils import (
     generate_request_id,
     delete_mapping
 )
+from openprocurement.auction.texas import clock
 from openprocurement.auction.texas.constants import (
-    END, PREANNOUNCEMENT
+    END, PREANNOUNCEMENT, SCHEDULER_LAG_WARNING
 )
 from openprocurement.auction.texas.journal import (
     AUCTION_WORKER_SERVICE_START_NEXT_STAGE,
-    AUCTION_WORKER_SERVICE_END_AUCTION
+    AUCTION_WORKER_SERVICE_END_AUCTION,
+    AUCTION_WORKER_SERVICE_JOB_EXECUTED,
+    AUCTION_WORKER_SERVICE_JOB_MISSED
 )
 from openprocurement.auction.texas.context import IContext
 from openprocurement.auction.texas.database import IDatabase
 from openprocurement.auction.texas.datasource import IDataSource
+from openprocurement.auction.texas.interfaces import IJobService
+from openprocurement.auction.texas.payload import LazyPayload
+from openprocurement.auction.texas.protocol import serialize_protocol
 from openprocurement.auction.texas.utils import (
     lock_server,
     update_auction_document,
@@ -35,43 +42,213 @@ from openprocurement.auction.texas.utils import (
 
 LOGGER = logging.getLogger('Auction Worker Texas')
 
-SCHEDULER = GeventScheduler(job_defaults={"misfire_grace_time": 100},
+class TimeWarpScheduler(GeventScheduler):
+    """
+    Gevent scheduler which takes run dates of jobs in time of worker clock
+    and fires them at the corresponding wall-clock moment, so with virtual
+    clock date jobs are executed as fast as the clock runs
+    """
+
+    @staticmethod
+    def _warp(options, key):
+        if isinstance(options.get(key), datetime):
+            options[key] = clock.to_real(options[key])
+
+    def add_job(self, *args, **kwargs):
+        self._warp(kwargs, 'run_date')
+        return super(TimeWarpScheduler, self).add_job(*args, **kwargs)
+
+    def reschedule_job(self, job_id, jobstore=None, trigger=None, **trigger_args):
+        self._warp(trigger_args, 'run_date')
+        return super(TimeWarpScheduler, self).reschedule_job(job_id, jobstore, trigger, **trigger_args)
+
+    def modify_job(self, job_id, jobstore=None, **changes):
+        self._warp(changes, 'next_run_time')
+        return super(TimeWarpScheduler, self).modify_job(job_id, jobstore, **changes)
+
+
+class JobMonitor(object):
+    """
+    Listener of scheduler events which records how late jobs are fired
+    compared with their planned run time, how long they are executed and
+    which of them are missed. Every run is written to the journal.
+
+    Jobs are grouped by the last part of their id ('pause', 'announcement',
+    'start'), so jobs of auctions hosted by one worker share counters.
+
+    Attributes:
+        stats: counters of runs, errors and misfires and lag and duration of
+        runs in seconds per kind of job
+        :type stats: dict
+    """
+
+    def __init__(self, lag_warning=SCHEDULER_LAG_WARNING):
+        self.lag_warning = lag_warning
+        self.stats = {}
+        self._fired = {}
+
+    def install(self, scheduler):
+        scheduler.add_listener(self.on_submitted, EVENT_JOB_SUBMITTED)
+        scheduler.add_listener(self.on_executed, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+        scheduler.add_listener(self.on_missed, EVENT_JOB_MISSED)
+
+    @staticmethod
+    def job_kind(job_id):
+        return job_id.rsplit(':', 1)[-1]
+
+    def _job_stats(self, job_id):
+        kind = self.job_kind(job_id)
+        if kind not in self.stats:
+            self.stats[kind] = {
+                'runs': 0,
+                'errors': 0,
+                'misfires': 0,
+                'lag_last': 0.0,
+                'lag_max': 0.0,
+                'lag_total': 0.0,
+                'duration_last': 0.0,
+                'duration_max': 0.0,
+                'duration_total': 0.0,
+            }
+        return self.stats[kind]
+
+    def on_submitted(self, event):
+        for run_time in event.scheduled_run_times:
+            self._fired[(event.job_id, run_time)] = (datetime.now(run_time.tzinfo), time.time())
+
+    def on_executed(self, event):
+        planned = event.scheduled_run_time
+        fired_at, started = self._fired.pop(
+            (event.job_id, planned), (datetime.now(planned.tzinfo), time.time())
+        )
+        lag = max((fired_at - planned).total_seconds(), 0.0)
+        duration = time.time() - started
+
+        stats = self._job_stats(event.job_id)
+        stats['runs'] += 1
+        if event.exception is not None:
+            stats['errors'] += 1
+        stats['lag_last'] = lag
+        stats['lag_max'] = max(stats['lag_max'], lag)
+        stats['lag_total'] += lag
+        stats['duration_last'] = duration
+        stats['duration_max'] = max(stats['duration_max'], duration)
+        stats['duration_total'] += duration
+
+        log = LOGGER.warning if lag > self.lag_warning else LOGGER.info
+        log(
+            'Job {} fired {:.3f}s after planned time and took {:.3f}s'.format(event.job_id, lag, duration),
+            extra={
+                'MESSAGE_ID': AUCTION_WORKER_SERVICE_JOB_EXECUTED,
+                'JOURNAL_JOB_ID': event.job_id,
+                'JOURNAL_JOB_PLANNED_TIME': planned.isoformat(),
+                'JOURNAL_JOB_FIRED_TIME': fired_at.isoformat(),
+                'JOURNAL_JOB_LAG': '{:.6f}'.format(lag),
+                'JOURNAL_JOB_DURATION': '{:.6f}'.format(duration),
+                'JOURNAL_JOB_FAILED': event.exception is not None,
+            }
+        )
+
+    def on_missed(self, event):
+        planned = event.scheduled_run_time
+        self._job_stats(event.job_id)['misfires'] += 1
+        LOGGER.error(
+            'Job {} planned at {} is missed'.format(event.job_id, planned.isoformat()),
+            extra={
+                'MESSAGE_ID': AUCTION_WORKER_SERVICE_JOB_MISSED,
+                'JOURNAL_JOB_ID': event.job_id,
+                'JOURNAL_JOB_PLANNED_TIME': planned.isoformat(),
+                'JOURNAL_JOB_LAG': '{:.6f}'.format(
+                    (datetime.now(planned.tzinfo) - planned).total_seconds()
+                ),
+            }
+        )
+
+
+SCHEDULER = TimeWarpScheduler(job_defaults={"misfire_grace_time": 100},
                             executors={'default': AuctionsExecutor()},
                             logger=LOGGER)
 SCHEDULER.timezone = TIMEZONE
-
-
-class IJobService(Interface):
-    pass
+SCHEDULER_MONITOR = JobMonitor()
+SCHEDULER_MONITOR.install(SCHEDULER)
 
 
 @implementer(IJobService)
 class JobService(object):
+    """
+    Class for scheduling auction jobs
+
+    Handles of added jobs are kept, so planned job is moved to a new date
+    instead of being removed and added again.
 
-    def __init__(self):
-        gsm = getGlobalSiteManager()
+    Attributes:
+        job_prefix: Prefix of identifiers of jobs added by this service,
+                    must be unique for auctions sharing one scheduler
+        :type job_prefix: str
+    """
+
+    def __init__(self, registry=None, scheduler=None, job_prefix='auction'):
+        gsm = registry if registry is not None else getGlobalSiteManager()
 
         self.context = gsm.queryUtility(IContext)
         self.database = gsm.queryUtility(IDatabase)
         self.datasource = gsm.queryUtility(IDataSource)
+        self._scheduler = scheduler
+        self.job_prefix = job_prefix
+        self._jobs = {}
 
-    def add_ending_main_round_job(self, job_start_date):
-        SCHEDULER.add_job(
-            self.end_auction,
+    @property
+    def scheduler(self):
+        return self._scheduler if self._scheduler is not None else SCHEDULER
+
+    def _job_id(self, name):
+        return '{}:{}'.format(self.job_prefix, name)
+
+    def _schedule(self, key, func, run_date, name):
+        """
+        Move pending job to run_date or add it if it was never added or has
+        already been executed. Date trigger has no further fire times, so
+        changing next run time of the job is enough to move it.
+        """
+        job = self._jobs.get(key)
+        if job is not None:
+            try:
+                return job.modify(next_run_time=run_date)
+            except JobLookupError:
+                pass
+        job = self._jobs[key] = self.scheduler.add_job(
+            func,
             'date',
-            run_date=job_start_date,
-            name='End of Auction',
-            id='auction:{}'.format(END)
+            run_date=run_date,
+            name=name,
+            id=self._job_id(key)
         )
+        return job
+
+    def add_start_auction_job(self, start_auction, job_start_date):
+        self._schedule('start', start_auction, job_start_date, "Start of Auction")
+
+    def add_ending_main_round_job(self, job_start_date):
+        self._schedule(END, self.end_auction, job_start_date, 'End of Auction')
 
     def add_pause_job(self, job_start_date):
-        SCHEDULER.add_job(
-            self.switch_to_next_stage,
-            'date',
-            run_date=job_start_date,
-            name='End of Pause',
-            id='auction:pause'
-        )
+        self._schedule('pause', self.switch_to_next_stage, job_start_date, 'End of Pause')
+
+    def remove_job(self, key):
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            try:
+                job.remove()
+            except JobLookupError:
+                pass
+
+    def remove_jobs(self):
+        """
+        Remove pending jobs of this auction leaving jobs of other auctions
+        added to the same scheduler untouched
+        """
+        for key in list(self._jobs):
+            self.remove_job(key)
 
     def switch_to_next_stage(self):
         request_id = generate_request_id()
@@ -106,7 +283,7 @@ class JobService(object):
         )
 
         stage = {
-            'start': datetime.now(TIMEZONE).isoformat(),
+            'start': clock.now(TIMEZONE).isoformat(),
             'type': PREANNOUNCEMENT,
         }
         with update_auction_document(self.context, self.database) as auction_document:
@@ -117,19 +294,19 @@ class JobService(object):
             self.context['auction_document'], self.context['auction_protocol']
         )
         self.context['auction_protocol'] = auction_protocol
+        # The same artifact is uploaded by datasource
         LOGGER.info(
-            'Audit data: \n {}'.format(yaml_dump(self.context['auction_protocol'])),
+            'Audit data: \n %s', LazyPayload(auction_protocol, serialize_protocol, audit=True),
             extra={"JOURNAL_REQUEST_ID": request_id}
         )
-        LOGGER.info(self.context['auction_protocol'])
 
         result = self.datasource.update_source_object(
-            self.context['auction_data'], self.context['auction_document'], self.context['auction_protocol']
+            self.context['auction_data'], self.context['auction_document'], auction_protocol
         )
         if result and isinstance(result, dict):
             self.context['auction_document'] = result
 
-        auction_end = datetime.now(TIMEZONE)
+        auction_end = clock.now(TIMEZONE)
         stage = prepare_end_stage(auction_end)
         with update_auction_document(self.context, self.database) as auction_document:
             auction_document["stages"].append(stage)
@@ -139,5 +316,5 @@ class JobService(object):
         self.context['end_auction_event'].set()
 
 
-def prepare_job_service():
-    return JobService()
+def prepare_job_service(registry=None, scheduler=None, job_prefix='auction'):
+    return JobService(registry=registry, scheduler=scheduler, job_prefix=job_prefix)
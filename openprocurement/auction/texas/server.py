@@ -7,13 +7,9 @@ from flask_oauthlib.client import OAuth
 from gevent import spawn
 from gevent.pywsgi import WSGIServer
 from pytz import timezone as tz
-from zope.component import getGlobalSiteManager
 
 
 from openprocurement.auction.helpers.system import get_lisener
-from openprocurement.auction.event_source import (
-    push_timestamps_events, check_clients
-)
 from openprocurement.auction.texas.event_source import sse
 from openprocurement.auction.utils import (
     create_mapping,
@@ -24,18 +20,28 @@ from openprocurement.auction.worker_core.server import (
 )
 
 from openprocurement.auction.texas import views
+from openprocurement.auction.texas.admission import BidQueue
 from openprocurement.auction.texas.bids import BidsHandler
-from openprocurement.auction.texas.constants import AUCTION_SUBPATH
+from openprocurement.auction.texas.broadcast import (
+    BroadcastBus, DocumentFeed, push_timestamps_events, SSE_BUFFER_SIZE
+)
+from openprocurement.auction.texas.constants import (
+    AUCTION_SUBPATH, IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL
+)
 from openprocurement.auction.texas.context import IContext
 from openprocurement.auction.texas.forms import BidsForm, form_handler
+from openprocurement.auction.texas.identity import IdentityCache
 
 
 def initialize_application():
     app = Flask(__name__)
     app.auction_bidders = {}
+    app.broadcast_bus = BroadcastBus()
     app.register_blueprint(sse)
     app.secret_key = os.urandom(24)
     app.logins_cache = {}
+    app.identity_cache = IdentityCache()
+    app.bid_queue = BidQueue(app)
     return app
 
 
@@ -48,13 +54,18 @@ def add_url_rules(app):
     app.add_url_rule('/kickclient', 'kickclient', views.kickclient, methods=['POST'])
     app.add_url_rule('/check_authorization', 'check_authorization', views.check_authorization, methods=['POST'])
     app.add_url_rule('/health', 'health', views.health, methods=['GET'])
+    app.add_url_rule('/metrics', 'metrics', views.metrics, methods=['GET'])
+    app.add_url_rule('/metrics/scheduler', 'scheduler_metrics', views.scheduler_metrics, methods=['GET'])
 
 
-def run_server(auction, mapping_expire_time, logger, timezone='Europe/Kiev', bids_form=BidsForm,
-               bids_handler=BidsHandler, form_handler=form_handler, cookie_path=AUCTION_SUBPATH):
+def prepare_app(auction, logger, timezone='Europe/Kiev', bids_form=BidsForm,
+                bids_handler=BidsHandler, form_handler=form_handler, cookie_path=AUCTION_SUBPATH):
     app = initialize_application()
     add_url_rules(app)
     app.config.update(auction.worker_defaults)
+    app.broadcast_bus.buffer_size = app.config.get('SSE_BUFFER_SIZE', SSE_BUFFER_SIZE)
+    app.identity_cache.size = app.config.get('IDENTITY_CACHE_SIZE', IDENTITY_CACHE_SIZE)
+    app.identity_cache.ttl = app.config.get('IDENTITY_CACHE_TTL', IDENTITY_CACHE_TTL)
     # Replace Flask custom logger
     app.logger_name = logger.name
     app._logger = logger
@@ -62,10 +73,11 @@ def run_server(auction, mapping_expire_time, logger, timezone='Europe/Kiev', bid
     app.config['SESSION_COOKIE_PATH'] = '/{}/{}'.format(cookie_path, auction.context['auction_doc_id'])
     app.config['SESSION_COOKIE_NAME'] = 'auction_session'
     app.oauth = OAuth(app)
-    app.gsm = getGlobalSiteManager()
+    app.gsm = auction.registry
     app.context = app.gsm.queryUtility(IContext)
+    app.context['document_feed'] = DocumentFeed(app.broadcast_bus, app.context.snapshot('auction_document'))
     app.bids_form = bids_form
-    app.bids_handler = bids_handler()
+    app.bids_handler = bids_handler(registry=app.gsm)
     app.form_handler = form_handler
     app.remote_oauth = app.oauth.remote_app(
         'remote',
@@ -81,6 +93,13 @@ def run_server(auction, mapping_expire_time, logger, timezone='Europe/Kiev', bid
     def get_oauth_token():
         return session.get('remote_oauth')
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = 'true'
+    return app
+
+
+def run_server(auction, mapping_expire_time, logger, timezone='Europe/Kiev', bids_form=BidsForm,
+               bids_handler=BidsHandler, form_handler=form_handler, cookie_path=AUCTION_SUBPATH):
+    app = prepare_app(auction, logger, timezone=timezone, bids_form=bids_form,
+                      bids_handler=bids_handler, form_handler=form_handler, cookie_path=cookie_path)
 
     # Start server on unused port
     request_id = generate_request_id()
@@ -108,5 +127,48 @@ def run_server(auction, mapping_expire_time, logger, timezone='Europe/Kiev', bid
 
     # Spawn events functionality
     spawn(push_timestamps_events, app,)
-    spawn(check_clients, app, )
+    app.bid_queue.start()
+    return server
+
+
+def run_router_server(router, worker_defaults, logger):
+    """
+    Start one server for all auctions hosted by the process
+    """
+    request_id = generate_request_id()
+    listener = get_lisener(worker_defaults["STARTS_PORT"],
+                           host=worker_defaults.get("WORKER_BIND_IP", ""))
+    logger.info(
+        "Start server on {0}:{1}".format(*listener.getsockname()),
+        extra={"JOURNAL_REQUEST_ID": request_id}
+    )
+    server = WSGIServer(listener, router,
+                        log=_LoggerStream(logger),
+                        handler_class=AuctionsWSGIHandler)
+    server.start()
+    router.base_url = "http://{0}:{1}/".format(*listener.getsockname())
     return server
+
+
+def mount_server(auction, router, mapping_expire_time, logger, **kwargs):
+    """
+    Serve auction application with shared router server
+
+    :return: handle which unmounts application on stop()
+    """
+    app = prepare_app(auction, logger, **kwargs)
+    request_id = generate_request_id()
+    auction_doc_id = auction.context['auction_doc_id']
+
+    app.bid_queue.start()
+    greenlets = [spawn(push_timestamps_events, app,)]
+    mounted = router.mount(auction_doc_id, app, greenlets, services=[app.bid_queue])
+
+    mapping_value = "{}{}/".format(router.base_url, auction_doc_id)
+    create_mapping(auction.worker_defaults, auction_doc_id, mapping_value)
+    app.logger.info("Server mapping: {} -> {}".format(
+        auction_doc_id,
+        mapping_value,
+        mapping_expire_time
+    ), extra={"JOURNAL_REQUEST_ID": request_id})
+    return mounted
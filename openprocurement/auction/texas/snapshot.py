@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+from copy import deepcopy
+
+
+def _dict_deepcopy(self, memo):
+    return dict(
+        (deepcopy(key, memo), deepcopy(value, memo))
+        for key, value in dict.iteritems(self)
+    )
+
+
+def _dict_reduce(self):
+    return dict, (dict(self),)
+
+
+def _list_deepcopy(self, memo):
+    return [deepcopy(item, memo) for item in list.__iter__(self)]
+
+
+def _list_reduce(self):
+    return list, (list(list.__iter__(self)),)
+
+
+class FrozenDict(dict):
+    """
+    Read-only node of a context snapshot. Every mutating method raises
+    TypeError, so one instance can be safely shared between snapshots.
+
+    Attributes:
+    _leaf: node contains no nested containers, so it is copied and compared
+    as a whole instead of item by item
+    :type _leaf: bool
+    """
+    __slots__ = ('_leaf',)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Context snapshot is read-only')
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    __deepcopy__ = _dict_deepcopy
+    __reduce__ = _dict_reduce
+
+
+class FrozenList(list):
+    """
+    Read-only node of a context snapshot. See FrozenDict.
+    """
+    __slots__ = ('_leaf',)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Context snapshot is read-only')
+
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = _read_only
+    __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return list(list.__iter__(self))
+
+    __deepcopy__ = _list_deepcopy
+    __reduce__ = _list_reduce
+
+
+class FrozenSet(frozenset):
+    """
+    Snapshot of a set value, which is returned as a new set on reading.
+    """
+    __slots__ = ()
+
+
+FROZEN_TYPES = (FrozenDict, FrozenList, FrozenSet)
+
+# Items of these types are frozen or thawed recursively, other items are
+# immutable and kept as is
+CONTAINER_TYPES = (dict, list, set, frozenset, tuple)
+
+_MISSING = object()
+
+
+def _freeze_item(item, previous):
+    if isinstance(item, CONTAINER_TYPES):
+        return freeze(item, previous)
+    if type(previous) is type(item) and previous == item:
+        return previous
+    return item
+
+
+def _node(frozen_type, items, leaf):
+    node = frozen_type(items)
+    node._leaf = leaf
+    return node
+
+
+def _is_leaf(node):
+    return getattr(node, '_leaf', False)
+
+
+def _freeze_dict(value, previous):
+    if _is_leaf(previous) and dict.__eq__(previous, value):
+        return previous
+    items = {}
+    leaf = True
+    reused = len(previous) == len(value)
+    for key, item in dict.iteritems(value):
+        old = dict.get(previous, key, _MISSING)
+        item = _freeze_item(item, old)
+        leaf = leaf and not isinstance(item, CONTAINER_TYPES)
+        reused = reused and item is old
+        items[key] = item
+    return previous if reused else _node(FrozenDict, items, leaf)
+
+
+def _freeze_sequence(value, previous):
+    # previous is a FrozenList or a tuple
+    if _is_leaf(previous) and list.__eq__(previous, value):
+        return previous
+    items = []
+    leaf = True
+    reused = len(previous) == len(value)
+    for index, item in enumerate(value):
+        old = previous[index] if index < len(previous) else _MISSING
+        item = _freeze_item(item, old)
+        leaf = leaf and not isinstance(item, CONTAINER_TYPES)
+        reused = reused and item is old
+        items.append(item)
+    if reused:
+        return previous
+    return _node(FrozenList, items, leaf) if isinstance(previous, FrozenList) else tuple(items)
+
+
+def freeze(value, previous=None):
+    """
+    Convert value to a read-only snapshot. Nodes of previous snapshot which
+    are equal to the new ones are reused as is, so storing a changed auction
+    document allocates only the changed stages and the containers on the
+    path to them.
+
+    Value is walked once: nodes without nested containers are compared as
+    a whole, other nodes are reused if all their items were reused, so
+    unchanged subtrees are not compared again on every level.
+    """
+    if isinstance(value, FROZEN_TYPES):
+        return value
+    if isinstance(value, dict):
+        if isinstance(previous, FrozenDict):
+            return _freeze_dict(value, previous)
+        items = {}
+        leaf = True
+        for key, item in dict.iteritems(value):
+            if isinstance(item, CONTAINER_TYPES):
+                item = freeze(item)
+                leaf = False
+            items[key] = item
+        return _node(FrozenDict, items, leaf)
+    if isinstance(value, list):
+        if isinstance(previous, FrozenList):
+            return _freeze_sequence(value, previous)
+        items = []
+        leaf = True
+        for item in value:
+            if isinstance(item, CONTAINER_TYPES):
+                item = freeze(item)
+                leaf = False
+            items.append(item)
+        return _node(FrozenList, items, leaf)
+    if type(value) is tuple:
+        if type(previous) is tuple:
+            return _freeze_sequence(value, previous)
+        return tuple(freeze(item) if isinstance(item, CONTAINER_TYPES) else item for item in value)
+    if isinstance(value, (set, frozenset)):
+        if isinstance(previous, FrozenSet) and previous == value:
+            return previous
+        return FrozenSet(value)
+    return value
+
+
+def thaw(value):
+    """
+    Return mutable copy of a snapshot created by freeze.
+
+    Copy is made of plain dicts, lists and sets. Lazy views of the snapshot
+    can not be handed out: dict(view), {}.update(view), **view and list
+    concatenation read the storage of dict and list subclasses directly and
+    would expose read-only nodes to the caller.
+    """
+    if isinstance(value, dict):
+        if _is_leaf(value):
+            return dict(value)
+        return dict(
+            (key, thaw(item) if isinstance(item, CONTAINER_TYPES) else item)
+            for key, item in dict.iteritems(value)
+        )
+    if isinstance(value, list):
+        if _is_leaf(value):
+            return list(list.__iter__(value))
+        return [
+            thaw(item) if isinstance(item, CONTAINER_TYPES) else item
+            for item in list.__iter__(value)
+        ]
+    if isinstance(value, (set, FrozenSet)):
+        return set(value)
+    if type(value) is tuple:
+        return tuple(thaw(item) for item in value)
+    return value
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of bid posting path: views.post_bid -> form_handler ->
+BidsHandler.add_bid -> end_bid_stage.
+
+Simulated auction is served by Flask test client with in-memory database
+and stubbed OAuth. Every round all bidders post bids concurrently, the
+first valid bid ends the round and pause is switched to the next round
+by JobService.switch_to_next_stage as scheduler would do.
+
+Usage:
+    python -m openprocurement.auction.texas.tests.benchmarks.postbid \
+        --bidders 10 --rounds 50 --output results.json
+"""
+import argparse
+import json
+import logging
+import math
+import platform
+import sys
+import time
+from datetime import datetime
+
+import gevent
+import mock
+from apscheduler.schedulers.gevent import GeventScheduler
+from gevent.lock import BoundedSemaphore
+from zope.interface.registry import Components
+
+from openprocurement.auction.worker_core.constants import TIMEZONE
+
+from openprocurement.auction.texas import identity, utils
+from openprocurement.auction.texas.context import prepare_context, IContext
+from openprocurement.auction.texas.database import prepare_database, IDatabase, MEMORY_STORES
+from openprocurement.auction.texas.scheduler import prepare_job_service, IJobService
+from openprocurement.auction.texas.server import prepare_app
+
+LOGGER = logging.getLogger('Auction Worker Texas')
+
+AUCTION_DOC_ID = 'b' * 32
+START_AMOUNT = 1000
+MINIMAL_STEP = 10
+WORKER_DEFAULTS = {
+    'OAUTH_CLIENT_ID': 'benchmark',
+    'OAUTH_CLIENT_SECRET': 'benchmark',
+    'OAUTH_BASE_URL': 'http://oauth.benchmark/',
+    'OAUTH_ACCESS_TOKEN_URL': 'http://oauth.benchmark/token',
+    'OAUTH_AUTHORIZE_URL': 'http://oauth.benchmark/authorize',
+}
+
+
+class TimedSemaphore(BoundedSemaphore):
+    """
+    Semaphore which records time spent waiting for acquire
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TimedSemaphore, self).__init__(*args, **kwargs)
+        self.waits = []
+
+    def acquire(self, *args, **kwargs):
+        started = time.time()
+        result = super(TimedSemaphore, self).acquire(*args, **kwargs)
+        self.waits.append(time.time() - started)
+        return result
+
+
+class BenchmarkAuction(object):
+    """
+    Minimal auction object accepted by server.prepare_app
+    """
+
+    def __init__(self, registry, worker_defaults):
+        self.registry = registry
+        self.worker_defaults = worker_defaults
+        self.context = registry.queryUtility(IContext)
+
+
+def stub_get_bidder_id(app, session):
+    return app.logins_cache.get(tuple(session['remote_oauth']), False)
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of values, None for empty sequence
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def summarize(seconds):
+    milliseconds = [value * 1000 for value in seconds]
+    return {
+        'count': len(milliseconds),
+        'p50': percentile(milliseconds, 50),
+        'p95': percentile(milliseconds, 95),
+        'p99': percentile(milliseconds, 99),
+        'max': max(milliseconds) if milliseconds else None,
+    }
+
+
+def prepare_auction(database_config):
+    registry = Components(AUCTION_DOC_ID)
+    database = prepare_database(database_config)
+    registry.registerUtility(database, IDatabase)
+    context = prepare_context({'type': 'dict'})
+    registry.registerUtility(context, IContext)
+    scheduler = GeventScheduler()
+    registry.registerUtility(
+        prepare_job_service(registry, scheduler, 'auction:{}'.format(AUCTION_DOC_ID)), IJobService
+    )
+
+    bid_document = {'value': {'amount': START_AMOUNT}, 'minimalStep': {'amount': MINIMAL_STEP}}
+    _, main_round = utils.prepare_auction_stages(datetime.now(TIMEZONE), bid_document, None)
+    auction_document = {
+        '_id': AUCTION_DOC_ID,
+        'current_stage': 0,
+        'stages': [main_round],
+        'results': [],
+        'initial_bids': [],
+        'value': bid_document['value'],
+        'minimalStep': bid_document['minimalStep'],
+    }
+    public_document = database.get_auction_document(AUCTION_DOC_ID)
+    if public_document:
+        auction_document['_rev'] = public_document['_rev']
+    database.save_auction_document(auction_document, AUCTION_DOC_ID)
+
+    context['auction_doc_id'] = AUCTION_DOC_ID
+    context['auction_document'] = database.get_auction_document(AUCTION_DOC_ID)
+    context['auction_protocol'] = {'id': AUCTION_DOC_ID, 'timeline': {'auction_start': {'initial_bids': []}}}
+    context['worker_defaults'] = dict(WORKER_DEFAULTS)
+    context['server_actions'] = TimedSemaphore()
+    return registry
+
+
+def prepare_clients(app, bidders):
+    clients = []
+    bids_mapping = {}
+    for number in range(bidders):
+        bidder_id = '{:032x}'.format(number + 1)
+        token = 'token-{}'.format(number)
+        app.logins_cache[(token, '')] = {'bidder_id': bidder_id, 'expires': None}
+        bids_mapping[bidder_id] = str(number + 1)
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['remote_oauth'] = (token, '')
+            session['client_id'] = 'client-{}'.format(number)
+        clients.append((bidder_id, client))
+    app.context['bids_mapping'] = bids_mapping
+    app.context['bidders_data'] = [{'id': bidder_id} for bidder_id, _ in clients]
+    app.context['bidders_index'] = frozenset(bidder_id for bidder_id, _ in clients)
+    return clients
+
+
+def post_bid(client, bidder_id, amount, latencies):
+    started = time.time()
+    response = client.post(
+        '/postbid',
+        data=json.dumps({'bidder_id': bidder_id, 'bid': amount}),
+        content_type='application/json',
+        headers={'X-Forwarded-For': '127.0.0.1'}
+    )
+    latencies.append(time.time() - started)
+    return response.status_code == 200 and json.loads(response.data)['status'] == 'ok'
+
+
+def run_benchmark(bidders=10, rounds=50, database_config=None):
+    """
+    Run simulated auction and return results dictionary
+    """
+    database_config = database_config or {'type': 'memory', 'name': 'benchmark'}
+    MEMORY_STORES.pop(database_config.get('name', 'auctions'), None)
+    registry = prepare_auction(database_config)
+    app = prepare_app(BenchmarkAuction(registry, dict(WORKER_DEFAULTS)), LOGGER)
+    job_service = registry.queryUtility(IJobService)
+    semaphore = app.context['server_actions']
+    clients = prepare_clients(app, bidders)
+
+    all_latencies = []
+    per_round = []
+    accepted_total = 0
+    started = time.time()
+    with mock.patch.object(identity, 'resolve_bidder_id', stub_get_bidder_id):
+        for round_number in range(1, rounds + 1):
+            latencies = []
+            waits_before = len(semaphore.waits)
+            stage = app.context['auction_document']['stages'][app.context['auction_document']['current_stage']]
+            greenlets = [
+                gevent.spawn(post_bid, client, bidder_id, stage['amount'] + MINIMAL_STEP * index, latencies)
+                for index, (bidder_id, client) in enumerate(clients)
+            ]
+            gevent.joinall(greenlets)
+            accepted = sum(1 for greenlet in greenlets if greenlet.value)
+            accepted_total += accepted
+            # End of pause, normally done by scheduled job
+            job_service.switch_to_next_stage()
+
+            all_latencies.extend(latencies)
+            per_round.append({
+                'round': round_number,
+                'accepted': accepted,
+                'latency_ms': summarize(latencies),
+                'lock_wait_ms': summarize(semaphore.waits[waits_before:]),
+                'document_size': len(json.dumps(app.context['auction_document'])),
+            })
+    elapsed = time.time() - started
+
+    return {
+        'meta': {
+            'bidders': bidders,
+            'rounds': rounds,
+            'database': database_config,
+            'python': platform.python_version(),
+            'timestamp': datetime.now(TIMEZONE).isoformat(),
+        },
+        'summary': {
+            'requests': len(all_latencies),
+            'accepted': accepted_total,
+            'elapsed_s': elapsed,
+            'accepted_bids_per_s': accepted_total / elapsed if elapsed else None,
+            'latency_ms': summarize(all_latencies),
+            'lock_wait_ms': summarize(semaphore.waits),
+            'final_document_size': per_round[-1]['document_size'] if per_round else None,
+            'identity_cache': dict(app.identity_cache.stats),
+            'bid_queue': dict(app.bid_queue.stats),
+        },
+        'rounds': per_round,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='---- /postbid benchmark ----')
+    parser.add_argument('--bidders', type=int, default=10, help='Number of bidders')
+    parser.add_argument('--rounds', type=int, default=50, help='Number of rounds')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Latency of in-memory database requests in seconds')
+    parser.add_argument('--failure-rate', dest='failure_rate', type=float, default=0,
+                        help='Probability of in-memory database request failure')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of injected failures')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Path of JSON results file, printed to stdout if omitted')
+    parser.add_argument('-v', dest='verbose', action='store_true', help='Show worker logs')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    results = run_benchmark(args.bidders, args.rounds, {
+        'type': 'memory',
+        'name': 'benchmark',
+        'latency': args.latency,
+        'failure_rate': args.failure_rate,
+        'seed': args.seed,
+    })
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as results_file:
+            results_file.write(output)
+    else:
+        print output
+    summary = results['summary']
+    sys.stderr.write(
+        'accepted {accepted}/{requests} bids, p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms\n'.format(
+            accepted=summary['accepted'], requests=summary['requests'], **summary['latency_ms']
+        )
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,7 @@ import unittest
 import mock
 from copy import deepcopy
 
-from couchdb.http import HTTPError
+from couchdb.http import HTTPError, ResourceConflict
 
 from openprocurement.auction.texas.database import CouchDB
 
@@ -47,7 +47,7 @@ class TestInit(TestCouchDBDatabase):
         )
 
         self.assertEqual(self.mocked_request_session.call_count, 1)
-        self.mocked_request_session.assert_called_with(retry_delays=range(10))
+        self.mocked_request_session.assert_called_with(retry_delays=[])
 
         self.assertEqual(db._db, self.couchdb_database)
 
@@ -69,9 +69,13 @@ class TestGetDocument(TestCouchDBDatabase):
 
         self.database = self.database_class(self.config)
 
+        self.patch_sleep = mock.patch('openprocurement.auction.texas.database.gevent.sleep')
+        self.mocked_sleep = self.patch_sleep.start()
+
     def tearDown(self):
         self.patch_couchdb_server.stop()
         self.patch_request_session.stop()
+        self.patch_sleep.stop()
 
     def test_getting_document(self):
         auction_document = {
@@ -109,6 +113,8 @@ class TestGetDocument(TestCouchDBDatabase):
 
         self.assertEqual(self.database._db.get.call_count, 2)
         self.database._db.get.assert_called_with(doc_id)
+        self.assertEqual(self.database.retry_stats['get'], 1)
+        self.assertEqual(self.database.latency.series['get']['count'], 2)
 
     def test_all_retry_failed(self):
         auction_document = {
@@ -126,6 +132,53 @@ class TestGetDocument(TestCouchDBDatabase):
 
         self.assertEqual(self.database._db.get.call_count, 10)
         self.database._db.get.assert_called_with(doc_id)
+        self.assertEqual(self.database.retry_stats['get'], 9)
+        self.assertEqual(self.database.exhausted_stats['get'], 1)
+
+    def test_missing_document_is_not_retried(self):
+        self.database._db.get.return_value = None
+
+        self.assertEqual(self.database.get_auction_document('1' * 32), {})
+
+        self.assertEqual(self.database._db.get.call_count, 1)
+        self.assertEqual(self.mocked_sleep.call_count, 0)
+
+    def test_backoff_delays(self):
+        self.database._db.get.side_effect = HTTPError
+
+        self.database.get_auction_document('1' * 32)
+
+        delays = [call[0][0] for call in self.mocked_sleep.call_args_list]
+        self.assertEqual(len(delays), 9)
+        for retry, delay in enumerate(delays):
+            self.assertTrue(0 <= delay <= min(5.0, 0.1 * 2 ** retry))
+
+    def test_retry_budget(self):
+        self.config['retry'] = {'get': {'budget': 1, 'jitter': False}}
+        database = self.database_class(self.config)
+        database._db.get.side_effect = HTTPError
+
+        database.get_auction_document('1' * 32)
+
+        # Sleep is mocked and time does not pass, so retries stop at the
+        # first delay which alone exceeds the budget
+        delays = [call[0][0] for call in self.mocked_sleep.call_args_list]
+        self.assertEqual(delays, [0.1, 0.2, 0.4, 0.8])
+        self.assertEqual(database.exhausted_stats['get'], 1)
+
+    def test_circuit_breaker(self):
+        self.config['circuit_breaker'] = {'failure_threshold': 3, 'reset_timeout': 60}
+        database = self.database_class(self.config)
+        database._db.get.side_effect = HTTPError
+
+        self.assertEqual(database.get_auction_document('1' * 32), {})
+
+        # Requests are not sent while circuit is open
+        self.assertEqual(database._db.get.call_count, 3)
+        self.assertEqual(database.circuit_breaker.stats, {
+            'state': 'open', 'failures': 3, 'opened': 1, 'refused': 7
+        })
+        self.assertEqual(database.retry_stats['get'], 9)
 
 
 class TestUpdateRevision(TestCouchDBDatabase):
@@ -188,9 +241,13 @@ class TestSaveDocument(TestCouchDBDatabase):
 
         self.database._update_revision = mock.MagicMock()
 
+        self.patch_sleep = mock.patch('openprocurement.auction.texas.database.gevent.sleep')
+        self.mocked_sleep = self.patch_sleep.start()
+
     def tearDown(self):
         self.patch_couchdb_server.stop()
         self.patch_request_session.stop()
+        self.patch_sleep.stop()
 
     def test_save_document(self):
         auction_document = {
@@ -248,8 +305,10 @@ class TestSaveDocument(TestCouchDBDatabase):
 
         self.assertEqual(self.database._db.save.call_count, 2)
         self.database._db.save.assert_called_with(initial_auction_document)
+        self.assertEqual(self.database.retry_stats, {'get': 0, 'save': 1})
 
-        self.assertEqual(self.database._update_revision.call_count, 2)
+        # Revision is not refetched after error other than conflict
+        self.assertEqual(self.database._update_revision.call_count, 1)
         self.database._update_revision.assert_called_with(initial_auction_document, doc_id)
 
     def test_all_retry_failed(self):
@@ -268,8 +327,108 @@ class TestSaveDocument(TestCouchDBDatabase):
         self.assertEqual(self.database._db.save.call_count, 10)
         self.database._db.save.assert_called_with(auction_document)
 
-        self.assertEqual(self.database._update_revision.call_count, 10)
+        self.assertEqual(self.database._update_revision.call_count, 1)
         self.database._update_revision.assert_called_with(auction_document, doc_id)
+        self.assertEqual(self.database.exhausted_stats['save'], 1)
+
+    def test_refetching_after_conflict(self):
+        auction_document = {
+            '_id': '1' * 32,
+            '_rev': '111'
+        }
+        doc_id = auction_document['_id']
+        self.database._db.save.side_effect = iter([
+            HTTPError,
+            ResourceConflict,
+            [doc_id, '222'],
+        ])
+
+        response = self.database.save_auction_document(auction_document, doc_id)
+
+        self.assertEqual(response, [doc_id, '222'])
+        self.assertEqual(self.database._update_revision.call_count, 2)
+        self.assertEqual(self.database.retry_stats['save'], 2)
+        self.assertEqual(self.database.circuit_breaker.stats['failures'], 0)
+
+
+class TestSaveDocumentWithCachedRevision(TestCouchDBDatabase):
+
+    def setUp(self):
+        super(TestSaveDocumentWithCachedRevision, self).setUp()
+        self.config['cached_revision'] = True
+
+        self.patch_couchdb_server = mock.patch('openprocurement.auction.texas.database.Server')
+        self.patch_request_session = mock.patch('openprocurement.auction.texas.database.Session')
+
+        self.couchdb_database = mock.MagicMock()
+        self.mock_couchdb_server = self.patch_couchdb_server.start()
+        self.mock_couchdb_server.return_value = {
+            self.config['COUCH_DATABASE'].rsplit('/', 1)[1]: self.couchdb_database
+        }
+
+        self.mocked_request_session = self.patch_request_session.start()
+        self.mocked_request_session.return_value = mock.MagicMock()
+
+        self.database = self.database_class(self.config)
+
+        self.new_rev = 'new rev'
+        self.database.get_auction_document = mock.MagicMock(return_value={'_rev': self.new_rev})
+
+    def tearDown(self):
+        self.patch_couchdb_server.stop()
+        self.patch_request_session.stop()
+
+    def test_save_without_refetching(self):
+        auction_document = {
+            '_id': '1' * 32,
+            '_rev': '111'
+        }
+        doc_id = auction_document['_id']
+        self.database._db.save.side_effect = iter([
+            [doc_id, '222'],
+            [doc_id, '333'],
+        ])
+
+        self.database.save_auction_document(auction_document, doc_id)
+        self.assertEqual(auction_document['_rev'], '222')
+
+        # Revision saved by database object is used even if document is stale
+        auction_document['_rev'] = '111'
+        self.database.save_auction_document(auction_document, doc_id)
+        self.assertEqual(auction_document['_rev'], '333')
+
+        self.assertEqual(self.database._db.save.call_count, 2)
+        self.database._db.save.assert_called_with({'_id': doc_id, '_rev': '222'})
+        self.assertEqual(self.database.get_auction_document.call_count, 0)
+        self.assertEqual(
+            self.database.revision_stats,
+            {'saves': 2, 'conflicts': 0, 'refetches': 0}
+        )
+
+    def test_refetching_after_conflict(self):
+        auction_document = {
+            '_id': '1' * 32,
+            '_rev': '111'
+        }
+        doc_id = auction_document['_id']
+        self.database._db.save.side_effect = iter([
+            ResourceConflict,
+            [doc_id, '222'],
+        ])
+
+        response = self.database.save_auction_document(auction_document, doc_id)
+
+        self.assertEqual(response, [doc_id, '222'])
+        self.assertEqual(auction_document['_rev'], '222')
+
+        self.assertEqual(self.database._db.save.call_count, 2)
+        self.database._db.save.assert_called_with({'_id': doc_id, '_rev': self.new_rev})
+        self.assertEqual(self.database.get_auction_document.call_count, 1)
+        self.database.get_auction_document.assert_called_with(doc_id)
+        self.assertEqual(
+            self.database.revision_stats,
+            {'saves': 1, 'conflicts': 1, 'refetches': 1}
+        )
 
 
 def suite():
@@ -278,4 +437,5 @@ def suite():
     suite.addTest(unittest.makeSuite(TestGetDocument))
     suite.addTest(unittest.makeSuite(TestUpdateRevision))
     suite.addTest(unittest.makeSuite(TestSaveDocument))
+    suite.addTest(unittest.makeSuite(TestSaveDocumentWithCachedRevision))
     return suite
@@ -0,0 +1,136 @@
+import unittest
+
+import mock
+from couchdb.http import ResourceConflict, ServerError
+
+from openprocurement.auction.texas.database import (
+    InMemoryDatabase,
+    MemoryStore,
+    MEMORY_STORES,
+    prepare_database,
+)
+
+
+class TestMemoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryStore()
+        self.doc_id = '1' * 32
+
+    def test_save_and_get(self):
+        doc = {'_id': self.doc_id, 'value': 1}
+
+        doc_id, rev = self.store.save(doc)
+
+        self.assertEqual(doc_id, self.doc_id)
+        self.assertTrue(rev.startswith('1-'))
+        self.assertEqual(doc['_rev'], rev)
+        self.assertEqual(self.store.get(self.doc_id), {'_id': self.doc_id, '_rev': rev, 'value': 1})
+        self.assertIsNone(self.store.get('2' * 32))
+
+    def test_revision_increases(self):
+        doc = {'_id': self.doc_id}
+        self.store.save(doc)
+        doc_id, rev = self.store.save(doc)
+
+        self.assertTrue(rev.startswith('2-'))
+
+    def test_conflict_with_stale_revision(self):
+        doc = {'_id': self.doc_id}
+        self.store.save(doc)
+        stale = dict(doc)
+        self.store.save(doc)
+
+        with self.assertRaises(ResourceConflict):
+            self.store.save(stale)
+        with self.assertRaises(ResourceConflict):
+            self.store.save({'_id': self.doc_id})
+        self.assertEqual(self.store.stats['conflicts'], 2)
+
+    def test_stored_document_is_isolated(self):
+        doc = {'_id': self.doc_id, 'stages': []}
+        self.store.save(doc)
+        doc['stages'].append({})
+
+        self.store.get(self.doc_id)['stages'].append({})
+
+        self.assertEqual(self.store.get(self.doc_id)['stages'], [])
+
+    def test_injected_failures_are_reproducible(self):
+        def run():
+            store = MemoryStore(failure_rate=0.5, seed=1)
+            results = []
+            for i in range(20):
+                try:
+                    store.get(self.doc_id)
+                except ServerError:
+                    results.append(False)
+                else:
+                    results.append(True)
+            return results
+
+        results = run()
+
+        self.assertIn(False, results)
+        self.assertIn(True, results)
+        self.assertEqual(results, run())
+
+    def test_injected_latency(self):
+        store = MemoryStore(latency=0.01)
+        with mock.patch('openprocurement.auction.texas.database.gevent.sleep') as mocked_sleep:
+            store.get(self.doc_id)
+        mocked_sleep.assert_called_once_with(0.01)
+
+
+class TestInMemoryDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.doc_id = '1' * 32
+        self.config = {'type': 'memory', 'name': 'test'}
+
+    def tearDown(self):
+        MEMORY_STORES.clear()
+
+    def test_prepare_database(self):
+        database = prepare_database(self.config)
+
+        self.assertIsInstance(database, InMemoryDatabase)
+
+    def test_databases_share_store_by_name(self):
+        first = prepare_database(self.config)
+        second = prepare_database(self.config)
+        other = prepare_database({'type': 'memory', 'name': 'other'})
+
+        first.save_auction_document({'_id': self.doc_id, 'current_stage': 0}, self.doc_id)
+
+        self.assertEqual(second.get_auction_document(self.doc_id)['current_stage'], 0)
+        self.assertEqual(other.get_auction_document(self.doc_id), {})
+
+    def test_save_resolves_conflicting_revision(self):
+        first = prepare_database(self.config)
+        second = prepare_database(self.config)
+        first.save_auction_document({'_id': self.doc_id, 'current_stage': 0}, self.doc_id)
+        document = second.get_auction_document(self.doc_id)
+        first.save_auction_document(first.get_auction_document(self.doc_id), self.doc_id)
+
+        document['current_stage'] = 1
+        response = second.save_auction_document(document, self.doc_id)
+
+        self.assertTrue(response[1].startswith('3-'))
+        self.assertEqual(first.get_auction_document(self.doc_id)['current_stage'], 1)
+
+    def test_save_retries_injected_failures(self):
+        config = dict(self.config, failure_rate=0.5, seed=3)
+        database = prepare_database(config)
+
+        response = database.save_auction_document({'_id': self.doc_id}, self.doc_id)
+
+        self.assertTrue(response)
+        self.assertGreater(MEMORY_STORES['test'].stats['failures'], 0)
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestMemoryStore))
+    tests.addTest(unittest.makeSuite(TestInMemoryDatabase))
+    return tests
@@ -0,0 +1,190 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import gevent
+import mock
+
+from openprocurement.auction.texas.database import (
+    WriteBehindDatabase,
+    IJournaledDatabase,
+    prepare_database,
+)
+
+
+class TestWriteBehindDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.journal_dir = tempfile.mkdtemp()
+        self.config = {'journal_dir': self.journal_dir}
+        self.doc_id = '1' * 32
+
+        self.patch_gevent = mock.patch('openprocurement.auction.texas.database.gevent')
+        self.mocked_gevent = self.patch_gevent.start()
+
+        self.backend = mock.MagicMock()
+        self.backend.save_auction_document.return_value = (self.doc_id, '2-rev')
+        self.database = WriteBehindDatabase(self.backend, self.config)
+
+    def tearDown(self):
+        self.patch_gevent.stop()
+        shutil.rmtree(self.journal_dir)
+
+    def read_journal(self):
+        with open(os.path.join(self.journal_dir, '{}.journal'.format(self.doc_id))) as journal:
+            return [json.loads(line) for line in journal.read().splitlines()]
+
+
+class TestSaveDocument(TestWriteBehindDatabase):
+
+    def test_save_is_journaled_and_acknowledged(self):
+        auction_document = {'_id': self.doc_id, 'current_stage': 1}
+
+        self.database.save_auction_document(auction_document, self.doc_id)
+
+        self.assertEqual(self.backend.save_auction_document.call_count, 0)
+        self.assertEqual(self.read_journal(), [{'seq': 1, 'document': auction_document}])
+        self.assertEqual(self.mocked_gevent.spawn.call_count, 1)
+        self.assertEqual(self.database.document_sizes,
+                         {self.doc_id: len(json.dumps(auction_document, separators=(',', ':')))})
+
+    def test_get_returns_pending_document(self):
+        auction_document = {'_id': self.doc_id, 'current_stage': 1}
+        self.database.save_auction_document(auction_document, self.doc_id)
+        auction_document['current_stage'] = 2
+
+        self.assertEqual(
+            self.database.get_auction_document(self.doc_id),
+            {'_id': self.doc_id, 'current_stage': 1}
+        )
+        self.assertEqual(self.backend.get_auction_document.call_count, 0)
+
+    def test_get_without_pending_document(self):
+        self.backend.get_auction_document.return_value = {'_id': self.doc_id}
+
+        self.assertEqual(self.database.get_auction_document(self.doc_id), {'_id': self.doc_id})
+        self.backend.get_auction_document.assert_called_once_with(self.doc_id)
+
+
+class TestFlush(TestWriteBehindDatabase):
+
+    def test_flush_coalesces_pending_states(self):
+        for stage in range(3):
+            self.database.save_auction_document({'_id': self.doc_id, 'current_stage': stage}, self.doc_id)
+
+        self.assertTrue(self.database.flush())
+
+        self.backend.save_auction_document.assert_called_once_with(
+            {'_id': self.doc_id, 'current_stage': 2}, self.doc_id
+        )
+        self.assertEqual(self.read_journal(), [])
+
+        self.database.get_auction_document(self.doc_id)
+        self.backend.get_auction_document.assert_called_once_with(self.doc_id)
+
+    def test_failed_flush_keeps_journal(self):
+        self.backend.save_auction_document.return_value = None
+        auction_document = {'_id': self.doc_id, 'current_stage': 1}
+        self.database.save_auction_document(auction_document, self.doc_id)
+
+        self.assertFalse(self.database.flush())
+
+        self.assertEqual(self.read_journal(), [{'seq': 1, 'document': auction_document}])
+        self.assertEqual(self.database.get_auction_document(self.doc_id), auction_document)
+
+    def test_newer_state_saved_during_flush_is_kept(self):
+        def save_again(document, doc_id):
+            self.backend.save_auction_document.side_effect = None
+            self.database.save_auction_document({'_id': self.doc_id, 'current_stage': 2}, self.doc_id)
+            return (self.doc_id, '2-rev')
+
+        self.database.save_auction_document({'_id': self.doc_id, 'current_stage': 1}, self.doc_id)
+        self.backend.save_auction_document.side_effect = save_again
+
+        self.database.flush()
+
+        self.assertEqual(
+            self.database.get_auction_document(self.doc_id),
+            {'_id': self.doc_id, 'current_stage': 2}
+        )
+        self.assertEqual([entry['seq'] for entry in self.read_journal()], [1, 2])
+
+    def test_concurrent_flushes_persist_state_once(self):
+        saved = []
+
+        def slow_save(document, doc_id):
+            saved.append(document)
+            gevent.sleep(0.01)
+            return (self.doc_id, '2-rev')
+
+        self.backend.save_auction_document.side_effect = slow_save
+        self.database.save_auction_document({'_id': self.doc_id, 'current_stage': 1}, self.doc_id)
+
+        flushes = [gevent.spawn(self.database.flush) for _ in range(2)]
+        gevent.joinall(flushes, timeout=1)
+
+        self.assertEqual([flush.value for flush in flushes], [True, True])
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(self.read_journal(), [])
+
+
+class TestClose(TestWriteBehindDatabase):
+
+    def test_close_flushes_and_stops_flusher(self):
+        self.database.save_auction_document({'_id': self.doc_id, 'current_stage': 1}, self.doc_id)
+        flusher = self.mocked_gevent.spawn.return_value
+
+        self.assertTrue(self.database.close())
+
+        self.assertEqual(self.backend.save_auction_document.call_count, 1)
+        self.assertEqual(flusher.kill.call_count, 1)
+        self.assertIsNone(self.database._flusher)
+        self.assertEqual(self.database._journals, {})
+
+
+class TestReplayJournal(TestWriteBehindDatabase):
+
+    def test_replay_persists_last_journaled_state(self):
+        self.backend.save_auction_document.return_value = None
+        for stage in range(2):
+            self.database.save_auction_document({'_id': self.doc_id, 'current_stage': stage}, self.doc_id)
+        # Simulate crash in the middle of append
+        with open(os.path.join(self.journal_dir, '{}.journal'.format(self.doc_id)), 'a') as journal:
+            journal.write('{"seq": 3, "docu')
+
+        backend = mock.MagicMock()
+        backend.save_auction_document.return_value = (self.doc_id, '3-rev')
+        database = WriteBehindDatabase(backend, self.config)
+
+        document = database.replay_journal(self.doc_id)
+
+        self.assertEqual(document, {'_id': self.doc_id, 'current_stage': 1})
+        backend.save_auction_document.assert_called_once_with(document, self.doc_id)
+        self.assertEqual(self.read_journal(), [])
+
+    def test_replay_without_journal(self):
+        self.assertIsNone(self.database.replay_journal(self.doc_id))
+        self.assertEqual(self.backend.save_auction_document.call_count, 0)
+
+
+class TestPrepareDatabase(TestWriteBehindDatabase):
+
+    def test_prepare_write_behind_database(self):
+        backend_class = mock.MagicMock()
+        with mock.patch.dict('openprocurement.auction.texas.database.DATABASE_MAPPING', {'test': backend_class}):
+            database = prepare_database({'type': 'test', 'write_behind': self.config})
+
+        self.assertTrue(IJournaledDatabase.providedBy(database))
+        self.assertEqual(database.database, backend_class.return_value)
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestSaveDocument))
+    tests.addTest(unittest.makeSuite(TestFlush))
+    tests.addTest(unittest.makeSuite(TestClose))
+    tests.addTest(unittest.makeSuite(TestReplayJournal))
+    tests.addTest(unittest.makeSuite(TestPrepareDatabase))
+    return tests
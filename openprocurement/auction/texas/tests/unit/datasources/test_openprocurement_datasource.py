@@ -4,7 +4,10 @@ import mock
 from urlparse import urljoin
 from uuid import uuid4
 
-from openprocurement.auction.texas.datasource import OpenProcurementAPIDataSource
+from requests.exceptions import RequestException
+
+from openprocurement.auction.texas.datasource import OpenProcurementAPIDataSource, prepare_datasource_resources
+from openprocurement.auction.texas.retry import RetryPolicy
 
 
 class TestOpenProcurementAPIDataSource(unittest.TestCase):
@@ -127,6 +130,35 @@ class TestInit(TestOpenProcurementAPIDataSource):
         # Assert DS connection was not checked
         self.assertEqual(self.mocked_request.call_count, 0)
 
+    def test_init_with_shared_resources(self):
+        self.config['with_document_service'] = True
+        self.config['DOCUMENT_SERVICE'] = {'username': 'username', 'password': 'password', 'url': 'http://ds'}
+        resources = {}
+
+        first = self.datasource_class(self.config, resources=resources)
+        self.config['auction_id'] = '2' * 32
+        second = self.datasource_class(self.config, resources=resources)
+
+        self.assertTrue(second.api_url.endswith('2' * 32))
+        self.assertIs(first.session, second.session)
+        self.assertIs(first.session_ds, second.session_ds)
+        self.assertIsNot(first.cache, second.cache)
+        self.assertEqual(self.mocked_request_session.call_count, 2)
+        # API and DS availability is checked once
+        self.assertEqual(self.mocked_make_request.call_count, 1)
+        self.assertEqual(self.mocked_request.call_count, 1)
+
+    def test_init_with_prepared_resources(self):
+        self.config['type'] = 'openprocurement.api'
+        resources = prepare_datasource_resources(self.config, {})
+        self.assertEqual(self.mocked_make_request.call_count, 1)
+
+        datasource = self.datasource_class(self.config, resources=resources)
+
+        self.assertIs(datasource.session, resources['session'])
+        self.assertEqual(self.mocked_make_request.call_count, 1)
+        self.assertEqual(prepare_datasource_resources({'type': 'test'}, {}), {})
+
 
 class TestUpdateSourceObject(TestOpenProcurementAPIDataSource):
 
@@ -660,14 +692,14 @@ class TestUploadFileWithDS(TestOpenProcurementAPIDataSource):
         self.datasource.session_ds = self.session_ds
 
         self.patch_make_request = mock.patch('openprocurement.auction.texas.datasource.make_request')
-        self.patch_yaml_dump = mock.patch('openprocurement.auction.texas.datasource.yaml_dump')
+        self.patch_serialize_protocol = mock.patch('openprocurement.auction.texas.datasource.serialize_protocol')
         self.patch_generate_request_id = mock.patch('openprocurement.auction.texas.datasource.generate_request_id')
 
         self.mock_make_request = self.patch_make_request.start()
 
-        self.mock_yaml_dump = self.patch_yaml_dump.start()
+        self.mock_serialize_protocol = self.patch_serialize_protocol.start()
         self.yaml_doc = {'yaml': 'data'}
-        self.mock_yaml_dump.return_value = self.yaml_doc
+        self.mock_serialize_protocol.return_value = self.yaml_doc
 
         self.mock_generate_request_id = self.patch_generate_request_id.start()
         self.request_id = uuid4().hex
@@ -675,7 +707,7 @@ class TestUploadFileWithDS(TestOpenProcurementAPIDataSource):
 
     def tearDown(self):
         self.patch_generate_request_id.stop()
-        self.patch_yaml_dump.stop()
+        self.patch_serialize_protocol.stop()
         self.patch_make_request.stop()
 
     def test_upload_with_doc_id(self):
@@ -815,14 +847,14 @@ class TestUploadFileWithoutDS(TestOpenProcurementAPIDataSource):
         self.datasource.session = self.session
 
         self.patch_make_request = mock.patch('openprocurement.auction.texas.datasource.make_request')
-        self.patch_yaml_dump = mock.patch('openprocurement.auction.texas.datasource.yaml_dump')
+        self.patch_serialize_protocol = mock.patch('openprocurement.auction.texas.datasource.serialize_protocol')
         self.patch_generate_request_id = mock.patch('openprocurement.auction.texas.datasource.generate_request_id')
 
         self.mock_make_request = self.patch_make_request.start()
 
-        self.mock_yaml_dump = self.patch_yaml_dump.start()
+        self.mock_serialize_protocol = self.patch_serialize_protocol.start()
         self.yaml_doc = {'yaml': 'data'}
-        self.mock_yaml_dump.return_value = self.yaml_doc
+        self.mock_serialize_protocol.return_value = self.yaml_doc
 
         self.mock_generate_request_id = self.patch_generate_request_id.start()
         self.request_id = uuid4().hex
@@ -830,7 +862,7 @@ class TestUploadFileWithoutDS(TestOpenProcurementAPIDataSource):
 
     def tearDown(self):
         self.patch_generate_request_id.stop()
-        self.patch_yaml_dump.stop()
+        self.patch_serialize_protocol.stop()
         self.patch_make_request.stop()
 
     def test_upload_with_doc_id(self):
@@ -1057,9 +1089,109 @@ class TestSetParticipationUrls(TestOpenProcurementAPIDataSource):
         )
 
 
+class TestGetData(TestOpenProcurementAPIDataSource):
+
+    def setUp(self):
+        super(TestGetData, self).setUp()
+        self.datasource = self.datasource_class(self.config)
+        self.session = mock.MagicMock()
+        self.datasource.session = self.session
+
+        self.patch_sleep = mock.patch('openprocurement.auction.texas.datasource.sleep')
+        self.mocked_sleep = self.patch_sleep.start()
+
+        self.patch_generate_request_id = mock.patch('openprocurement.auction.texas.datasource.generate_request_id')
+        self.mocked_generate_request_id = self.patch_generate_request_id.start()
+        self.request_id = uuid4().hex
+        self.mocked_generate_request_id.return_value = self.request_id
+
+        self.auction_data = {'data': {'id': self.config['auction_id']}}
+        self.response = mock.MagicMock(ok=True, status_code=200, headers={'ETag': '"etag"'})
+        self.response.json.return_value = self.auction_data
+        self.session.get.return_value = self.response
+
+    def tearDown(self):
+        self.patch_sleep.stop()
+        self.patch_generate_request_id.stop()
+
+    def test_revalidate_not_modified(self):
+        self.assertEqual(self.datasource.get_data(public=False), self.auction_data)
+
+        self.session.get.return_value = mock.MagicMock(ok=False, status_code=304)
+        self.assertEqual(self.datasource.get_data(public=False), self.auction_data)
+
+        self.assertEqual(self.session.get.call_count, 2)
+        headers = self.session.get.call_args[1]['headers']
+        self.assertEqual(headers['If-None-Match'], '"etag"')
+        self.assertEqual(self.session.get.call_args[1]['auth'], (self.config['resource_api_token'], ''))
+        self.assertEqual(self.datasource.cache.stats, {'hits': 0, 'revalidated': 1, 'misses': 1})
+
+    def test_fresh_data_without_request(self):
+        self.datasource.cache.ttl = 60
+
+        first = self.datasource.get_data()
+        first['data']['id'] = 'changed'
+        second = self.datasource.get_data()
+
+        self.assertEqual(second, {'data': {'id': self.config['auction_id']}})
+        self.assertEqual(self.session.get.call_count, 1)
+        self.assertIsNone(self.session.get.call_args[1]['auth'])
+        self.assertEqual(self.datasource.cache.stats['hits'], 1)
+
+    def test_credential_modes_cached_separately(self):
+        self.datasource.cache.ttl = 60
+
+        self.datasource.get_data()
+        self.datasource.get_data(with_credentials=True)
+
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_failed_request_is_retried(self):
+        self.session.get.side_effect = [
+            RequestException('Connection reset'),
+            mock.MagicMock(ok=False, status_code=502),
+            self.response
+        ]
+
+        self.assertEqual(self.datasource.get_data(public=False), self.auction_data)
+
+        self.assertEqual(self.session.get.call_count, 3)
+        self.assertEqual(self.mocked_sleep.call_count, 2)
+        self.assertEqual(self.datasource.cache.stats['misses'], 1)
+        self.assertEqual(self.datasource.cache.get(self.datasource.api_url + '/auction',
+                                                   self.config['resource_api_token']).etag, '"etag"')
+
+    def test_gave_up_retries(self):
+        self.datasource.retry_policy = RetryPolicy(attempts=3, jitter=False)
+        self.session.get.return_value = mock.MagicMock(ok=False, status_code=502)
+
+        self.assertIsNone(self.datasource.get_data())
+
+        self.assertEqual(self.session.get.call_count, 3)
+        self.assertIsNone(self.datasource.cache.get(self.datasource.api_url, ''))
+
+    def test_client_error_is_not_retried(self):
+        self.session.get.return_value = mock.MagicMock(ok=False, status_code=404)
+
+        self.assertIsNone(self.datasource.get_data())
+
+        self.assertEqual(self.session.get.call_count, 1)
+        self.assertEqual(self.mocked_sleep.call_count, 0)
+
+    def test_cache_cleared_on_post(self):
+        self.datasource.cache.ttl = 60
+        self.datasource.get_data()
+
+        self.datasource.set_participation_urls({'data': {'bids': []}})
+        self.datasource.get_data()
+
+        self.assertEqual(self.session.get.call_count, 2)
+
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TestInit))
+    suite.addTest(unittest.makeSuite(TestGetData))
     suite.addTest(unittest.makeSuite(TestUpdateSourceObject))
     suite.addTest(unittest.makeSuite(TestPostResultData))
     suite.addTest(unittest.makeSuite(TestUploadHistoryDocument))
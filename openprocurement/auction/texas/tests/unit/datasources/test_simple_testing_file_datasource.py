@@ -33,7 +33,7 @@ class TestSimpleTestingFileDataSource(unittest.TestCase):
         self.mocked_json_load = self.patch_json_load.start()
         self.mocked_json_load.return_value = self.auction_data
 
-        self.patch_datetime = mock.patch('openprocurement.auction.texas.datasource.datetime')
+        self.patch_datetime = mock.patch('openprocurement.auction.texas.datasource.clock')
         self.mocked_datetime = self.patch_datetime.start()
         self.mocked_datetime.return_value = 'datetime'
         self.mocked_datetime.now().__add__().isoformat.return_value = 'test_datetime'
@@ -0,0 +1,114 @@
+import unittest
+
+import gevent
+import mock
+from gevent.lock import BoundedSemaphore
+from wtforms.validators import ValidationError
+
+from openprocurement.auction.texas.admission import BidQueue, BidQueueStopped
+from openprocurement.auction.texas.constants import MAIN_ROUND, PAUSE
+from openprocurement.auction.texas.context import DictContext
+from openprocurement.auction.texas.utils import RoundState
+
+
+class TestBidQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.app = mock.MagicMock()
+        self.app.context = DictContext({})
+        self.app.context['server_actions'] = BoundedSemaphore()
+        self.app.context['round_state'] = RoundState(0, MAIN_ROUND, 100, 50, 50)
+        self.app.bids_handler.add_bid.side_effect = self.add_bid
+        self.added = []
+
+        self.queue = BidQueue(self.app)
+
+    def tearDown(self):
+        if self.queue._committer is not None:
+            self.queue._committer.kill()
+
+    def add_bid(self, current_stage, bid):
+        # Bid ends the round, as BidsHandler does
+        self.added.append((current_stage, bid['bidder_id']))
+        self.app.context['round_state'] = RoundState(current_stage + 1, PAUSE, bid['amount'], 50, 50)
+        return True
+
+    def submit_all(self, bids):
+        greenlets = [gevent.spawn(self.queue.submit, bid) for bid in bids]
+        gevent.joinall(greenlets, timeout=1)
+        return [greenlet.value for greenlet in greenlets]
+
+    def test_contended_bids_decided_in_order(self):
+        bids = [
+            {'bidder_id': 'first', 'amount': 150, 'time': '1'},
+            {'bidder_id': 'second', 'amount': 200, 'time': '2'},
+        ]
+
+        results = self.submit_all(bids)
+
+        self.assertIs(results[0], True)
+        self.assertIsInstance(results[1], ValidationError)
+        self.assertEqual(results[1].args[0], u'Current stage does not allow bidding')
+        self.assertEqual(self.added, [(0, 'first')])
+        self.assertEqual(self.queue.stats['submitted'], 2)
+        self.assertEqual(self.queue.stats['accepted'], 1)
+        self.assertEqual(self.queue.stats['rejected'], 1)
+        self.assertEqual(self.queue.stats['max_depth'], 2)
+        self.assertEqual(self.queue.stats['depth'], 0)
+        self.assertEqual(self.queue.rejections, {u'Current stage does not allow bidding': 1})
+        self.assertEqual(self.queue.latency.series['wait']['count'], 2)
+        self.assertEqual(self.queue.latency.series['commit']['count'], 1)
+
+    def test_bids_wait_for_lock(self):
+        self.app.context['server_actions'].acquire()
+        greenlet = gevent.spawn(self.queue.submit, {'bidder_id': 'first', 'amount': 150, 'time': '1'})
+        gevent.sleep(0.01)
+
+        self.assertFalse(greenlet.ready())
+        self.app.context['server_actions'].release()
+
+        self.assertIs(greenlet.get(timeout=1), True)
+        self.assertGreater(self.queue.stats['wait_max'], 0)
+
+    def test_committer_survives_errors(self):
+        self.app.bids_handler.add_bid.side_effect = [KeyError('stages'), True]
+
+        first, second = self.submit_all([
+            {'bidder_id': 'first', 'amount': 150, 'time': '1'},
+            {'bidder_id': 'second', 'amount': 150, 'time': '2'},
+        ])
+
+        self.assertIsInstance(first, KeyError)
+        self.assertIs(second, True)
+        self.assertEqual(self.queue.rejections, {'KeyError': 1})
+        self.assertFalse(self.app.context['server_actions'].locked())
+
+    def test_stop_rejects_pending_bids(self):
+        self.app.context['server_actions'].acquire()
+        greenlets = [
+            gevent.spawn(self.queue.submit, {'bidder_id': bidder_id, 'amount': 150, 'time': '1'})
+            for bidder_id in ('first', 'second')
+        ]
+        gevent.sleep(0.01)
+
+        self.queue.stop()
+
+        gevent.joinall(greenlets, timeout=1)
+        for greenlet in greenlets:
+            self.assertTrue(greenlet.ready())
+            self.assertIsInstance(greenlet.value, BidQueueStopped)
+        self.assertEqual(self.added, [])
+        self.assertEqual(self.queue.stats['rejected'], 2)
+        self.assertEqual(self.queue.stats['depth'], 0)
+
+        # Bids submitted after stop are rejected without waiting
+        result = self.queue.submit({'bidder_id': 'third', 'amount': 150, 'time': '2'})
+        self.assertIsInstance(result, BidQueueStopped)
+        self.assertIsNone(self.queue._committer)
+        self.assertEqual(self.queue.rejections, {'BidQueueStopped': 3})
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestBidQueue))
+    return tests
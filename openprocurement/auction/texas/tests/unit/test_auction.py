@@ -3,8 +3,10 @@ import mock
 
 from copy import deepcopy
 from datetime import datetime, timedelta
+from zope.interface import alsoProvides
 
 from openprocurement.auction.texas.auction import Auction
+from openprocurement.auction.texas.database import IJournaledDatabase
 from openprocurement.auction.worker_core.constants import TIMEZONE
 from openprocurement.auction.texas.constants import (
     MULTILINGUAL_FIELDS,
@@ -80,13 +82,8 @@ class TestScheduleAuction(AuctionInitSetup):
         self.auction.start_auction = mock.MagicMock()
         self.auction.startDate = 'startDate'
 
-        self.patch_scheduler = mock.patch(
-            'openprocurement.auction.texas.auction.SCHEDULER'
-        )
-        self.mocked_scheduler = self.patch_scheduler.start()
-
         self.patch_run_server = mock.patch(
-            'openprocurement.auction.texas.auction.run_server'
+            'openprocurement.auction.texas.server.run_server'
         )
         self.mocked_run_server = self.patch_run_server.start()
         self.mocked_run_server.return_value = 'server'
@@ -102,7 +99,6 @@ class TestScheduleAuction(AuctionInitSetup):
 
     def tearDown(self):
         super(TestScheduleAuction, self).tearDown()
-        self.patch_scheduler.stop()
         self.patch_run_server.stop()
         self.patch_synchronize_auction_info.stop()
 
@@ -141,15 +137,13 @@ class TestScheduleAuction(AuctionInitSetup):
         self.assertEqual(self.auction.context['auction_data'], self.auction._auction_data)
         self.assertEqual(self.auction.context['bidders_data'], self.auction.bidders_data)
         self.assertEqual(self.auction.context['bids_mapping'], self.auction.bids_mapping)
+        self.assertIs(self.auction.context['bidders_index'], self.auction.bidders_index)
         self.assertEqual(self.auction.context['auction_protocol'], auction_protocol)
 
-        self.assertEqual(self.mocked_scheduler.add_job.call_count, 1)
-        self.mocked_scheduler.add_job.assert_called_with(
+        self.assertEqual(self.auction.job_service.add_start_auction_job.call_count, 1)
+        self.auction.job_service.add_start_auction_job.assert_called_with(
             self.auction.start_auction,
-            'date',
-            run_date=convert_datetime_results[0],
-            name='Start of Auction',
-            id='auction:start'
+            convert_datetime_results[0]
         )
 
         self.assertEqual(self.auction.job_service.add_pause_job.call_count, 1)
@@ -168,12 +162,61 @@ class TestScheduleAuction(AuctionInitSetup):
 
         self.assertEqual(self.auction.context['server'], 'server')
 
+    def test_auction_schedule_replays_journal(self):
+        auction_document = {
+            'stages': [
+                {
+                    'start': datetime.now().isoformat()
+                },
+                {
+                    'start': datetime.now().isoformat()
+                }
+            ],
+        }
+        alsoProvides(self.mock_db, IJournaledDatabase)
+        self.mock_db.get_auction_document.return_value = auction_document
+        self.mocked_utils.update_auction_document.return_value.__enter__.return_value = auction_document
+        self.mocked_utils.convert_datetime.return_value = datetime.now()
+
+        self.auction.schedule_auction()
+
+        self.assertEqual(self.mock_db.replay_journal.call_count, 1)
+        self.mock_db.replay_journal.assert_called_with(self.auction.context['auction_doc_id'])
+        self.assertEqual(self.mock_db.get_auction_document.call_count, 1)
+        self.assertEqual(self.auction.context['auction_document'], auction_document)
+
+    def test_auction_schedule_hosted(self):
+        auction_document = {
+            'stages': [
+                {
+                    'start': datetime.now().isoformat()
+                },
+                {
+                    'start': datetime.now().isoformat()
+                }
+            ],
+        }
+        self.auction.router = mock.MagicMock()
+        self.mock_db.get_auction_document.return_value = auction_document
+        self.mocked_utils.update_auction_document.return_value.__enter__.return_value = auction_document
+        self.mocked_utils.convert_datetime.return_value = datetime.now()
+
+        with mock.patch('openprocurement.auction.texas.server.mount_server') as mocked_mount_server:
+            mocked_mount_server.return_value = 'mounted server'
+            self.auction.schedule_auction()
+
+        self.assertEqual(self.mocked_run_server.call_count, 0)
+        mocked_mount_server.assert_called_once_with(
+            self.auction, self.auction.router, None, self.mocked_logger
+        )
+        self.assertEqual(self.auction.context['server'], 'mounted server')
+
 
 class TestCancelAuction(AuctionInitSetup):
 
     def setUp(self):
         super(TestCancelAuction, self).setUp()
-        self.patch_datetime = mock.patch('openprocurement.auction.texas.auction.datetime')
+        self.patch_datetime = mock.patch('openprocurement.auction.texas.auction.clock')
 
         self.mock_datetime = self.patch_datetime.start()
         self.mock_now = mock.MagicMock()
@@ -276,7 +319,7 @@ class TestStartAuction(AuctionInitSetup):
             }
         }
 
-        self.patch_datetime = mock.patch('openprocurement.auction.texas.auction.datetime')
+        self.patch_datetime = mock.patch('openprocurement.auction.texas.auction.clock')
 
         self.mock_datetime = self.patch_datetime.start()
 
@@ -573,8 +616,7 @@ class TestPrepareAuctionDocument(AuctionInitSetup):
         self.mocked_utils.prepare_auction_stages.assert_called_with(
             self.start_date,
             auction_document,
-            self.mock_context['deadline'],
-            fast_forward=True
+            self.mock_context['deadline']
         )
 
         self.assertEqual(self.mocked_utils.set_absolute_deadline.call_count, 1)
@@ -755,8 +797,7 @@ class TestPrepareAuctionDocument(AuctionInitSetup):
         self.mocked_utils.prepare_auction_stages.assert_called_with(
             self.start_date,
             auction_document,
-            self.mock_context['deadline'],
-            fast_forward=True
+            self.mock_context['deadline']
         )
 
         self.assertEqual(self.mocked_utils.set_absolute_deadline.call_count, 0)
@@ -1223,6 +1264,17 @@ class TestSetAuctionData(AuctionInitSetup):
         self.assertEqual(self.mock_sys.exit.call_count, 1)
         self.mock_sys.exit.assert_called_with(1)
 
+    def test_without_auction_document_hosted(self):
+        self.mock_datasource.get_data.return_value = {}
+        self.mock_db.get_auction_document.return_value = {}
+        self.auction.router = mock.MagicMock()
+
+        with self.assertRaises(RuntimeError):
+            self.auction._set_auction_data(False)
+
+        self.assertEqual(self.mock_end_auction_event.set.call_count, 1)
+        self.assertEqual(self.mock_sys.exit.call_count, 0)
+
 
 class TestSetStartDate(AuctionInitSetup):
 
@@ -1321,6 +1373,7 @@ class TestSetMapping(AuctionInitSetup):
         self.auction._set_mapping()
 
         self.assertEqual(self.auction.bids_mapping, expected_result)
+        self.assertEqual(self.auction.bidders_index, frozenset(['id_1', 'id_2']))
 
 
 def suite():
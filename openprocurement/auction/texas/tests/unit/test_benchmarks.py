@@ -0,0 +1,34 @@
+import unittest
+
+from openprocurement.auction.texas.database import MEMORY_STORES
+from openprocurement.auction.texas.tests.benchmarks.postbid import run_benchmark, percentile
+
+
+class TestPostBidBenchmark(unittest.TestCase):
+
+    def tearDown(self):
+        MEMORY_STORES.clear()
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+    def test_run_benchmark(self):
+        results = run_benchmark(bidders=3, rounds=2)
+
+        self.assertEqual(results['summary']['requests'], 6)
+        # Only the first valid bid of the round is accepted
+        self.assertEqual(results['summary']['accepted'], 2)
+        self.assertEqual([r['accepted'] for r in results['rounds']], [1, 1])
+        self.assertLess(results['rounds'][0]['document_size'], results['rounds'][1]['document_size'])
+        for key in ('p50', 'p95', 'p99'):
+            self.assertIsNotNone(results['summary']['latency_ms'][key])
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestPostBidBenchmark))
+    return tests
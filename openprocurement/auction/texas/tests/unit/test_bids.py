@@ -1,10 +1,12 @@
+import random
 import unittest
 
 import mock
 from copy import deepcopy
 from datetime import datetime
 
-from openprocurement.auction.texas.bids import BidsHandler
+from openprocurement.auction.utils import sorting_by_amount
+from openprocurement.auction.texas.bids import BidsHandler, ResultsIndex
 from openprocurement.auction.texas.constants import DEADLINE_HOUR
 
 
@@ -12,8 +14,19 @@ class TestBidsHandler(unittest.TestCase):
     def setUp(self):
 
         self.bids_handler = BidsHandler()
+        self.deadline = datetime.now().replace(hour=DEADLINE_HOUR)
+        self.auction_document = {
+            'stages': [{}],
+            'results': [],
+            'minimalStep': {'amount': 30},
+            'current_stage': 0
+        }
         self.bids_handler.context = {
+            'auction_doc_id': '1' * 32,
+            'auction_document': self.auction_document,
+            'auction_protocol': {},
             'bids_mapping': {'test_bidder_id': 'test_name'},
+            'deadline': self.deadline,
             'worker_defaults': {
                 'deadline': {
                     'deadline_hour': DEADLINE_HOUR
@@ -24,16 +37,23 @@ class TestBidsHandler(unittest.TestCase):
         self.bids_handler.job_service = mock.MagicMock()
         self.test_bid = {'amount': 350, 'bidder_id': 'test_bidder_id', 'time': 'current_time'}
 
-        self.patch_update_auction_document = mock.patch(
-            'openprocurement.auction.texas.utils.update_auction_document'
-        )
-        self.mocked_update_auction_document = self.patch_update_auction_document.start()
-
         self.bid_with_name = deepcopy(self.test_bid)
         self.bid_with_name.update({'bidder_name': 'test_name'})
 
+        self.patch_prepare_auction_stages = mock.patch(
+            'openprocurement.auction.texas.bids.utils.prepare_auction_stages'
+        )
+        self.mocked_prepare_auction_stages = self.patch_prepare_auction_stages.start()
+        self.mocked_prepare_auction_stages.return_value = ['pause', {'start': 'test'}]
+
+        self.patch_convert_datetime = mock.patch('openprocurement.auction.texas.bids.utils.convert_datetime')
+        self.mocked_convert_datetime = self.patch_convert_datetime.start()
+        self.convert_datetime_results = ['converted_bid_time', 'converted_round_start_time']
+        self.mocked_convert_datetime.side_effect = self.convert_datetime_results
+
     def tearDown(self):
-        self.patch_update_auction_document.stop()
+        self.patch_prepare_auction_stages.stop()
+        self.patch_convert_datetime.stop()
 
 
 class TestAddBid(TestBidsHandler):
@@ -41,122 +61,121 @@ class TestAddBid(TestBidsHandler):
     def setUp(self):
         super(TestAddBid, self).setUp()
 
-        self.patch_sorting_by_amount = mock.patch('openprocurement.auction.texas.bids.sorting_by_amount')
         self.patch_prepare_results_stage = mock.patch('openprocurement.auction.texas.bids.utils.prepare_results_stage')
-        self.patch_end_bid_stage = mock.patch.object(self.bids_handler, 'end_bid_stage')
+        self.patch_approve_auction_protocol_info_on_bids_stage = mock.patch(
+            'openprocurement.auction.texas.bids.approve_auction_protocol_info_on_bids_stage'
+        )
+        self.patch_get_round_ending_time = mock.patch('openprocurement.auction.texas.bids.get_round_ending_time')
 
-        self.mocked_sorting_by_amount = self.patch_sorting_by_amount.start()
         self.mocked_prepare_results_stage = self.patch_prepare_results_stage.start()
-        self.mocked_end_bid_stage = self.patch_end_bid_stage.start()
+        self.mocked_approve_auction_protocol_info_on_bids_stage = \
+            self.patch_approve_auction_protocol_info_on_bids_stage.start()
+        self.mocked_get_round_ending_time = self.patch_get_round_ending_time.start()
 
-        self.mocked_sorting_by_amount.return_value = [{'result': 'sorted_results'}]
-        self.mocked_prepare_results_stage.return_value = {'result': 'prepared_result_stage'}
+        self.mocked_prepare_results_stage.return_value = {'bidder_id': 'test_bidder_id', 'amount': 350}
+        self.mocked_approve_auction_protocol_info_on_bids_stage.return_value = {'auction': 'protocol'}
+        self.mocked_get_round_ending_time.return_value = 'round_end_date'
 
     def tearDown(self):
         super(TestAddBid, self).tearDown()
-        self.patch_sorting_by_amount.stop()
         self.patch_prepare_results_stage.stop()
-        self.patch_end_bid_stage.stop()
+        self.patch_approve_auction_protocol_info_on_bids_stage.stop()
+        self.patch_get_round_ending_time.stop()
 
-    def test_add_bid_not_in_results(self):
-        auction_document = {'stages': [{}], 'results': []}
-        self.mocked_update_auction_document.return_value.__enter__.return_value = auction_document
+    def assert_document_saved_once(self):
+        self.assertEqual(self.bids_handler.database.save_auction_document.call_count, 1)
+        self.bids_handler.database.save_auction_document.assert_called_with(
+            self.bids_handler.context['auction_document'], self.bids_handler.context['auction_doc_id']
+        )
 
+    def test_add_bid_not_in_results(self):
         result = self.bids_handler.add_bid(0, self.test_bid)
 
         self.assertEqual(result, True)
+        self.assert_document_saved_once()
 
-        self.mocked_update_auction_document.assert_called_once_with(
-            self.bids_handler.context, self.bids_handler.database
-        )
+        auction_document = self.bids_handler.context['auction_document']
         self.mocked_prepare_results_stage.assert_called_once_with(**self.bid_with_name)
-        self.mocked_sorting_by_amount.assert_called_once_with([self.mocked_prepare_results_stage.return_value])
-        self.mocked_end_bid_stage.assert_called_once_with(self.bid_with_name)
+        self.assertEqual(auction_document['results'], [self.mocked_prepare_results_stage.return_value])
+        self.assertEqual(
+            auction_document['stages'],
+            [self.mocked_prepare_results_stage.return_value, 'pause', {'start': 'test'}]
+        )
+        self.assertEqual(auction_document['current_stage'], 1)
 
-        self.assertEqual(auction_document['results'], self.mocked_sorting_by_amount.return_value)
-        self.assertEqual(auction_document['stages'][0], self.mocked_prepare_results_stage.return_value)
+        self.mocked_approve_auction_protocol_info_on_bids_stage.assert_called_once_with(auction_document, {})
+        self.assertEqual(
+            self.bids_handler.context['auction_protocol'],
+            self.mocked_approve_auction_protocol_info_on_bids_stage.return_value
+        )
+
+        self.assertEqual(self.bids_handler.job_service.remove_jobs.call_count, 0)
+        self.bids_handler.job_service.add_pause_job.assert_called_once_with(self.convert_datetime_results[1])
+        self.bids_handler.job_service.add_ending_main_round_job.assert_called_once_with('round_end_date')
 
     def test_add_bid_already_in_results(self):
-        auction_document = {'stages': [{}], 'results': [{'bidder_id': 'test_bidder_id'}]}
-        self.mocked_update_auction_document.return_value.__enter__.return_value = auction_document
+        self.auction_document['results'] = [
+            {'bidder_id': 'other_bidder_id', 'amount': 400},
+            {'bidder_id': 'test_bidder_id', 'amount': 300},
+            {'bidder_id': 'last_bidder_id', 'amount': 200},
+        ]
 
         result = self.bids_handler.add_bid(0, self.test_bid)
 
         self.assertEqual(result, True)
+        self.assert_document_saved_once()
 
-        self.mocked_update_auction_document.assert_called_once_with(
-            self.bids_handler.context, self.bids_handler.database
-        )
+        auction_document = self.bids_handler.context['auction_document']
         self.mocked_prepare_results_stage.assert_called_once_with(**self.bid_with_name)
-        self.mocked_sorting_by_amount.assert_called_once_with([self.mocked_prepare_results_stage.return_value])
-        self.mocked_end_bid_stage.assert_called_once_with(self.bid_with_name)
-
-        self.assertEqual(auction_document['results'], self.mocked_sorting_by_amount.return_value)
+        self.assertEqual(
+            [result['bidder_id'] for result in auction_document['results']],
+            ['other_bidder_id', 'test_bidder_id', 'last_bidder_id']
+        )
+        self.assertEqual(auction_document['results'][1], self.mocked_prepare_results_stage.return_value)
         self.assertEqual(auction_document['stages'][0], self.mocked_prepare_results_stage.return_value)
+        self.assertEqual(auction_document['current_stage'], 1)
 
-    def test_add_bid_error(self):
-        exc = Exception('Something went wrong :(')
-        self.mocked_prepare_results_stage.side_effect = exc
+    def test_add_bid_without_main_round(self):
+        self.mocked_prepare_auction_stages.return_value = ['pause', {}]
 
         result = self.bids_handler.add_bid(0, self.test_bid)
 
-        self.assertEqual(result, exc)
-        self.mocked_update_auction_document.assert_called_once_with(
-            self.bids_handler.context, self.bids_handler.database
-        )
-        self.mocked_prepare_results_stage.assert_called_once_with(**self.bid_with_name)
-        self.assertEqual(self.mocked_sorting_by_amount.call_count, 0)
-        self.assertEqual(self.mocked_end_bid_stage.call_count, 0)
-
-
-class TestEndBidStage(TestBidsHandler):
-
-    def setUp(self):
-        super(TestEndBidStage, self).setUp()
-        self.bids_handler.context['auction_protocol'] = {}
-        self.patch_generate_request_id = mock.patch('openprocurement.auction.texas.bids.generate_request_id')
-        self.mocked_generate_request_id = self.patch_generate_request_id.start()
+        self.assertEqual(result, True)
+        self.assert_document_saved_once()
 
-        self.deadline = datetime.now().replace(hour=DEADLINE_HOUR)
-        self.bids_handler.context['deadline'] = self.deadline
+        auction_document = self.bids_handler.context['auction_document']
+        self.assertEqual(
+            auction_document['stages'],
+            [self.mocked_prepare_results_stage.return_value, 'pause']
+        )
+        self.assertEqual(auction_document['current_stage'], 1)
 
-        self.patch_scheduler = mock.patch('openprocurement.auction.texas.bids.SCHEDULER')
-        self.mocked_scheduler = self.patch_scheduler.start()
+        self.bids_handler.job_service.remove_job.assert_called_once_with('pause')
+        self.bids_handler.job_service.add_ending_main_round_job.assert_called_once_with(self.deadline)
+        self.assertEqual(self.bids_handler.job_service.add_pause_job.call_count, 0)
+        self.assertEqual(self.mocked_get_round_ending_time.call_count, 0)
 
-        self.patch_approve_auction_protocol_info_on_bids_stage = mock.patch(
-            'openprocurement.auction.texas.bids.approve_auction_protocol_info_on_bids_stage'
-        )
-        self.mocked_approve_auction_protocol_info_on_bids_stage = \
-            self.patch_approve_auction_protocol_info_on_bids_stage.start()
-        self.mocked_approve_auction_protocol_info_on_bids_stage.return_value = {'auction': 'protocol'}
+    def test_add_bid_error(self):
+        initial_auction_document = deepcopy(self.auction_document)
+        exc = Exception('Something went wrong :(')
+        self.mocked_prepare_results_stage.side_effect = exc
 
-        self.patch_prepare_auction_stages = mock.patch(
-            'openprocurement.auction.texas.bids.utils.prepare_auction_stages'
-        )
-        self.mocked_prepare_auction_stages = self.patch_prepare_auction_stages.start()
+        result = self.bids_handler.add_bid(0, self.test_bid)
 
-        self.patch_get_round_ending_time = mock.patch('openprocurement.auction.texas.bids.get_round_ending_time')
-        self.mocked_get_round_ending_time = self.patch_get_round_ending_time.start()
-        self.round_ending_time_result = 'round_end_date'
-        self.mocked_get_round_ending_time.return_value = self.round_ending_time_result
+        self.assertEqual(result, exc)
+        self.mocked_prepare_results_stage.assert_called_once_with(**self.bid_with_name)
+        self.assertIsNone(self.bids_handler._results_index)
 
-        self.patch_round_duration = mock.patch('openprocurement.auction.texas.bids.ROUND_DURATION')
-        self.mocked_round_duration = self.patch_round_duration.start()
+        # Nothing is saved or rescheduled
+        self.assertEqual(self.bids_handler.database.save_auction_document.call_count, 0)
+        self.assertEqual(self.bids_handler.context['auction_document'], initial_auction_document)
+        self.assertEqual(self.bids_handler.context['auction_protocol'], {})
+        self.assertEqual(self.bids_handler.job_service.remove_job.call_count, 0)
+        self.assertEqual(self.bids_handler.job_service.add_pause_job.call_count, 0)
+        self.assertEqual(self.bids_handler.job_service.add_ending_main_round_job.call_count, 0)
 
-        self.patch_convert_datetime = mock.patch('openprocurement.auction.texas.bids.utils.convert_datetime')
-        self.mocked_convert_datetime = self.patch_convert_datetime.start()
-        self.convert_datetime_results = ['converted_bid_time', 'converted_round_start_time']
-        self.mocked_convert_datetime.side_effect = self.convert_datetime_results
 
-    def tearDown(self):
-        super(TestEndBidStage, self).tearDown()
-        self.patch_generate_request_id.stop()
-        self.patch_scheduler.stop()
-        self.patch_prepare_auction_stages.stop()
-        self.patch_convert_datetime.stop()
-        self.patch_get_round_ending_time.stop()
-        self.patch_round_duration.stop()
-        self.patch_approve_auction_protocol_info_on_bids_stage.stop()
+class TestEndBidStage(TestBidsHandler):
 
     def test_end_bid_stage_no_main_round(self):
         auction_document = {'stages': [], 'results': [], 'minimalStep': 30, 'current_stage': 0}
@@ -164,38 +183,19 @@ class TestEndBidStage(TestBidsHandler):
             'value': {'amount': self.bid_with_name['amount']},
             'minimalStep': auction_document['minimalStep']
         }
-
-        self.mocked_update_auction_document.return_value.__enter__.return_value = auction_document
-        self.bids_handler.context['auction_document'] = auction_document
         self.mocked_prepare_auction_stages.return_value = ('pause', {})
 
-        result = self.bids_handler.end_bid_stage(self.bid_with_name)
+        result = self.bids_handler.end_bid_stage(auction_document, self.bid_with_name)
 
-        self.assertEqual(result, None)
+        self.assertEqual(result, {})
         self.assertEqual(auction_document['stages'], ['pause'])
-
-        self.mocked_generate_request_id.assert_called_once()
-        self.mocked_scheduler.remove_all_jobs.assert_called_once()
-        self.mocked_approve_auction_protocol_info_on_bids_stage.assert_called_once_with(
-            self.bids_handler.context['auction_document'], {}
-        )
-        self.assertEqual(
-            self.bids_handler.context['auction_protocol'],
-            self.mocked_approve_auction_protocol_info_on_bids_stage.return_value
-        )
-        self.mocked_update_auction_document.assert_called_once_with(
-            self.bids_handler.context, self.bids_handler.database
-        )
+        self.assertEqual(auction_document['current_stage'], 1)
 
         self.mocked_convert_datetime.assert_called_once_with(self.bid_with_name['time'])
         self.mocked_prepare_auction_stages.assert_called_once_with(
-            self.convert_datetime_results[0], expected_bid_document, self.deadline, fast_forward=False
+            self.convert_datetime_results[0], expected_bid_document, self.deadline
         )
-
-        self.bids_handler.job_service.add_ending_main_round_job.assert_called_once_with(self.deadline)
-
-        self.assertEqual(self.bids_handler.job_service.add_pause_job.call_count, 0)
-        self.assertEqual(self.mocked_get_round_ending_time.call_count, 0)
+        self.assertEqual(self.bids_handler.database.save_auction_document.call_count, 0)
 
     def test_end_bid_stage_with_main_round(self):
         auction_document = {'stages': [], 'results': [], 'minimalStep': 30, 'current_stage': 0}
@@ -203,46 +203,83 @@ class TestEndBidStage(TestBidsHandler):
             'value': {'amount': self.bid_with_name['amount']},
             'minimalStep': auction_document['minimalStep']
         }
-
-        self.mocked_update_auction_document.return_value.__enter__.return_value = auction_document
-        self.bids_handler.context['auction_document'] = auction_document
         prepare_auction_stages_result = ['pause', {'start': 'test'}]
         self.mocked_prepare_auction_stages.return_value = prepare_auction_stages_result
 
-        result = self.bids_handler.end_bid_stage(self.bid_with_name)
+        result = self.bids_handler.end_bid_stage(auction_document, self.bid_with_name)
 
-        self.assertEqual(result, None)
+        self.assertEqual(result, prepare_auction_stages_result[1])
         self.assertEqual(auction_document['stages'], prepare_auction_stages_result)
+        self.assertEqual(auction_document['current_stage'], 1)
 
-        self.mocked_generate_request_id.assert_called_once()
-        self.mocked_scheduler.remove_all_jobs.assert_called_once()
-        self.mocked_approve_auction_protocol_info_on_bids_stage.assert_called_once_with(
-            self.bids_handler.context['auction_document'], {}
-        )
-        self.assertEqual(
-            self.bids_handler.context['auction_protocol'],
-            self.mocked_approve_auction_protocol_info_on_bids_stage.return_value
-        )
-        self.mocked_update_auction_document.assert_called_once_with(
-            self.bids_handler.context, self.bids_handler.database
-        )
-        self.mocked_convert_datetime.assert_any_call(self.bid_with_name['time'])
+        self.mocked_convert_datetime.assert_called_once_with(self.bid_with_name['time'])
         self.mocked_prepare_auction_stages.assert_called_once_with(
-            self.convert_datetime_results[0], expected_bid_document, self.deadline, fast_forward=False
+            self.convert_datetime_results[0], expected_bid_document, self.deadline
         )
+        self.assertEqual(self.bids_handler.database.save_auction_document.call_count, 0)
+
+
+class TestResultsIndex(unittest.TestCase):
+
+    def apply_with_sorting(self, results, result):
+        results = deepcopy(results)
+        index = next((i for i, res in enumerate(results)
+                      if res['bidder_id'] == result['bidder_id']), None)
+        if index is not None:
+            results[index] = result
+        else:
+            results.append(result)
+        return sorting_by_amount(results)
+
+    def test_same_order_as_sorting_by_amount(self):
+        rand = random.Random(42)
+        results = []
+        index = ResultsIndex(results)
+        for i in range(500):
+            result = {
+                'bidder_id': 'bidder_{}'.format(rand.randint(0, 15)),
+                'amount': rand.choice([100, 150, 200, 250, 300]) + rand.choice([0, 0, 0.5]),
+                'time': i
+            }
+            expected = self.apply_with_sorting(results, result)
 
-        self.mocked_convert_datetime.assert_any_call(prepare_auction_stages_result[1]['start'])
+            index.update(results, result)
 
-        self.bids_handler.job_service.add_ending_main_round_job.assert_called_once_with(self.round_ending_time_result)
-        self.bids_handler.job_service.add_pause_job.assert_called_once_with(self.convert_datetime_results[1])
+            self.assertEqual(results, expected)
+            self.assertTrue(index.matches(results))
 
-        self.mocked_get_round_ending_time.assert_called_once_with(
-            self.convert_datetime_results[1], self.mocked_round_duration, self.deadline
-        )
+    def test_index_rebuilt_for_changed_results(self):
+        bids_handler = BidsHandler()
+        results = [{'bidder_id': 'a', 'amount': 100}]
+        index = bids_handler._get_results_index(results)
+        self.assertIs(bids_handler._get_results_index(results), index)
+
+        results.append({'bidder_id': 'b', 'amount': 200})
+        new_index = bids_handler._get_results_index(results)
+
+        self.assertIsNot(new_index, index)
+        self.assertEqual([result['bidder_id'] for result in results], ['b', 'a'])
+        self.assertEqual(new_index.bidders, ['b', 'a'])
+
+    def test_index_does_not_match_changed_middle_result(self):
+        results = [
+            {'bidder_id': 'a', 'amount': 300},
+            {'bidder_id': 'b', 'amount': 200},
+            {'bidder_id': 'c', 'amount': 100},
+        ]
+        index = ResultsIndex(results)
+        self.assertTrue(index.matches(results))
+
+        results[1] = {'bidder_id': 'd', 'amount': 200}
+        self.assertFalse(index.matches(results))
+
+        results[1] = {'bidder_id': 'b', 'amount': 250}
+        self.assertFalse(index.matches(results))
 
 
 def suite():
     tests = unittest.TestSuite()
     tests.addTest(unittest.makeSuite(TestAddBid))
     tests.addTest(unittest.makeSuite(TestEndBidStage))
+    tests.addTest(unittest.makeSuite(TestResultsIndex))
     return tests
@@ -0,0 +1,321 @@
+import json
+import unittest
+
+import mock
+
+from openprocurement.auction.texas.broadcast import (
+    BroadcastBus,
+    BroadcastStream,
+    Channel,
+    DocumentFeed,
+    document_diff,
+    encode_event,
+)
+from openprocurement.auction.texas.context import DictContext
+from openprocurement.auction.texas.utils import update_auction_document
+
+
+class TestEncodeEvent(unittest.TestCase):
+
+    def test_encode_event(self):
+        frame = encode_event('Tick', {'time': 'now'})
+
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(frame, 'event: Tick\ndata: {"time": "now"}\n\n')
+
+    def test_encode_without_event_name(self):
+        self.assertEqual(encode_event('', [1]), 'data: [1]\n\n')
+
+
+class TestChannel(unittest.TestCase):
+
+    def test_close_discards_pending_frames(self):
+        channel = Channel(size=3)
+        channel.put('first')
+        channel.put('second')
+        channel.close()
+
+        self.assertEqual(list(channel), [])
+        self.assertFalse(channel.put('third'))
+
+    def test_full_channel_is_closed(self):
+        channel = Channel(size=2)
+
+        self.assertTrue(channel.put('first'))
+        self.assertTrue(channel.put('second'))
+        self.assertFalse(channel.put('third'))
+
+        self.assertTrue(channel.closed)
+        self.assertEqual(list(channel), [])
+
+
+class TestBroadcastBus(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = BroadcastBus(buffer_size=2)
+        self.channels = {
+            ('bidder_1', 'client_1'): self.bus.subscribe('bidder_1', 'client_1'),
+            ('bidder_1', 'client_2'): self.bus.subscribe('bidder_1', 'client_2'),
+            ('bidder_2', 'client_3'): self.bus.subscribe('bidder_2', 'client_3'),
+        }
+
+    def read(self, channel):
+        frames = []
+        while channel._queue.qsize():
+            frames.append(channel._queue.get_nowait())
+        return frames
+
+    def test_publish_encodes_once(self):
+        with mock.patch('openprocurement.auction.texas.broadcast.encode_event') as mocked_encode:
+            mocked_encode.return_value = 'frame'
+            self.bus.publish('Tick', {'time': 'now'})
+
+        mocked_encode.assert_called_once_with('Tick', {'time': 'now'})
+        for channel in self.channels.values():
+            frames = self.read(channel)
+            self.assertEqual(frames, ['frame'])
+        self.assertEqual(self.bus.stats, {'frames': 1, 'deliveries': 3, 'dropped': 0})
+
+    def test_publish_to_bidder(self):
+        self.bus.publish('ClientsList', {}, bidder_id='bidder_1')
+
+        self.assertEqual(len(self.read(self.channels[('bidder_1', 'client_1')])), 1)
+        self.assertEqual(len(self.read(self.channels[('bidder_1', 'client_2')])), 1)
+        self.assertEqual(self.read(self.channels[('bidder_2', 'client_3')]), [])
+
+    def test_send_to_client(self):
+        self.assertTrue(self.bus.send('bidder_2', 'client_3', 'KickClient', {'from': 'client_1'}))
+        self.assertFalse(self.bus.send('bidder_2', 'unknown', 'KickClient', {}))
+
+        frames = self.read(self.channels[('bidder_2', 'client_3')])
+        self.assertEqual(frames, [encode_event('KickClient', {'from': 'client_1'})])
+
+    def test_slow_client_is_dropped(self):
+        slow = self.channels[('bidder_2', 'client_3')]
+        for number in range(3):
+            self.bus.publish('Tick', {'time': number})
+            self.read(self.channels[('bidder_1', 'client_1')])
+            self.read(self.channels[('bidder_1', 'client_2')])
+
+        self.assertTrue(slow.closed)
+        self.assertEqual(self.bus.clients('bidder_2'), [])
+        self.assertEqual(self.bus.stats['dropped'], 1)
+        self.assertEqual(self.bus.stats['deliveries'], 8)
+
+    def test_resubscribe_closes_previous_channel(self):
+        previous = self.channels[('bidder_1', 'client_1')]
+
+        channel = self.bus.subscribe('bidder_1', 'client_1')
+
+        self.assertTrue(previous.closed)
+        self.assertFalse(channel.closed)
+        # Stale stream does not unsubscribe the new channel
+        self.bus.unsubscribe('bidder_1', 'client_1', previous)
+        self.assertIn('client_1', self.bus.clients('bidder_1'))
+
+
+class TestBroadcastStream(unittest.TestCase):
+
+    def test_stream(self):
+        bus = BroadcastBus()
+        channel = bus.subscribe('bidder', 'client')
+        stream = BroadcastStream(bus, 'bidder', 'client', channel)
+        bus.publish('Tick', {'time': 'now'})
+        bus.unsubscribe('bidder', 'client')
+
+        frames = list(stream)
+
+        self.assertEqual(frames, ['retry: 2000\n\n'])
+        self.assertEqual(bus.clients(), [])
+
+    def test_stream_ends_on_close(self):
+        bus = BroadcastBus()
+        channel = bus.subscribe('bidder', 'client')
+        stream = BroadcastStream(bus, 'bidder', 'client', channel)
+        frames = iter(stream)
+        self.assertEqual(next(frames), 'retry: 2000\n\n')
+        bus.publish('Tick', {'time': 'now'})
+
+        self.assertEqual(json.loads(next(frames).split('data: ')[1]), {'time': 'now'})
+        stream.close()
+        self.assertEqual(list(frames), [])
+        self.assertEqual(bus.clients(), [])
+
+    def test_close_removes_client(self):
+        bus = BroadcastBus()
+        clients = {'client': {'ip': '1'}, 'other': {'ip': '2'}}
+        channel = bus.subscribe('bidder', 'client')
+        other = bus.subscribe('bidder', 'other')
+        stream = BroadcastStream(bus, 'bidder', 'client', channel, clients=clients)
+
+        stream.close()
+        stream.close()
+
+        self.assertEqual(clients, {'other': {'ip': '2'}})
+        frames = list(other._queue.queue)
+        self.assertEqual(len(frames), 1)
+        self.assertIn('event: ClientsList', frames[0])
+
+    def test_close_of_stale_stream_keeps_reconnected_client(self):
+        bus = BroadcastBus()
+        clients = {'client': {'ip': '1'}}
+        channel = bus.subscribe('bidder', 'client')
+        stream = BroadcastStream(bus, 'bidder', 'client', channel, clients=clients)
+        current = bus.subscribe('bidder', 'client')
+
+        self.assertEqual(list(stream), ['retry: 2000\n\n'])
+
+        self.assertEqual(clients, {'client': {'ip': '1'}})
+        self.assertEqual(current._queue.qsize(), 0)
+
+
+class TestDocumentDiff(unittest.TestCase):
+
+    def test_new_stage_and_current_stage(self):
+        old = {'current_stage': 0, 'stages': [{'type': 'pause'}], 'results': []}
+        new = {
+            'current_stage': 1,
+            'stages': [{'type': 'pause'}, {'type': 'english', 'amount': 100}],
+            'results': [{'bidder_id': 'a', 'amount': 100}]
+        }
+
+        patch = sorted(document_diff(old, new), key=lambda operation: operation['path'])
+
+        self.assertEqual(patch, [
+            {'op': 'replace', 'path': '/current_stage', 'value': 1},
+            {'op': 'add', 'path': '/results/0', 'value': {'bidder_id': 'a', 'amount': 100}},
+            {'op': 'add', 'path': '/stages/1', 'value': {'type': 'english', 'amount': 100}},
+        ])
+
+    def test_changed_list_item_is_replaced(self):
+        old = {'results': [{'bidder_id': 'a', 'amount': 100}, {'bidder_id': 'b', 'amount': 90}]}
+        new = {'results': [{'bidder_id': 'b', 'amount': 150}, {'bidder_id': 'a', 'amount': 100}]}
+
+        self.assertEqual(document_diff(old, new), [
+            {'op': 'replace', 'path': '/results/0', 'value': {'bidder_id': 'b', 'amount': 150}},
+            {'op': 'replace', 'path': '/results/1', 'value': {'bidder_id': 'a', 'amount': 100}},
+        ])
+
+    def test_removed_keys_and_items(self):
+        old = {'a/b': 1, 'stages': [1, 2, 3]}
+        new = {'stages': [1]}
+
+        self.assertEqual(document_diff(old, new), [
+            {'op': 'remove', 'path': '/a~1b'},
+            {'op': 'remove', 'path': '/stages/2'},
+            {'op': 'remove', 'path': '/stages/1'},
+        ])
+
+    def test_same_document(self):
+        self.assertEqual(document_diff({'stages': [{'a': 1}]}, {'stages': [{'a': 1}]}), [])
+        stage = {'a': 1}
+        self.assertEqual(document_diff([stage], [stage]), [])
+
+
+class TestDocumentFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = BroadcastBus()
+        self.channel = self.bus.subscribe('bidder', 'client')
+        self.feed = DocumentFeed(self.bus, {'current_stage': 0}, history_size=2)
+
+    def read(self):
+        frames = []
+        while self.channel._queue.qsize():
+            frames.append(self.channel._queue.get_nowait())
+        return frames
+
+    def test_publish_delta(self):
+        document = {'current_stage': 1}
+
+        delta = self.feed.publish(document)
+        document['current_stage'] = 2
+
+        self.assertEqual(delta, {'seq': 1, 'patch': [{'op': 'replace', 'path': '/current_stage', 'value': 1}]})
+        self.assertEqual(self.read(), [encode_event('DocumentDelta', delta)])
+        self.assertIsNone(self.feed.publish({'current_stage': 1}))
+        self.assertEqual(self.feed.seq, 1)
+
+    def test_published_document_shares_unchanged_nodes(self):
+        stages = [{'type': 'pause'}, {'type': 'english', 'amount': 100}]
+        self.feed.publish({'current_stage': 0, 'stages': stages})
+        before = self.feed._document
+
+        delta = self.feed.publish({'current_stage': 2, 'stages': stages + [{'type': 'pause'}]})
+
+        self.assertEqual(sorted(delta['patch'], key=lambda operation: operation['path']), [
+            {'op': 'replace', 'path': '/current_stage', 'value': 2},
+            {'op': 'add', 'path': '/stages/2', 'value': {'type': 'pause'}},
+        ])
+        self.assertIs(self.feed._document['stages'][1], before['stages'][1])
+
+    def test_resume_sends_missed_deltas(self):
+        for stage in range(1, 4):
+            self.feed.publish({'current_stage': stage})
+        frames = self.read()
+
+        self.feed.resume('bidder', 'client', 2)
+
+        self.assertEqual(self.read(), frames[2:])
+
+    def test_resume_with_up_to_date_client(self):
+        self.feed.publish({'current_stage': 1})
+        self.read()
+
+        self.feed.resume('bidder', 'client', 1)
+
+        self.assertEqual(self.read(), [])
+
+    def test_resume_sends_snapshot_for_old_seq(self):
+        for stage in range(1, 4):
+            self.feed.publish({'current_stage': stage})
+        self.read()
+
+        for seq in (0, 10):
+            self.feed.resume('bidder', 'client', seq)
+
+            self.assertEqual(
+                self.read(),
+                [encode_event('DocumentSnapshot', {'seq': 3, 'document': {'current_stage': 3}})]
+            )
+
+    def test_update_auction_document_publishes_delta(self):
+        context = DictContext({})
+        context['auction_doc_id'] = '1' * 32
+        context['auction_document'] = {'current_stage': 0}
+        context['document_feed'] = self.feed
+        database = mock.MagicMock()
+
+        with update_auction_document(context, database) as auction_document:
+            auction_document['current_stage'] = 1
+
+        # Delta is built after committer yields
+        self.assertEqual(self.feed.seq, 0)
+        self.feed._publisher.join()
+        self.assertEqual(self.feed.seq, 1)
+        self.assertEqual(len(self.read()), 1)
+
+    def test_scheduled_documents_are_published_as_one_delta(self):
+        self.feed.schedule({'current_stage': 1})
+        publisher = self.feed._publisher
+        self.feed.schedule({'current_stage': 2})
+        self.assertIs(self.feed._publisher, publisher)
+
+        publisher.join()
+
+        self.assertEqual(self.feed.seq, 1)
+        self.assertEqual(self.read(), [encode_event('DocumentDelta', {
+            'seq': 1, 'patch': [{'op': 'replace', 'path': '/current_stage', 'value': 2}]
+        })])
+        self.assertIsNone(self.feed.flush())
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestEncodeEvent))
+    tests.addTest(unittest.makeSuite(TestChannel))
+    tests.addTest(unittest.makeSuite(TestBroadcastBus))
+    tests.addTest(unittest.makeSuite(TestBroadcastStream))
+    tests.addTest(unittest.makeSuite(TestDocumentDiff))
+    tests.addTest(unittest.makeSuite(TestDocumentFeed))
+    return tests
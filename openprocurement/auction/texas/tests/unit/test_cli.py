@@ -1,10 +1,18 @@
+import json
+import os
+import subprocess
+import sys
 import unittest
+import gevent
 import munch
 import mock
 
 from copy import deepcopy
+from StringIO import StringIO
 
-from openprocurement.auction.texas.cli import main, register_utilities
+from openprocurement.auction.texas.cli import (
+    main, register_utilities, parse_auction_ids, plan_auctions, prepare_resources, StartupReport
+)
 from openprocurement.auction.texas.context import IContext
 from openprocurement.auction.texas.constants import DEADLINE_HOUR
 
@@ -33,7 +41,7 @@ class RegisterUtilitiesTest(unittest.TestCase):
         self.mocked_prepare_context.return_value = self.context
 
         self.patch_prepare_job_service = mock.patch(
-            'openprocurement.auction.texas.cli.prepare_job_service'
+            'openprocurement.auction.texas.scheduler.prepare_job_service'
         )
         self.mocked_prepare_job_service = self.patch_prepare_job_service.start()
         self.mocked_job_service = mock.MagicMock()
@@ -105,6 +113,28 @@ class RegisterUtilitiesTest(unittest.TestCase):
         self.assertEqual(self.context['worker_defaults'], resulted_worker_config)
         self.assertEqual(self.context['server_actions'], self.bounded_semaphore)
 
+    def test_register_utilities_in_registry(self):
+        worker_config = {
+            'context': {'context': 'config'},
+            'datasource': {'datasource': 'config'},
+            'database': {'database': 'config'},
+        }
+        args = munch.Munch({})
+        args.auction_doc_id = '1' * 32
+        args.standalone = False
+        registry = mock.MagicMock()
+        registry.queryUtility.return_value = self.context
+
+        with mock.patch('openprocurement.auction.texas.scheduler.SCHEDULER') as mocked_scheduler:
+            register_utilities(worker_config, args, registry=registry)
+
+        self.mocked_prepare_job_service.assert_called_once_with(
+            registry, mocked_scheduler, 'auction:{}'.format(args.auction_doc_id)
+        )
+        self.assertEqual(registry.registerUtility.call_count, 4)
+        self.assertEqual(self.mocked_gsm.registerUtility.call_count, 0)
+        self.assertEqual(self.context['server_actions'], self.bounded_semaphore)
+
     def test_register_utilities_standalone(self):
         worker_config = {
             'context': {'context': 'config'},
@@ -235,12 +265,57 @@ class RegisterUtilitiesTest(unittest.TestCase):
         self.assertEqual(self.context['worker_defaults'], resulted_worker_config)
         self.assertEqual(self.context['server_actions'], self.bounded_semaphore)
 
+    def test_shared_resources(self):
+        worker_config = {
+            'context': {'context': 'config'},
+            'datasource': {'datasource': 'config'},
+            'database': {'database': 'config'},
+        }
+        resources = {}
+        for auction_doc_id in ('1' * 32, '2' * 32):
+            args = munch.Munch({'auction_doc_id': auction_doc_id, 'standalone': False})
+            register_utilities(deepcopy(worker_config), args, registry=mock.MagicMock(), resources=resources)
+
+        self.assertEqual(self.mocked_prepare_database.call_count, 1)
+        self.assertIs(resources['database'], self.mocked_db)
+        self.assertEqual(self.mocked_db.get_auction_document.call_count, 2)
+        self.assertEqual(self.mocked_prepare_datasource.call_count, 2)
+        self.mocked_prepare_datasource.assert_called_with(
+            {'datasource': 'config', 'auction_id': '2' * 32}, resources
+        )
+
+    @mock.patch('openprocurement.auction.texas.cli.prepare_datasource_resources')
+    def test_prepare_resources(self, mocked_prepare_datasource_resources):
+        worker_config = {'datasource': {'datasource': 'config'}, 'database': {'database': 'config'}}
+
+        resources = prepare_resources(worker_config, munch.Munch({'standalone': False}))
+
+        self.mocked_prepare_database.assert_called_once_with({'database': 'config'})
+        self.assertEqual(resources, {'database': self.mocked_db})
+        mocked_prepare_datasource_resources.assert_called_once_with({'datasource': 'config'}, resources)
+
+        # Unavailable services are checked again by every auction
+        mocked_prepare_datasource_resources.side_effect = Exception("API can't be reached")
+        self.assertEqual(prepare_resources(worker_config, munch.Munch({'standalone': False})),
+                         {'database': self.mocked_db})
+
+        prepare_resources(worker_config, munch.Munch({'standalone': True}))
+        self.assertEqual(mocked_prepare_datasource_resources.call_count, 2)
+
+    def test_register_utilities_without_job_service(self):
+        args = munch.Munch({'auction_doc_id': '1' * 32, 'standalone': False})
+
+        register_utilities({}, args, with_job_service=False)
+
+        self.assertEqual(self.mocked_prepare_job_service.call_count, 0)
+        self.assertEqual(self.mocked_gsm.registerUtility.call_count, 3)
+
 
 class MainTest(unittest.TestCase):
 
     def setUp(self):
         self.patch_gevent_scheduler = mock.patch(
-            'openprocurement.auction.texas.cli.SCHEDULER'
+            'openprocurement.auction.texas.scheduler.SCHEDULER'
         )
         self.mocked_SCHEDULER = self.patch_gevent_scheduler.start()
 
@@ -335,7 +410,7 @@ class MainTest(unittest.TestCase):
         self.mocked_logging.config.dictConfig.assert_called_with(resulted_yaml)
 
         self.assertEqual(self.mocked_register_utilities.call_count, 1)
-        self.mocked_register_utilities.assert_called_with(resulted_yaml, args)
+        self.mocked_register_utilities.assert_called_with(resulted_yaml, args, with_job_service=False)
 
         self.assertEqual(self.mocked_auction_class.call_count, 1)
         self.mocked_auction_class.assert_called_with(
@@ -401,7 +476,7 @@ class MainTest(unittest.TestCase):
         self.mocked_logging.config.dictConfig.assert_called_with(resulted_yaml)
 
         self.assertEqual(self.mocked_register_utilities.call_count, 1)
-        self.mocked_register_utilities.assert_called_with(resulted_yaml, args)
+        self.mocked_register_utilities.assert_called_with(resulted_yaml, args, with_job_service=False)
 
         self.assertEqual(self.mocked_auction_class.call_count, 1)
         self.mocked_auction_class.assert_called_with(
@@ -440,7 +515,7 @@ class MainTest(unittest.TestCase):
         self.mocked_logging.config.dictConfig.assert_called_with(resulted_yaml)
 
         self.assertEqual(self.mocked_register_utilities.call_count, 1)
-        self.mocked_register_utilities.assert_called_with(resulted_yaml, args)
+        self.mocked_register_utilities.assert_called_with(resulted_yaml, args, with_job_service=False)
 
         self.assertEqual(self.mocked_auction_class.call_count, 1)
         self.mocked_auction_class.assert_called_with(
@@ -479,7 +554,7 @@ class MainTest(unittest.TestCase):
         self.mocked_logging.config.dictConfig.assert_called_with(resulted_yaml)
 
         self.assertEqual(self.mocked_register_utilities.call_count, 1)
-        self.mocked_register_utilities.assert_called_with(resulted_yaml, args)
+        self.mocked_register_utilities.assert_called_with(resulted_yaml, args, with_job_service=False)
 
         self.assertEqual(self.mocked_auction_class.call_count, 1)
         self.mocked_auction_class.assert_called_with(
@@ -519,7 +594,7 @@ class MainTest(unittest.TestCase):
         self.mocked_logging.config.dictConfig.assert_called_with(resulted_yaml)
 
         self.assertEqual(self.mocked_register_utilities.call_count, 1)
-        self.mocked_register_utilities.assert_called_with(resulted_yaml, args)
+        self.mocked_register_utilities.assert_called_with(resulted_yaml, args, with_job_service=False)
 
         self.assertEqual(self.mocked_auction_class.call_count, 1)
         self.mocked_auction_class.assert_called_with(
@@ -552,6 +627,7 @@ class MainTest(unittest.TestCase):
         self.mocked_parser_obj.parse_args.return_value = args
 
         main()
+        self.assertIs(self.mocked_register_utilities.call_args[1]['with_job_service'], True)
         self.assertEqual(self.mocked_SCHEDULER.start.call_count, 1)
         self.mocked_SCHEDULER.start.assert_called_with()
 
@@ -577,9 +653,27 @@ class MainTest(unittest.TestCase):
 
         main()
 
+        self.assertIs(self.mocked_register_utilities.call_args[1]['with_job_service'], False)
         self.assertEqual(self.auction_instance.prepare_auction_document.call_count, 1)
         self.auction_instance.prepare_auction_document.assert_called_with()
 
+    def test_write_behind_only_for_waiting_commands(self):
+        for cmd, write_behind in (('run', True), ('planning', False), ('cancel', False)):
+            self.yaml_output['database'] = {'type': 'couchdb', 'write_behind': {'journal_dir': '/tmp'}}
+            args = munch.Munch({
+                'cmd': cmd,
+                'auction_worker_config': 'path/to/config',
+                'with_api_version': None,
+                'auction_doc_id': '1' * 32,
+                'debug': False
+            })
+            self.mocked_parser_obj.parse_args.return_value = args
+
+            main()
+
+            database_config = self.mocked_register_utilities.call_args[0][0]['database']
+            self.assertEqual('write_behind' in database_config, write_behind)
+
     def test_cmd_announce(self):
         args = munch.Munch({
             'cmd': 'announce',
@@ -655,3 +749,255 @@ class MainTest(unittest.TestCase):
 
         self.assertEqual(self.auction_instance.post_auction_protocol.call_count, 1)
         self.auction_instance.post_auction_protocol.assert_called_with(args.doc_id)
+
+    def test_cmd_host(self):
+        args = munch.Munch({
+            'cmd': 'host',
+            'auction_worker_config': 'path/to/config',
+            'with_api_version': None,
+            'auction_doc_id': '{},{}'.format('1' * 32, '2' * 32),
+            'debug': False
+        })
+        self.mocked_parser_obj.parse_args.return_value = args
+        self.mocked_os.path.isfile.side_effect = [True, False]
+        failed_auction = mock.MagicMock()
+        failed_auction.schedule_auction.side_effect = SystemExit(1)
+        self.mocked_auction_class.side_effect = [self.auction_instance, failed_auction]
+
+        with mock.patch('openprocurement.auction.texas.server.run_router_server') as mocked_run_router_server, \
+                mock.patch('openprocurement.auction.texas.cli.AuctionsRouter') as mocked_router_class:
+            main()
+
+        self.assertNotIn('TENDER_ID', self.yaml_output['handlers']['journal'])
+        mocked_run_router_server.assert_called_once_with(
+            mocked_router_class.return_value, self.yaml_output, mock.ANY
+        )
+
+        self.assertEqual(self.mocked_register_utilities.call_count, 2)
+        registries = []
+        for call, auction_doc_id in zip(self.mocked_register_utilities.call_args_list, ('1' * 32, '2' * 32)):
+            self.assertEqual(call[0][1].auction_doc_id, auction_doc_id)
+            registries.append(call[1]['registry'])
+        self.assertIsNot(registries[0], registries[1])
+
+        self.assertEqual(self.mocked_auction_class.call_count, 2)
+        self.assertEqual(self.mocked_auction_class.call_args_list[0][1]['registry'], registries[0])
+        self.assertEqual(
+            self.mocked_auction_class.call_args_list[0][1]['router'], mocked_router_class.return_value
+        )
+
+        # Failed auction is released and not awaited
+        self.assertEqual(failed_auction.job_service.remove_jobs.call_count, 1)
+        self.assertEqual(failed_auction.wait_to_end.call_count, 0)
+
+        self.assertEqual(self.auction_instance.wait_to_end.call_count, 1)
+        self.assertEqual(self.auction_instance.job_service.remove_jobs.call_count, 1)
+
+        self.assertEqual(self.mocked_SCHEDULER.start.call_count, 1)
+        self.assertEqual(self.mocked_SCHEDULER.shutdown.call_count, 1)
+        self.assertEqual(mocked_run_router_server.return_value.stop.call_count, 1)
+
+    def test_cmd_batch_planning(self):
+        args = munch.Munch({
+            'cmd': 'batch_planning',
+            'auction_worker_config': 'path/to/config',
+            'with_api_version': None,
+            'auction_doc_id': '{},{}'.format('1' * 32, '2' * 32),
+            'debug': False,
+            'standalone': False,
+            'concurrency': 2
+        })
+        self.mocked_parser_obj.parse_args.return_value = args
+        self.mocked_os.path.isfile.side_effect = [True, False]
+        failed_auction = mock.MagicMock()
+        failed_auction.prepare_auction_document.side_effect = KeyError('data')
+        self.mocked_auction_class.side_effect = [self.auction_instance, failed_auction]
+
+        with mock.patch('openprocurement.auction.texas.cli.sys') as mocked_sys, \
+                mock.patch('openprocurement.auction.texas.cli.prepare_resources') as mocked_prepare_resources:
+            mocked_prepare_resources.return_value = {}
+            main()
+
+        self.assertNotIn('TENDER_ID', self.yaml_output['handlers']['journal'])
+        mocked_sys.exit.assert_called_once_with(1)
+
+        # Auctions are planned with own registries and shared resources
+        self.assertEqual(self.mocked_register_utilities.call_count, 2)
+        calls = self.mocked_register_utilities.call_args_list
+        self.assertEqual([call[0][1].auction_doc_id for call in calls], ['1' * 32, '2' * 32])
+        self.assertIsNot(calls[0][1]['registry'], calls[1][1]['registry'])
+        self.assertIs(calls[0][1]['resources'], mocked_prepare_resources.return_value)
+        self.assertIs(calls[1][1]['resources'], mocked_prepare_resources.return_value)
+        self.assertEqual(mocked_prepare_resources.call_count, 1)
+        self.assertEqual(self.auction_instance.prepare_auction_document.call_count, 1)
+
+        results = [json.loads(call[0][0]) for call in mocked_sys.stdout.write.call_args_list]
+        self.assertEqual([(r['auction_id'], r['status']) for r in results], [
+            ('1' * 32, 'ok'), ('2' * 32, 'failed')
+        ])
+        self.assertEqual(results[1]['error'], repr(KeyError('data')))
+
+    def test_cmd_serve(self):
+        args = munch.Munch({
+            'cmd': 'serve',
+            'auction_worker_config': 'path/to/config',
+            'with_api_version': None,
+            'auction_doc_id': '/run/auction_texas.sock',
+            'debug': False,
+            'doc_id': False,
+            'standalone': False,
+            'concurrency': 5
+        })
+        self.mocked_parser_obj.parse_args.return_value = args
+        self.auction_instance.post_auction_protocol.return_value = 'protocol_id'
+        failed_auction = mock.MagicMock()
+        failed_auction.cancel_auction.side_effect = KeyError('data')
+        self.mocked_auction_class.side_effect = [self.auction_instance, failed_auction]
+
+        with mock.patch('openprocurement.auction.texas.daemon.WorkerDaemon') as mocked_daemon_class, \
+                mock.patch('openprocurement.auction.texas.cli.signal_handler') as mocked_signal_handler, \
+                mock.patch('openprocurement.auction.texas.cli.prepare_resources') as mocked_prepare_resources:
+            mocked_prepare_resources.return_value = {}
+            main()
+
+        self.assertNotIn('TENDER_ID', self.yaml_output['handlers']['journal'])
+        path, execute, commands = mocked_daemon_class.call_args[0]
+        self.assertEqual(path, args.auction_doc_id)
+        self.assertEqual(mocked_daemon_class.call_args[1], {'concurrency': 5})
+        self.assertEqual(sorted(commands), [
+            'announce', 'cancel', 'planning', 'post_auction_protocol', 'post_results', 'reschedule'
+        ])
+        daemon = mocked_daemon_class.return_value
+        self.assertEqual(daemon.serve_forever.call_count, 1)
+        self.assertEqual(mocked_signal_handler.call_count, 2)
+        mocked_signal_handler.assert_called_with(mock.ANY, daemon.stop)
+
+        result = execute({'cmd': 'post_auction_protocol', 'auction_id': '1' * 32, 'doc_id': 'doc_id'})
+        self.auction_instance.post_auction_protocol.assert_called_once_with('doc_id')
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(result['result'], 'protocol_id')
+
+        result = execute({'cmd': 'cancel', 'auction_id': '2' * 32})
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(result['error'], repr(KeyError('data')))
+
+        # Commands share resources and do not prepare job service
+        calls = self.mocked_register_utilities.call_args_list
+        self.assertEqual([call[0][1].auction_doc_id for call in calls], ['1' * 32, '2' * 32])
+        self.assertIs(calls[0][1]['resources'], mocked_prepare_resources.return_value)
+        self.assertIs(calls[1][1]['resources'], mocked_prepare_resources.return_value)
+        self.assertIs(calls[0][1]['with_job_service'], False)
+
+
+class PlanAuctionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.patch_plan_auction = mock.patch('openprocurement.auction.texas.cli.plan_auction')
+        self.mocked_plan_auction = self.patch_plan_auction.start()
+        self.running = 0
+        self.max_running = 0
+        self.mocked_plan_auction.side_effect = self.plan_auction
+        self.patch_prepare_resources = mock.patch('openprocurement.auction.texas.cli.prepare_resources')
+        self.mocked_prepare_resources = self.patch_prepare_resources.start()
+        self.mocked_prepare_resources.return_value = {}
+        self.output = StringIO()
+
+    def tearDown(self):
+        self.patch_plan_auction.stop()
+        self.patch_prepare_resources.stop()
+
+    def plan_auction(self, auction_doc_id, worker_defaults, args, resources):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        gevent.sleep(0.01)
+        self.running -= 1
+        resources.setdefault('planned', []).append(auction_doc_id)
+        return {'auction_id': auction_doc_id, 'status': 'ok'}
+
+    def test_bounded_concurrency(self):
+        auction_ids = [str(index) * 32 for index in range(1, 6)]
+        args = munch.Munch({'auction_doc_id': ','.join(auction_ids), 'concurrency': 2})
+
+        failed = plan_auctions({}, args, self.output)
+
+        self.assertEqual(failed, 0)
+        self.assertEqual(self.max_running, 2)
+        self.assertEqual(
+            sorted(json.loads(line)['auction_id'] for line in self.output.getvalue().splitlines()),
+            auction_ids
+        )
+        resources = self.mocked_plan_auction.call_args[0][3]
+        self.assertEqual(sorted(resources['planned']), auction_ids)
+
+
+class StartupReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.patch_logger = mock.patch('openprocurement.auction.texas.cli.LOGGER')
+        self.mocked_logger = self.patch_logger.start()
+        self.patch_time = mock.patch('openprocurement.auction.texas.cli.time')
+        self.mocked_time = self.patch_time.start()
+
+    def tearDown(self):
+        self.patch_logger.stop()
+        self.patch_time.stop()
+
+    def test_phases(self):
+        self.mocked_time.time.side_effect = [100.25, 100.5]
+        report = StartupReport(100.0)
+
+        report.mark('imports')
+        report.mark('config')
+        report.log('planning')
+
+        self.assertEqual(report.phases, [('imports', 0.25), ('config', 0.25)])
+        self.assertEqual(report.total, 0.5)
+        self.assertEqual(self.mocked_logger.warning.call_count, 0)
+        message = self.mocked_logger.info.call_args[0][0]
+        self.assertEqual(message, 'Command planning started in 0.500s (imports 0.250s, config 0.250s)')
+        extra = self.mocked_logger.info.call_args[1]['extra']
+        self.assertEqual(extra['JOURNAL_COMMAND'], 'planning')
+        self.assertEqual(extra['JOURNAL_STARTUP_DURATION'], '0.500000')
+        self.assertEqual(extra['JOURNAL_STARTUP_IMPORTS'], '0.250000')
+
+    def test_budget_exceeded(self):
+        self.mocked_time.time.return_value = 102.0
+        report = StartupReport(100.0, budget=1.5)
+
+        report.mark('imports')
+        report.log('cancel')
+
+        self.assertEqual(self.mocked_logger.info.call_count, 0)
+        self.assertEqual(self.mocked_logger.warning.call_count, 1)
+
+
+class DeferredImportsTest(unittest.TestCase):
+
+    def test_cli_does_not_import_server_and_scheduler(self):
+        modules = (
+            'flask', 'wtforms_json', 'apscheduler',
+            'openprocurement.auction.texas.server', 'openprocurement.auction.texas.scheduler',
+        )
+        code = (
+            'import sys; import openprocurement.auction.texas.cli; '
+            'print([name for name in {!r} if name in sys.modules])'.format(modules)
+        )
+        output = subprocess.check_output([sys.executable, '-c', code], stderr=open(os.devnull, 'w'))
+        self.assertEqual(output.strip(), '[]')
+
+
+class ParseAuctionIdsTest(unittest.TestCase):
+
+    def test_comma_separated_ids(self):
+        self.assertEqual(
+            parse_auction_ids('{}, {},'.format('1' * 32, '2' * 32)),
+            ['1' * 32, '2' * 32]
+        )
+
+    def test_ids_from_stdin(self):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, '{}\n{}\n'.format('1' * 32, '2' * 32))
+        os.close(write_fd)
+        with mock.patch('openprocurement.auction.texas.cli.sys') as mocked_sys, os.fdopen(read_fd) as stdin:
+            mocked_sys.stdin = stdin
+            self.assertEqual(parse_auction_ids('-'), ['1' * 32, '2' * 32])
@@ -0,0 +1,108 @@
+import unittest
+from datetime import datetime, timedelta
+
+import mock
+from apscheduler.triggers.date import DateTrigger
+
+from openprocurement.auction.worker_core.constants import TIMEZONE
+from openprocurement.auction.texas import clock
+from openprocurement.auction.texas.clock import (
+    VirtualClock,
+    WallClock,
+    prepare_clock,
+)
+from openprocurement.auction.texas.scheduler import TimeWarpScheduler
+
+
+class TestVirtualClock(unittest.TestCase):
+
+    def setUp(self):
+        self.start = TIMEZONE.localize(datetime(2018, 1, 1, 10, 0))
+
+        self.patch_time = mock.patch('openprocurement.auction.texas.clock.time')
+        self.mocked_time = self.patch_time.start()
+        self.mocked_time.time.return_value = 1000.0
+
+        self.clock = VirtualClock({'speedup': 60, 'start': self.start.isoformat()})
+
+    def tearDown(self):
+        self.patch_time.stop()
+
+    def test_now(self):
+        self.assertEqual(self.clock.now(), self.start)
+
+        self.mocked_time.time.return_value = 1010.0
+        self.assertEqual(self.clock.now(), self.start + timedelta(minutes=10))
+
+    def test_to_real(self):
+        real = self.clock.to_real(self.start + timedelta(hours=1))
+
+        self.assertEqual(real, datetime.fromtimestamp(1060.0, TIMEZONE))
+
+    def test_round_trip(self):
+        moment = self.start + timedelta(minutes=42, seconds=30)
+
+        self.assertEqual(self.clock.to_virtual(self.clock.to_real(moment)), moment)
+
+    def test_invalid_speedup(self):
+        with self.assertRaises(ValueError):
+            VirtualClock({'speedup': 0})
+
+
+class TestPrepareClock(unittest.TestCase):
+
+    def test_default_clock(self):
+        self.assertIsInstance(prepare_clock({}), WallClock)
+
+    def test_virtual_clock(self):
+        virtual_clock = prepare_clock({'type': 'virtual', 'speedup': 10})
+
+        self.assertIsInstance(virtual_clock, VirtualClock)
+        self.assertEqual(virtual_clock.speedup, 10)
+
+    def test_unknown_clock(self):
+        with self.assertRaises(AttributeError):
+            prepare_clock({'type': 'sundial'})
+
+
+class TestTimeWarpScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.virtual_clock = mock.MagicMock()
+        self.real_date = TIMEZONE.localize(datetime(2018, 1, 1, 10, 1))
+        self.virtual_clock.to_real.return_value = self.real_date
+        clock.set_clock(self.virtual_clock)
+
+        self.scheduler = TimeWarpScheduler()
+        self.scheduler.timezone = TIMEZONE
+
+    def tearDown(self):
+        clock.set_clock(WallClock())
+
+    def test_add_job(self):
+        virtual_date = TIMEZONE.localize(datetime(2018, 1, 1, 11, 0))
+
+        job = self.scheduler.add_job(lambda: None, 'date', run_date=virtual_date, id='job')
+
+        self.virtual_clock.to_real.assert_called_once_with(virtual_date)
+        self.assertIsInstance(job.trigger, DateTrigger)
+        self.assertEqual(job.trigger.run_date, self.real_date)
+
+    def test_add_job_without_run_date(self):
+        self.scheduler.add_job(lambda: None, 'interval', seconds=1, id='job')
+
+        self.assertEqual(self.virtual_clock.to_real.call_count, 0)
+
+    def test_module_now(self):
+        self.virtual_clock.now.return_value = self.real_date
+
+        self.assertEqual(clock.now(), self.real_date)
+        self.virtual_clock.now.assert_called_once_with(TIMEZONE)
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestVirtualClock))
+    tests.addTest(unittest.makeSuite(TestPrepareClock))
+    tests.addTest(unittest.makeSuite(TestTimeWarpScheduler))
+    return tests
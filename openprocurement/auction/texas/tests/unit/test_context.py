@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import unittest
+from copy import deepcopy
+
+import yaml
+
+from openprocurement.auction.texas.context import (
+    ContextException,
+    DictContext,
+    SnapshotContext,
+)
+from openprocurement.auction.texas.snapshot import FrozenDict, FrozenList
+from openprocurement.auction.texas.router import AuctionsRouter
+
+
+class TestSnapshotContext(unittest.TestCase):
+
+    def setUp(self):
+        self.context = SnapshotContext({})
+        self.auction_document = {
+            'current_stage': 0,
+            'stages': [
+                {'type': 'pause', 'start': 'start'},
+                {'type': 'english', 'amount': 100, 'time': ''},
+            ],
+            'results': [],
+        }
+        self.context['auction_document'] = self.auction_document
+
+    def test_stored_value_is_frozen(self):
+        stored = self.context._mapping['auction_document']
+
+        self.assertIsInstance(stored, FrozenDict)
+        self.assertIsInstance(stored['stages'], FrozenList)
+        self.assertEqual(stored, self.auction_document)
+        with self.assertRaises(TypeError):
+            stored['current_stage'] = 1
+        with self.assertRaises(TypeError):
+            stored['stages'].append({})
+
+    def test_setting_copies_value(self):
+        self.auction_document['stages'][1]['amount'] = 200
+
+        self.assertEqual(self.context['auction_document']['stages'][1]['amount'], 100)
+
+    def test_getting_isolated_copy(self):
+        auction_document = self.context['auction_document']
+        self.assertIs(type(auction_document), dict)
+        self.assertIs(type(auction_document['stages'][0]), dict)
+
+        auction_document['current_stage'] = 1
+        auction_document['stages'][1].update({'amount': 200, 'bidder_id': 'bidder'})
+        auction_document['stages'].append({'type': 'pause'})
+        auction_document['results'].append({'bidder_id': 'bidder'})
+
+        self.assertEqual(self.context['auction_document'], self.auction_document)
+        self.assertEqual(self.context.get('auction_document'), self.auction_document)
+
+    def test_storing_changed_copy(self):
+        auction_document = self.context['auction_document']
+        auction_document['stages'][1]['amount'] = 200
+        self.context['auction_document'] = auction_document
+
+        stored = self.context._mapping['auction_document']
+        self.assertEqual(stored['stages'][1]['amount'], 200)
+        self.assertIsInstance(stored['stages'][1], FrozenDict)
+
+        # Changes made after storing are not visible to context
+        auction_document['stages'][1]['amount'] = 300
+        self.assertEqual(self.context['auction_document']['stages'][1]['amount'], 200)
+
+    def test_structural_sharing(self):
+        before = self.context._mapping['auction_document']
+
+        auction_document = self.context['auction_document']
+        auction_document['stages'][1]['amount'] = 200
+        self.context['auction_document'] = auction_document
+
+        after = self.context._mapping['auction_document']
+        self.assertIsNot(after, before)
+        self.assertIsNot(after['stages'], before['stages'])
+        self.assertIs(after['stages'][0], before['stages'][0])
+        self.assertIs(after['results'], before['results'])
+
+    def test_storing_unchanged_copy_reuses_snapshot(self):
+        before = self.context._mapping['auction_document']
+
+        self.context['auction_document'] = self.context['auction_document']
+
+        self.assertIs(self.context._mapping['auction_document'], before)
+
+    def test_snapshot_is_not_copied(self):
+        snapshot = self.context.snapshot('auction_document')
+
+        self.assertIs(snapshot, self.context._mapping['auction_document'])
+        self.assertEqual(snapshot, self.auction_document)
+        with self.assertRaises(TypeError):
+            snapshot['stages'][1]['amount'] = 200
+        self.assertEqual(self.context.snapshot('bidders_data', 'default'), 'default')
+
+        dict_context = DictContext({})
+        dict_context['auction_document'] = self.auction_document
+        self.assertIsNot(dict_context.snapshot('auction_document'), self.auction_document)
+        self.assertEqual(dict_context.snapshot('auction_document'), self.auction_document)
+
+    def test_tuples(self):
+        self.context['bids_mapping'] = {'pair': ({'amount': 100}, [1])}
+
+        snapshot = self.context.snapshot('bids_mapping')['pair']
+        self.assertIsInstance(snapshot[0], FrozenDict)
+        self.assertIsInstance(snapshot[1], FrozenList)
+
+        pair = self.context['bids_mapping']['pair']
+        self.assertIs(type(pair), tuple)
+        self.assertIs(type(pair[0]), dict)
+        self.assertIs(type(pair[1]), list)
+        pair[0]['amount'] = 200
+        self.assertEqual(self.context['bids_mapping']['pair'], ({'amount': 100}, [1]))
+
+    def test_iteration_returns_mutable_items(self):
+        auction_document = self.context['auction_document']
+        for stage in auction_document['stages']:
+            stage['checked'] = True
+        for key, value in auction_document.items():
+            if key == 'stages':
+                value.append({'type': 'announcement'})
+
+        self.assertEqual(len(auction_document['stages']), 3)
+        self.assertTrue(all(stage.get('checked') for stage in auction_document['stages'][:2]))
+        self.assertEqual(self.context['auction_document'], self.auction_document)
+
+    def test_copies_of_returned_value_are_mutable(self):
+        auction_document = self.context['auction_document']
+
+        dict(auction_document)['stages'].append({'type': 'pause'})
+        updated = {}
+        updated.update(auction_document)
+        updated['results'].append({'bidder_id': 'bidder'})
+        stages = dict(**auction_document)['stages'] + [{'type': 'announcement'}]
+        stages[0]['type'] = 'announcement'
+
+        self.assertEqual(len(auction_document['stages']), 3)
+        self.assertEqual(self.context['auction_document'], self.auction_document)
+
+    def test_deepcopy_returns_plain_objects(self):
+        copied = deepcopy(self.context['auction_document'])
+
+        self.assertIs(type(copied), dict)
+        self.assertIs(type(copied['stages']), list)
+        self.assertIs(type(copied['stages'][0]), dict)
+        self.assertEqual(copied, self.auction_document)
+
+    def test_yaml_safe_dump(self):
+        dumped = yaml.safe_dump(self.context['auction_document'])
+
+        self.assertEqual(yaml.safe_load(dumped), self.auction_document)
+
+    def test_sets(self):
+        self.context['bids_mapping'] = {'ids': {'a', 'b'}}
+
+        ids = self.context['bids_mapping']['ids']
+        ids.add('c')
+
+        self.assertEqual(ids, {'a', 'b', 'c'})
+        self.assertEqual(self.context['bids_mapping']['ids'], {'a', 'b'})
+
+    def test_field_validation(self):
+        with self.assertRaises(ContextException):
+            self.context['unknown_field'] = {}
+        with self.assertRaises(ContextException):
+            self.context['auction_document'] = []
+
+    def test_mounted_app_as_server(self):
+        mounted = AuctionsRouter().mount('1' * 32, object())
+
+        self.context['server'] = mounted
+
+        self.assertIs(self.context['server'], mounted)
+        with self.assertRaises(ContextException):
+            self.context['server'] = object()
+
+    def test_bidders_index_is_not_copied(self):
+        bidders_index = frozenset(['a', 'b'])
+
+        self.context['bidders_index'] = bidders_index
+
+        self.assertIs(self.context['bidders_index'], bidders_index)
+        dict_context = DictContext({})
+        dict_context['bidders_index'] = bidders_index
+        self.assertIs(dict_context['bidders_index'], bidders_index)
+        with self.assertRaises(ContextException):
+            self.context['bidders_index'] = set(['a', 'b'])
+
+    def test_get_default(self):
+        self.assertEqual(self.context.get('bidders_data', 'default'), 'default')
+        default = []
+        self.context.get('bidders_data', default).append({})
+        self.assertEqual(default, [])
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestSnapshotContext))
+    return tests
@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import gevent
+from gevent import socket
+
+from openprocurement.auction.texas.daemon import DaemonException, WorkerDaemon, send_command
+
+
+class TestWorkerDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'worker.sock')
+        self.executed = []
+        self.daemon = WorkerDaemon(self.path, self.execute, ['planning', 'cancel'])
+        self.daemon.start()
+
+    def tearDown(self):
+        self.daemon.stop()
+        shutil.rmtree(self.directory)
+
+    def execute(self, request):
+        self.executed.append(('start', request['cmd'], request['auction_id']))
+        gevent.sleep(0.01)
+        self.executed.append(('end', request['cmd'], request['auction_id']))
+        status = 'failed' if request.get('fail') else 'ok'
+        return {'cmd': request['cmd'], 'auction_id': request['auction_id'], 'status': status}
+
+    def test_execute_command(self):
+        result = send_command(self.path, {'cmd': 'planning', 'auction_id': '1' * 32}, timeout=1)
+
+        self.assertEqual(result, {'cmd': 'planning', 'auction_id': '1' * 32, 'status': 'ok'})
+        self.assertEqual(self.daemon.stats, {'requests': 1, 'failed': 0, 'rejected': 0, 'active': 0})
+
+    def test_failed_command(self):
+        result = send_command(self.path, {'cmd': 'cancel', 'auction_id': '1' * 32, 'fail': True}, timeout=1)
+
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(self.daemon.stats['failed'], 1)
+
+    def test_rejected_requests(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.path)
+        connection.sendall('not json\n[]\n{"cmd": "run", "auction_id": "1"}\n{"cmd": "cancel"}\n')
+        stream = connection.makefile('rb')
+        results = [json.loads(stream.readline()) for _ in range(4)]
+        connection.close()
+
+        self.assertEqual([result['status'] for result in results], ['rejected'] * 4)
+        self.assertEqual(results[2]['error'], "Unknown command u'run'")
+        self.assertEqual(results[3]['error'], 'Request has no auction_id')
+        self.assertEqual(self.daemon.stats['rejected'], 4)
+        self.assertEqual(self.executed, [])
+
+    def test_commands_of_auction_are_serialized(self):
+        requests = [
+            {'cmd': 'planning', 'auction_id': '1' * 32},
+            {'cmd': 'cancel', 'auction_id': '1' * 32},
+            {'cmd': 'planning', 'auction_id': '2' * 32},
+        ]
+        greenlets = [gevent.spawn(send_command, self.path, request, 1) for request in requests]
+        gevent.joinall(greenlets, timeout=1)
+
+        self.assertTrue(all(greenlet.successful() for greenlet in greenlets))
+        first_auction = [event for event in self.executed if event[2] == '1' * 32]
+        self.assertEqual([event[0] for event in first_auction], ['start', 'end', 'start', 'end'])
+        # Other auction is not blocked
+        self.assertLess(self.executed.index(('start', 'planning', '2' * 32)),
+                        self.executed.index(('end', 'planning', '1' * 32)))
+
+    def test_socket_of_running_daemon_is_kept(self):
+        other = WorkerDaemon(self.path, self.execute, ['planning'])
+
+        with self.assertRaises(DaemonException):
+            other.start()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_stale_socket_is_replaced(self):
+        self.daemon.stop()
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+
+        self.daemon.start()
+
+        result = send_command(self.path, {'cmd': 'planning', 'auction_id': '1' * 32}, timeout=1)
+        self.assertEqual(result['status'], 'ok')
+
+    def test_stop_removes_socket(self):
+        self.daemon.stop()
+
+        self.assertFalse(os.path.exists(self.path))
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestWorkerDaemon))
+    return tests
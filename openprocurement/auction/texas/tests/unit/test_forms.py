@@ -2,12 +2,14 @@
 import unittest
 from uuid import uuid4
 
+import gevent
 import mock
 from munch import munchify
 from openprocurement.auction.texas.bids import BidsHandler
 
 from openprocurement.auction.texas.constants import MAIN_ROUND, PAUSE
 from openprocurement.auction.texas.forms import BidsForm, form_handler
+from openprocurement.auction.texas.utils import RoundState
 from openprocurement.auction.texas.tests.unit.utils import create_test_app
 
 
@@ -15,8 +17,6 @@ class TestFormValidation(unittest.TestCase):
 
     def setUp(self):
         self.bids_form = BidsForm()
-        self.auction_document = {}
-        self.bids_form.document = self.auction_document
 
         self.auction_data = {
             'amount': 100,
@@ -31,7 +31,6 @@ class TestFormValidation(unittest.TestCase):
         self.patch_app.start()
 
     def tearDown(self):
-        self.auction_document = {}
         self.patch_app.stop()
 
     def test_default_data_required_validators(self):
@@ -43,7 +42,7 @@ class TestFormValidation(unittest.TestCase):
         self.assertIn(('bidder_id', [u'No bidder id']), self.bids_form.errors.items())
 
     def test_bid_value_stage_error(self):
-        self.auction_document.update({
+        self.bids_form.round_state = RoundState.from_document({
             'current_stage': 0,
             'stages': [{'type': PAUSE, 'amount': self.auction_data['amount']}],
             'minimalStep': {'amount': self.auction_data['minimalStep']}
@@ -58,7 +57,7 @@ class TestFormValidation(unittest.TestCase):
         self.assertEqual({'bid': [u'Current stage does not allow bidding']}, self.bids_form.errors)
 
     def test_bid_value_too_low(self):
-        self.auction_document.update({
+        self.bids_form.round_state = RoundState.from_document({
             'current_stage': 0,
             'stages': [{'type': MAIN_ROUND, 'amount': self.auction_data['amount']}],
             'minimalStep': {'amount': self.auction_data['minimalStep']}
@@ -73,7 +72,7 @@ class TestFormValidation(unittest.TestCase):
         self.assertEqual({'bid': [u'Too low value']}, self.bids_form.errors)
 
     def test_bid_value_not_a_multiplier(self):
-        self.auction_document.update({
+        self.bids_form.round_state = RoundState.from_document({
             'current_stage': 0,
             'stages': [{'type': MAIN_ROUND, 'amount': self.auction_data['amount']}],
             'minimalStep': {'amount': self.auction_data['minimalStep']}
@@ -92,7 +91,7 @@ class TestFormValidation(unittest.TestCase):
         )
 
     def test_bid_value_success(self):
-        self.auction_document.update({
+        self.bids_form.round_state = RoundState.from_document({
             'current_stage': 0,
             'stages': [{'type': MAIN_ROUND, 'amount': self.auction_data['amount']}],
             'minimalStep': {'amount': self.auction_data['minimalStep']}
@@ -105,6 +104,28 @@ class TestFormValidation(unittest.TestCase):
         self.assertEqual(valid, True)
 
 
+    def test_round_state_rejects_without_lock(self):
+        self.bids_form.round_state = RoundState.from_document({
+            'current_stage': 0,
+            'stages': [{'type': MAIN_ROUND, 'amount': self.auction_data['amount']}],
+            'minimalStep': {'amount': self.auction_data['minimalStep']}
+        })
+        self.app.application.context['server_actions'].acquire()
+        self.bids_form.bidder_id.data = self.auction_data['bidder_id']
+
+        for bid, error in ((50, u'Too low value'),
+                           (142, u'Value should be a multiplier of a minimalStep amount (50)')):
+            self.bids_form.bid.data = bid
+
+            self.assertEqual(self.bids_form.validate(), False)
+            self.assertEqual({'bid': [error]}, self.bids_form.errors)
+
+        self.bids_form.bid.data = 150
+        self.assertEqual(self.bids_form.validate(), True)
+
+        self.app.application.context['server_actions'].release()
+
+
 class TestFormHandler(unittest.TestCase):
 
     def setUp(self):
@@ -144,9 +165,8 @@ class TestFormHandler(unittest.TestCase):
 
     def test_form_handler_success(self):
 
-        self.app.application.bids_handler.add_bid = mock.MagicMock(
-            return_value=True
-        )
+        self.app.application.bid_queue = mock.MagicMock()
+        self.app.application.bid_queue.submit.return_value = True
 
         magic_form = mock.MagicMock()
         magic_form.validate.return_value = True
@@ -161,9 +181,8 @@ class TestFormHandler(unittest.TestCase):
 
     def test_form_handler_error(self):
 
-        self.app.application.bids_handler.add_bid = mock.MagicMock(
-            return_value=Exception('Something went wrong :(')
-        )
+        self.app.application.bid_queue = mock.MagicMock()
+        self.app.application.bid_queue.submit.return_value = Exception('Something went wrong :(')
 
         magic_form = mock.MagicMock()
         magic_form.validate.return_value = True
@@ -191,14 +210,46 @@ class TestFormHandler(unittest.TestCase):
             'minimalStep': {'amount': self.auction_data['minimalStep']}
         })
         self.app.application.context['auction_document'] = self.auction_document
+        self.app.application.bids_handler.add_bid = mock.MagicMock(return_value=True)
         self.app.application.context['server_actions'].acquire()
         self.request.json = {'bidder_id': self.auction_data['bidder_id'], 'bid': 150}
 
+        def post_bid():
+            with self.app.application.test_request_context():
+                return self.app.application.form_handler()
+
+        greenlet = gevent.spawn(post_bid)
+        gevent.sleep(0)
+
+        # Bid waits in the queue until the lock is released
+        self.assertFalse(greenlet.ready())
+        self.assertEqual(self.app.application.bid_queue.stats['submitted'], 1)
+        self.app.application.context['server_actions'].release()
+
+        self.assertEqual(greenlet.get(timeout=1)['status'], 'ok')
+        self.app.application.bids_handler.add_bid.assert_called_once_with(0, {
+            'amount': 150, 'bidder_id': self.auction_data['bidder_id'], 'time': mock.ANY
+        })
+
+
+    def test_form_handler_uses_round_state(self):
+        self.app.application.context['auction_document'] = {
+            'current_stage': 0,
+            'stages': [{'type': MAIN_ROUND, 'amount': self.auction_data['amount']}],
+            'minimalStep': {'amount': self.auction_data['minimalStep']}
+        }
+        self.app.application.context['round_state'] = RoundState.from_document({
+            'current_stage': 2,
+            'stages': [{}, {}, {'type': PAUSE, 'amount': self.auction_data['amount']}],
+            'minimalStep': {'amount': self.auction_data['minimalStep']}
+        })
+        self.request.json = {'bidder_id': self.auction_data['bidder_id'], 'bid': 150}
+
         with self.app.application.test_request_context():
             res = self.app.application.form_handler()
 
         self.assertEqual(
-            res, {'status': 'failed', 'errors': {'bid': [u'Another bid is already processing']}}
+            res, {'status': 'failed', 'errors': {'bid': [u'Current stage does not allow bidding']}}
         )
 
 
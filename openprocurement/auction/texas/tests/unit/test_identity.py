@@ -0,0 +1,109 @@
+import unittest
+from datetime import datetime, timedelta
+
+import mock
+from dateutil.tz import tzlocal
+
+from openprocurement.auction.texas.identity import IdentityCache, get_bidder_id
+
+
+class TestIdentityCache(unittest.TestCase):
+
+    def setUp(self):
+        self.patch_time = mock.patch('openprocurement.auction.texas.identity.time')
+        self.mocked_time = self.patch_time.start()
+        self.mocked_time.time.return_value = 1000.0
+
+        self.cache = IdentityCache(size=2, ttl=60)
+        self.bidder_data = {
+            'bidder_id': 'bidder_id',
+            'expires': (datetime.now(tzlocal()) + timedelta(hours=1)).isoformat()
+        }
+
+    def tearDown(self):
+        self.patch_time.stop()
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get('token'))
+        self.cache.set('token', self.bidder_data)
+
+        self.assertIs(self.cache.get('token'), self.bidder_data)
+        self.assertEqual(self.cache.stats, {'hits': 1, 'misses': 1})
+
+    def test_ttl(self):
+        self.cache.set('token', self.bidder_data)
+
+        self.mocked_time.time.return_value = 1061.0
+
+        self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(self.cache.stats['misses'], 1)
+
+    def test_grant_expiration(self):
+        # Grant which ends in 4 minutes is kept only until re-login is required
+        self.bidder_data['expires'] = (datetime.now(tzlocal()) + timedelta(seconds=240)).isoformat()
+        self.cache.set('token', self.bidder_data)
+
+        self.mocked_time.time.return_value = 1011.0
+        self.assertIsNone(self.cache.get('token'))
+
+        self.bidder_data['expires'] = (datetime.now(tzlocal()) + timedelta(seconds=100)).isoformat()
+        self.cache.set('token', self.bidder_data)
+        self.assertIsNone(self.cache.get('token'))
+
+    def test_size_limit(self):
+        for token in ('first', 'second', 'third'):
+            self.cache.set(token, self.bidder_data)
+
+        self.assertIsNone(self.cache.get('first'))
+        self.assertIs(self.cache.get('third'), self.bidder_data)
+
+    def test_invalidate(self):
+        self.cache.set('token', self.bidder_data)
+
+        self.cache.invalidate('token')
+
+        self.assertIsNone(self.cache.get('token'))
+
+
+class TestGetBidderId(unittest.TestCase):
+
+    def setUp(self):
+        self.patch_resolve = mock.patch('openprocurement.auction.texas.identity.resolve_bidder_id')
+        self.mocked_resolve = self.patch_resolve.start()
+        self.mocked_resolve.return_value = {'bidder_id': 'bidder_id'}
+
+        self.app = mock.MagicMock()
+        self.app.identity_cache = IdentityCache()
+        self.session = {'remote_oauth': ['token', ''], 'client_id': 'client_id'}
+
+    def tearDown(self):
+        self.patch_resolve.stop()
+
+    def test_resolved_once(self):
+        for _ in range(3):
+            self.assertEqual(get_bidder_id(self.app, self.session), {'bidder_id': 'bidder_id'})
+
+        self.mocked_resolve.assert_called_once_with(self.app, self.session)
+        self.assertEqual(self.app.identity_cache.stats, {'hits': 2, 'misses': 1})
+
+    def test_failed_resolution_is_not_cached(self):
+        self.mocked_resolve.return_value = False
+
+        self.assertFalse(get_bidder_id(self.app, self.session))
+        self.assertFalse(get_bidder_id(self.app, self.session))
+
+        self.assertEqual(self.mocked_resolve.call_count, 2)
+
+    def test_session_without_client(self):
+        del self.session['client_id']
+
+        get_bidder_id(self.app, self.session)
+
+        self.assertEqual(self.app.identity_cache.stats, {'hits': 0, 'misses': 0})
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestIdentityCache))
+    tests.addTest(unittest.makeSuite(TestGetBidderId))
+    return tests
@@ -0,0 +1,60 @@
+import unittest
+
+from openprocurement.auction.texas.metrics import Histogram, MetricsWriter
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_observe(self):
+        histogram = Histogram(buckets=(0.1, 1))
+
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'get')
+
+        self.assertEqual(histogram.series, {'get': {'buckets': [2, 1, 1], 'count': 4, 'sum': 3.65}})
+
+    def test_time(self):
+        histogram = Histogram()
+
+        with self.assertRaises(KeyError):
+            with histogram.time('save'):
+                raise KeyError
+
+        self.assertEqual(histogram.series['save']['count'], 1)
+
+
+class TestMetricsWriter(unittest.TestCase):
+
+    def test_metric(self):
+        writer = MetricsWriter(prefix='test_')
+
+        writer.metric('clients', 'gauge', 'Connected clients', [([('bidder', 'a"b')], 2)])
+
+        self.assertEqual(writer.render(), (
+            '# HELP test_clients Connected clients\n'
+            '# TYPE test_clients gauge\n'
+            'test_clients{bidder="a\\"b"} 2.0\n'
+        ))
+
+    def test_histogram(self):
+        writer = MetricsWriter(prefix='test_')
+        histogram = Histogram(buckets=(0.1, 1))
+        histogram.observe(0.05, 'get')
+        histogram.observe(3, 'get')
+
+        writer.histogram('latency', 'Latency', histogram, 'operation')
+
+        self.assertEqual(writer.lines[2:], [
+            'test_latency_bucket{operation="get",le="0.1"} 1',
+            'test_latency_bucket{operation="get",le="1.0"} 1',
+            'test_latency_bucket{operation="get",le="+Inf"} 2',
+            'test_latency_count{operation="get"} 2',
+            'test_latency_sum{operation="get"} 3.05',
+        ])
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestHistogram))
+    tests.addTest(unittest.makeSuite(TestMetricsWriter))
+    return tests
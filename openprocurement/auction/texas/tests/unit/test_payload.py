@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import unittest
+
+import mock
+
+from openprocurement.auction.texas.payload import (
+    LazyPayload, SETTINGS, PAYLOAD_MAX_SIZE, configure_payload_logging
+)
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class TestLazyPayload(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('Test Lazy Payload')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.journal = ListHandler(logging.INFO)
+        self.console = ListHandler(logging.ERROR)
+        self.logger.addHandler(self.journal)
+        self.logger.addHandler(self.console)
+        self.serializer = mock.MagicMock(return_value='serialized payload')
+
+    def tearDown(self):
+        self.logger.removeHandler(self.journal)
+        self.logger.removeHandler(self.console)
+        configure_payload_logging({})
+
+    def test_serialized_once_when_emitted(self):
+        self.console.setLevel(logging.INFO)
+
+        self.logger.info('Data: %s', LazyPayload({'data': 1}, self.serializer))
+
+        self.serializer.assert_called_once_with({'data': 1})
+        self.assertEqual(self.journal.messages, ['Data: serialized payload'])
+        self.assertEqual(self.console.messages, ['Data: serialized payload'])
+
+    def test_not_serialized_when_dropped(self):
+        self.logger.debug('Data: %s', LazyPayload({'data': 1}, self.serializer))
+        self.journal.setLevel(logging.WARNING)
+        self.logger.info('Data: %s', LazyPayload({'data': 1}, self.serializer))
+
+        self.assertEqual(self.serializer.call_count, 0)
+
+    def test_size_cap(self):
+        configure_payload_logging({'max_size': 10})
+        text = 'x' * 20
+
+        self.logger.info('%s', LazyPayload(text, str))
+
+        self.assertEqual(self.journal.messages, ['{}... <truncated payload size=20 sha1={}>'.format(
+            'x' * 10, hashlib.sha1(text).hexdigest()
+        )])
+
+    def test_audit_payload_is_not_truncated(self):
+        configure_payload_logging({'max_size': 10, 'digest_only': True})
+        text = 'x' * 20
+
+        self.logger.info('%s', LazyPayload(text, str, audit=True))
+
+        self.assertEqual(self.journal.messages, [text])
+
+    def test_not_truncated_by_default(self):
+        text = 'x' * (128 * 1024)
+
+        self.logger.info('%s', LazyPayload(text, str))
+
+        self.assertEqual(self.journal.messages, [text])
+
+    def test_digest_only(self):
+        configure_payload_logging({'digest_only': True})
+
+        self.logger.info('%s', LazyPayload({'data': 1}))
+
+        self.assertEqual(self.journal.messages, ['<payload size=11 sha1={}>'.format(
+            hashlib.sha1(repr({'data': 1})).hexdigest()
+        )])
+
+    def test_unicode_payload(self):
+        self.logger.info('%s', LazyPayload(u'\u0442\u0435\u043a\u0441\u0442', lambda payload: payload))
+
+        self.assertEqual(self.journal.messages, [u'\u0442\u0435\u043a\u0441\u0442'.encode('utf-8')])
+
+    def test_configure_defaults(self):
+        configure_payload_logging({'max_size': 0, 'digest_only': True})
+        configure_payload_logging({})
+
+        self.assertEqual(SETTINGS, {'max_size': PAYLOAD_MAX_SIZE, 'digest_only': False})
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestLazyPayload))
+    return tests
@@ -0,0 +1,76 @@
+import unittest
+
+import yaml
+
+from openprocurement.auction.texas.protocol import ProtocolArtifact, ProtocolSerializer
+
+
+class TestProtocolArtifact(unittest.TestCase):
+
+    def setUp(self):
+        self.protocol = {
+            'id': '1' * 32,
+            'timeline': {'auction_start': {'time': '2018-01-01T12:00:00+02:00'}},
+            'bids': [{'bidder': '2' * 32, 'amount': 500.5}],
+        }
+
+    def test_serialized_protocol(self):
+        artifact = ProtocolArtifact(self.protocol)
+
+        self.assertEqual(yaml.safe_load(artifact.read()), self.protocol)
+        self.assertEqual(artifact.read(), yaml.safe_dump(self.protocol, default_flow_style=False))
+        self.assertEqual(artifact.size, len(artifact.read()))
+        self.assertEqual(str(artifact), artifact.read())
+
+    def test_read_is_repeatable(self):
+        artifact = ProtocolArtifact(self.protocol)
+
+        # Upload is retried with the same file object
+        self.assertEqual(artifact.read(), artifact.read())
+
+    def test_spooled_to_disk(self):
+        small = ProtocolArtifact(self.protocol, spool_size=1024)
+        large = ProtocolArtifact({'bids': [dict(self.protocol['bids'][0]) for _ in range(100)]}, spool_size=1024)
+
+        self.assertFalse(small._file._rolled)
+        self.assertTrue(large._file._rolled)
+        self.assertEqual(len(yaml.safe_load(large.read())['bids']), 100)
+
+
+class TestProtocolSerializer(unittest.TestCase):
+
+    def setUp(self):
+        self.serializer = ProtocolSerializer(cache_size=2)
+        self.protocol = {'id': '1' * 32, 'bids': []}
+
+    def test_equal_protocol_reused(self):
+        artifact = self.serializer.serialize(self.protocol)
+
+        self.assertIs(self.serializer.serialize(dict(self.protocol)), artifact)
+        self.assertIs(self.serializer.serialize(artifact), artifact)
+        self.assertEqual(self.serializer.stats, {'serialized': 1, 'reused': 1})
+
+    def test_changed_protocol_serialized_again(self):
+        artifact = self.serializer.serialize(self.protocol)
+        self.protocol['bids'].append({'bidder': '2' * 32})
+
+        changed = self.serializer.serialize(self.protocol)
+
+        self.assertIsNot(changed, artifact)
+        self.assertEqual(yaml.safe_load(changed.read()), self.protocol)
+        self.assertEqual(yaml.safe_load(artifact.read())['bids'], [])
+
+    def test_cache_size(self):
+        for index in range(3):
+            self.serializer.serialize({'id': index})
+
+        self.serializer.serialize({'id': 0})
+
+        self.assertEqual(self.serializer.stats, {'serialized': 4, 'reused': 0})
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestProtocolArtifact))
+    tests.addTest(unittest.makeSuite(TestProtocolSerializer))
+    return tests
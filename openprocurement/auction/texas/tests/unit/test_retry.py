@@ -0,0 +1,84 @@
+import unittest
+
+import mock
+
+from openprocurement.auction.texas.retry import CircuitBreaker, RetryPolicy
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_exponential_delays(self):
+        policy = RetryPolicy(attempts=6, base_delay=0.5, max_delay=3, jitter=False)
+
+        self.assertEqual(list(policy.delays()), [0.5, 1.0, 2.0, 3, 3])
+
+    def test_jitter(self):
+        policy = RetryPolicy(attempts=50, base_delay=0.1, max_delay=1, budget=1000, seed=1)
+
+        delays = list(policy.delays())
+
+        self.assertEqual(len(delays), 49)
+        for retry, delay in enumerate(delays):
+            self.assertTrue(0 <= delay <= min(1, 0.1 * 2 ** retry))
+        self.assertGreater(len(set(delays)), 1)
+
+    @mock.patch('openprocurement.auction.texas.retry.time')
+    def test_budget(self, mocked_time):
+        mocked_time.time.side_effect = [100, 100, 101, 103]
+        policy = RetryPolicy(base_delay=1, jitter=False, budget=5)
+
+        self.assertEqual(list(policy.delays()), [1, 2])
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.patch_time = mock.patch('openprocurement.auction.texas.retry.time')
+        self.mocked_time = self.patch_time.start()
+        self.mocked_time.time.return_value = 100
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    def tearDown(self):
+        self.patch_time.stop()
+
+    def test_opens_after_failures_in_row(self):
+        self.assertFalse(self.breaker.record_failure())
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.record_failure())
+        self.assertTrue(self.breaker.record_failure())
+
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.stats, {'state': 'open', 'failures': 2, 'opened': 1, 'refused': 1})
+
+    def test_trial_request(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        self.mocked_time.time.return_value = 110
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.stats['state'], 'half-open')
+        # Only one trial request at a time
+        self.assertFalse(self.breaker.allow())
+
+        self.assertTrue(self.breaker.record_failure())
+        self.assertEqual(self.breaker.stats['opened'], 2)
+
+        self.mocked_time.time.return_value = 120
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.record_success())
+        self.assertEqual(self.breaker.stats['state'], 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_disabled(self):
+        breaker = CircuitBreaker(failure_threshold=0)
+
+        for _ in range(100):
+            self.assertFalse(breaker.record_failure())
+        self.assertTrue(breaker.allow())
+
+
+def suite():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.makeSuite(TestRetryPolicy))
+    tests.addTest(unittest.makeSuite(TestCircuitBreaker))
+    return tests
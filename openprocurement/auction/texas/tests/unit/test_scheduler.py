@@ -1,14 +1,22 @@
 import unittest
+import gevent
 import mock
 from copy import deepcopy
+from datetime import datetime, timedelta
 
+from apscheduler.events import JobExecutionEvent, JobSubmissionEvent, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+from pytz import utc
 
 from openprocurement.auction.texas.constants import (
     DEADLINE_HOUR,
     END,
     PREANNOUNCEMENT
 )
-from openprocurement.auction.texas.scheduler import JobService
+from openprocurement.auction.texas.journal import (
+    AUCTION_WORKER_SERVICE_JOB_EXECUTED,
+    AUCTION_WORKER_SERVICE_JOB_MISSED
+)
+from openprocurement.auction.texas.scheduler import JobMonitor, JobService, TimeWarpScheduler
 
 
 class MutableMagickMock(mock.MagicMock):
@@ -92,6 +100,173 @@ class TestPauseJob(TestScheduler):
         )
 
 
+class TestStartAuctionJob(TestScheduler):
+
+    def test_add_start_auction_job(self):
+        job_start_date = 'start_date'
+        start_auction = mock.MagicMock()
+
+        self.job_service.add_start_auction_job(start_auction, job_start_date)
+
+        self.assertEqual(self.mocked_SCHEDULER.add_job.call_count, 1)
+        self.mocked_SCHEDULER.add_job.assert_called_with(
+            start_auction,
+            'date',
+            run_date=job_start_date,
+            name='Start of Auction',
+            id='auction:start'
+        )
+
+
+class TestSharedScheduler(TestScheduler):
+
+    def setUp(self):
+        super(TestSharedScheduler, self).setUp()
+        self.scheduler = mock.MagicMock()
+        self.job_service = JobService(scheduler=self.scheduler, job_prefix='auction:' + '1' * 32)
+
+    def test_add_pause_job_with_prefix(self):
+        self.job_service.add_pause_job('start_date')
+
+        self.assertEqual(self.mocked_SCHEDULER.add_job.call_count, 0)
+        self.assertEqual(self.scheduler.add_job.call_count, 1)
+        self.assertEqual(self.scheduler.add_job.call_args[1]['id'], 'auction:{}:pause'.format('1' * 32))
+
+    def test_remove_jobs(self):
+        scheduler = TimeWarpScheduler(timezone='UTC')
+        other_service = JobService(scheduler=scheduler, job_prefix='auction:' + '2' * 32)
+        self.job_service = JobService(scheduler=scheduler, job_prefix='auction:' + '1' * 32)
+        for job_service in (self.job_service, other_service):
+            job_service.add_pause_job(datetime(2018, 1, 1, 12))
+            job_service.add_ending_main_round_job(datetime(2018, 1, 1, 13))
+
+        self.job_service.remove_jobs()
+
+        self.assertEqual(
+            sorted(job.id for job in scheduler.get_jobs()),
+            ['auction:{}:{}'.format('2' * 32, name) for name in (END, 'pause')]
+        )
+
+
+class TestRescheduleJobs(TestScheduler):
+
+    def setUp(self):
+        super(TestRescheduleJobs, self).setUp()
+        self.scheduler = TimeWarpScheduler(timezone='UTC')
+        self.scheduler.add_job = mock.MagicMock(wraps=self.scheduler.add_job)
+        self.job_service = JobService(scheduler=self.scheduler)
+        self.run_date = datetime(2018, 1, 1, 12)
+
+    def next_run_time(self, name):
+        return self.scheduler.get_job('auction:{}'.format(name)).next_run_time.replace(tzinfo=None)
+
+    def test_pending_job_is_moved(self):
+        self.job_service.add_pause_job(self.run_date)
+        job = self.scheduler.get_job('auction:pause')
+
+        self.job_service.add_pause_job(self.run_date + timedelta(minutes=2))
+
+        self.assertEqual(self.scheduler.add_job.call_count, 1)
+        self.assertIs(self.scheduler.get_job('auction:pause'), job)
+        self.assertEqual(self.next_run_time('pause'), self.run_date + timedelta(minutes=2))
+
+    def test_executed_job_is_added_again(self):
+        self.job_service.add_ending_main_round_job(self.run_date)
+        self.scheduler.remove_job('auction:{}'.format(END))
+
+        self.job_service.add_ending_main_round_job(self.run_date + timedelta(minutes=2))
+
+        self.assertEqual(self.scheduler.add_job.call_count, 2)
+        self.assertEqual(
+            self.scheduler.get_job('auction:{}'.format(END)).trigger.run_date.replace(tzinfo=None),
+            self.run_date + timedelta(minutes=2)
+        )
+
+    def test_remove_job(self):
+        self.job_service.add_pause_job(self.run_date)
+        self.job_service.add_ending_main_round_job(self.run_date)
+
+        self.job_service.remove_job('pause')
+        self.job_service.remove_job('pause')
+
+        self.assertEqual([job.id for job in self.scheduler.get_jobs()], ['auction:{}'.format(END)])
+
+
+class TestJobMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.patch_logger = mock.patch('openprocurement.auction.texas.scheduler.LOGGER')
+        self.mocked_logger = self.patch_logger.start()
+        self.monitor = JobMonitor(lag_warning=1.0)
+        self.job_id = 'auction:{}:pause'.format('1' * 32)
+
+    def tearDown(self):
+        self.patch_logger.stop()
+
+    def run_job(self, lag, exception=None):
+        planned = datetime.now(utc) - timedelta(seconds=lag)
+        self.monitor.on_submitted(JobSubmissionEvent(EVENT_JOB_SUBMITTED, self.job_id, None, [planned]))
+        self.monitor.on_executed(JobExecutionEvent(0, self.job_id, None, planned, exception=exception))
+        return planned
+
+    def test_executed_job(self):
+        planned = self.run_job(lag=0.5)
+
+        stats = self.monitor.stats['pause']
+        self.assertEqual(stats['runs'], 1)
+        self.assertEqual(stats['errors'], 0)
+        self.assertAlmostEqual(stats['lag_last'], 0.5, delta=0.1)
+        self.assertEqual(stats['lag_max'], stats['lag_last'])
+        self.assertGreaterEqual(stats['duration_last'], 0)
+
+        self.assertEqual(self.mocked_logger.info.call_count, 1)
+        extra = self.mocked_logger.info.call_args[1]['extra']
+        self.assertEqual(extra['MESSAGE_ID'], AUCTION_WORKER_SERVICE_JOB_EXECUTED)
+        self.assertEqual(extra['JOURNAL_JOB_ID'], self.job_id)
+        self.assertEqual(extra['JOURNAL_JOB_PLANNED_TIME'], planned.isoformat())
+        self.assertFalse(extra['JOURNAL_JOB_FAILED'])
+        self.assertEqual(self.monitor._fired, {})
+
+    def test_late_and_failed_jobs(self):
+        self.run_job(lag=0.2)
+        self.run_job(lag=3, exception=KeyError('stages'))
+
+        stats = self.monitor.stats['pause']
+        self.assertEqual(stats['runs'], 2)
+        self.assertEqual(stats['errors'], 1)
+        self.assertAlmostEqual(stats['lag_max'], 3, delta=0.1)
+        self.assertAlmostEqual(stats['lag_total'], 3.2, delta=0.2)
+        self.assertEqual(self.mocked_logger.warning.call_count, 1)
+        self.assertTrue(self.mocked_logger.warning.call_args[1]['extra']['JOURNAL_JOB_FAILED'])
+
+    def test_missed_job(self):
+        planned = datetime.now(utc) - timedelta(seconds=200)
+
+        self.monitor.on_missed(JobExecutionEvent(EVENT_JOB_MISSED, self.job_id, None, planned))
+
+        self.assertEqual(self.monitor.stats['pause']['misfires'], 1)
+        self.assertEqual(self.monitor.stats['pause']['runs'], 0)
+        extra = self.mocked_logger.error.call_args[1]['extra']
+        self.assertEqual(extra['MESSAGE_ID'], AUCTION_WORKER_SERVICE_JOB_MISSED)
+        self.assertEqual(extra['JOURNAL_JOB_ID'], self.job_id)
+
+    def test_installed_to_scheduler(self):
+        scheduler = TimeWarpScheduler(timezone=utc)
+        self.monitor.install(scheduler)
+        job_service = JobService(scheduler=scheduler)
+        job_service.switch_to_next_stage = mock.MagicMock()
+        scheduler.start()
+        try:
+            job_service.add_pause_job(datetime.now(utc))
+            gevent.sleep(0.1)
+        finally:
+            scheduler.shutdown(wait=False)
+
+        self.assertEqual(job_service.switch_to_next_stage.call_count, 1)
+        self.assertEqual(self.monitor.stats['pause']['runs'], 1)
+        self.assertLess(self.monitor.stats['pause']['lag_last'], 1)
+
+
 class TestSwitchToNextStage(TestScheduler):
 
     def test_switch_to_next_stage(self):
@@ -147,11 +322,11 @@ class TestEndAuction(TestScheduler):
         self.end_stage = {'end': 'stage'}
         self.mocked_prepare_end_stage.return_value = self.end_stage
 
-        self.patch_yaml_dump = mock.patch(
-            'openprocurement.auction.texas.scheduler.yaml_dump'
+        self.patch_serialize_protocol = mock.patch(
+            'openprocurement.auction.texas.scheduler.serialize_protocol'
         )
-        self.mocked_yaml_dump = self.patch_yaml_dump.start()
-        self.mocked_yaml_dump.return_value = 'yaml dump'
+        self.mocked_serialize_protocol = self.patch_serialize_protocol.start()
+        self.mocked_serialize_protocol.return_value = 'yaml dump'
 
         self.auction_document = {
             'stages': [],
@@ -165,7 +340,7 @@ class TestEndAuction(TestScheduler):
         self.job_service.datasource.update_source_object.return_value = None
 
         self.patch_datetime = mock.patch(
-            'openprocurement.auction.texas.scheduler.datetime'
+            'openprocurement.auction.texas.scheduler.clock'
         )
         self.mocked_datetime = self.patch_datetime.start()
         now = mock.MagicMock()
@@ -1,11 +1,17 @@
 import json
 import unittest
 from openprocurement.auction.texas.tests.unit.utils import create_test_app
+from openprocurement.auction.texas.database import IDatabase, MEMORY_STORES, prepare_database
+from openprocurement.auction.texas.router import AuctionsRouter
+from openprocurement.auction.texas.utils import RoundState
 
-from flask import session
+from flask import Flask, session, request
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse
 from datetime import datetime, timedelta
 from dateutil.tz import tzlocal
-from mock import patch
+from mock import MagicMock, patch
+from zope.interface.registry import Components
 
 
 class TestFlaskApp(unittest.TestCase):
@@ -268,8 +274,95 @@ class TestFlaskApp(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(json.loads(res.data)['status'], 'ok')
 
+    def test_server_scheduler_metrics(self):
+        stats = {'pause': {'runs': 1, 'misfires': 0}}
+        with patch('openprocurement.auction.texas.views.SCHEDULER_MONITOR') as monitor:
+            monitor.stats = stats
+            res = self.app.get('/metrics/scheduler')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data), stats)
+
+
+    def test_server_metrics(self):
+        self.app.application.context['round_state'] = RoundState(2, 'english', 100, 10, 10)
+        self.app.application.context['auction_doc_id'] = '1' * 32
+        database = prepare_database({'type': 'memory', 'name': 'metrics'})
+        self.addCleanup(MEMORY_STORES.clear)
+        database.save_auction_document({'_id': '1' * 32, 'current_stage': 2}, '1' * 32)
+        registry = Components()
+        registry.registerUtility(database, IDatabase)
+        self.app.application.gsm = registry
+        self.app.application.bid_queue.reject('Too low value')
+
+        res = self.app.get('/metrics')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.content_type.startswith('text/plain; version=0.0.4'))
+        lines = res.data.splitlines()
+        self.assertIn('auction_texas_current_stage 2.0', lines)
+        self.assertIn('auction_texas_document_size_bytes 104.0', lines)
+        self.assertIn('auction_texas_bids_rejected_total{reason="Too low value"} 1.0', lines)
+        self.assertIn('# TYPE auction_texas_bid_commit_seconds histogram', lines)
+
+    def test_server_database_metrics(self):
+        database = prepare_database({'type': 'memory', 'name': 'metrics', 'failure_rate': 1, 'seed': 1,
+                                     'retry': {'get': {'attempts': 2, 'base_delay': 0}}})
+        self.addCleanup(MEMORY_STORES.clear)
+        registry = Components()
+        registry.registerUtility(database, IDatabase)
+        self.app.application.gsm = registry
+        database.get_auction_document('1' * 32)
+
+        lines = self.app.get('/metrics').data.splitlines()
+
+        self.assertIn('auction_texas_couchdb_retries_total{operation="get"} 1.0', lines)
+        self.assertIn('auction_texas_couchdb_retries_exhausted_total{operation="get"} 1.0', lines)
+        self.assertIn('auction_texas_couchdb_circuit_state{state="closed"} 1.0', lines)
+        self.assertIn('auction_texas_couchdb_circuit_opened_total 0.0', lines)
+
+
+class TestAuctionsRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = AuctionsRouter()
+        for auction_doc_id in ('1' * 32, '2' * 32):
+            app = Flask(auction_doc_id)
+            app.add_url_rule(
+                '/health', 'health',
+                lambda auction_doc_id=auction_doc_id: json.dumps(
+                    {'auction': auction_doc_id, 'script_root': request.script_root}
+                )
+            )
+            self.router.mount(auction_doc_id, app)
+        self.client = Client(self.router, BaseResponse)
+
+    def test_dispatch_by_auction_doc_id(self):
+        for auction_doc_id in ('1' * 32, '2' * 32):
+            res = self.client.get('/{}/health'.format(auction_doc_id))
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(
+                json.loads(res.data),
+                {'auction': auction_doc_id, 'script_root': '/{}'.format(auction_doc_id)}
+            )
+
+    def test_unknown_auction(self):
+        res = self.client.get('/{}/health'.format('3' * 32))
+        self.assertEqual(res.status_code, 404)
+
+    def test_stop_mounted_app(self):
+        service = MagicMock()
+        mounted = self.router.mount('3' * 32, Flask('3' * 32), services=[service])
+
+        mounted.stop()
+
+        self.assertEqual(service.stop.call_count, 1)
+        self.assertNotIn('3' * 32, self.router.apps)
+        self.assertEqual(self.client.get('/{}/health'.format('3' * 32)).status_code, 404)
+        self.assertEqual(self.client.get('/{}/health'.format('1' * 32)).status_code, 200)
+
 
 def suite():
     tests = unittest.TestSuite()
     tests.addTest(unittest.makeSuite(TestFlaskApp))
+    tests.addTest(unittest.makeSuite(TestAuctionsRouter))
     return tests
@@ -27,7 +27,9 @@ from openprocurement.auction.texas.utils import (
     approve_auction_protocol_info_on_announcement,
     approve_auction_protocol_info_on_bids_stage,
     set_absolute_deadline,
-    set_relative_deadline)
+    set_relative_deadline,
+    update_auction_document,
+    RoundState)
 
 
 class TestPrepareResultStage(unittest.TestCase):
@@ -520,7 +522,7 @@ class TestApproveAuctionProtocolInfoAnnouncement(unittest.TestCase):
 
         }
 
-        self.patch_datetime = mock.patch('openprocurement.auction.texas.utils.datetime')
+        self.patch_datetime = mock.patch('openprocurement.auction.texas.utils.clock')
         self.mocked_datetime = self.patch_datetime.start()
 
         # Mock isoformat function of object that returned by datetime.now()
@@ -692,6 +694,42 @@ class TestSetRelativeDeadline(BaseDeadlineTest):
         )
 
 
+class TestUpdateAuctionDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.context = prepare_context({'type': 'dict'})
+        self.context['auction_doc_id'] = '1' * 32
+        self.context['auction_document'] = {
+            'current_stage': 0,
+            'stages': [{'type': PAUSE}, {'type': MAIN_ROUND, 'amount': 150}],
+            'minimalStep': {'amount': 50}
+        }
+        self.database = mock.MagicMock()
+
+    def test_round_state_updated_on_commit(self):
+        with update_auction_document(self.context, self.database) as auction_document:
+            auction_document['current_stage'] = 1
+
+        self.database.save_auction_document.assert_called_once_with(auction_document, '1' * 32)
+        self.assertEqual(self.context['round_state'], RoundState(1, MAIN_ROUND, 150, 50, 50))
+
+    def test_round_state_not_updated_on_error(self):
+        with self.assertRaises(ValueError):
+            with update_auction_document(self.context, self.database) as auction_document:
+                auction_document['current_stage'] = 1
+                raise ValueError
+
+        self.assertEqual(self.context['round_state'], RoundState(0, PAUSE, None, 50, 50))
+
+    def test_round_state_updated_on_direct_assignment(self):
+        auction_document = self.context['auction_document']
+        auction_document['current_stage'] = 1
+
+        self.context['auction_document'] = auction_document
+
+        self.assertEqual(self.context['round_state'], RoundState(1, MAIN_ROUND, 150, 50, 50))
+
+
 def suite():
     suite = unittest.TestSuite()
 
@@ -72,6 +72,7 @@ def create_test_app():
     worker_app.gsm = getGlobalSiteManager()
     worker_app.context = worker_app.gsm.queryUtility(IContext)
     worker_app.context['bidders_data'] = tender_data['data']['bids']
+    worker_app.context['bidders_index'] = frozenset(bid['id'] for bid in tender_data['data']['bids'])
     worker_app.context['auction_document'] = {}
 
     worker_app.remote_oauth.authorized_response.side_effect = [None, {
@@ -90,8 +91,7 @@ def create_test_app():
     }
     worker_app.auction_bidders = {
         u'f7c8cd1d56624477af8dc3aa9c4b3ea3': {
-            'clients': {},
-            'channels': {}
+            'clients': {}
         }}
 
     # Register views
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import iso8601
 
+from collections import namedtuple
 from contextlib import contextmanager
 from datetime import datetime, time, timedelta
 from decimal import Decimal
@@ -8,6 +9,7 @@ from decimal import Decimal
 from openprocurement.auction.worker_core.constants import TIMEZONE
 from openprocurement.auction.worker_core.utils import prepare_service_stage
 
+from openprocurement.auction.texas import clock
 from openprocurement.auction.texas.constants import (
     PAUSE_DURATION, END, MAIN_ROUND, PAUSE, ROUND_DURATION
 )
@@ -27,7 +29,7 @@ def prepare_results_stage(bidder_id="", bidder_name="", amount="", time=""):
     return stage
 
 
-def prepare_auction_stages(stage_start, auction_data, deadline, fast_forward=False):
+def prepare_auction_stages(stage_start, auction_data, deadline):
     pause_stage = prepare_service_stage(
         start=stage_start.isoformat(), type=PAUSE
     )
@@ -114,19 +116,51 @@ def open_bidders_name(auction_document, bids_information):
     return auction_document
 
 
+class RoundState(namedtuple('RoundState', [
+        'stage_id', 'stage_type', 'amount', 'minimal_step', 'quantized_step'])):
+    """
+    Part of auction document needed for bid validation. It is immutable, so
+    it is read from context without copying.
+
+    quantized_step is minimal_step as Decimal quantized to cents.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_document(cls, document):
+        stage_id = max(document.get('current_stage', 0), 0)
+        stages = document.get('stages', [])
+        stage = stages[stage_id] if stage_id < len(stages) else {}
+        if not isinstance(stage, dict):
+            stage = {}
+        minimal_step = document.get('minimalStep', {}).get('amount', 0)
+        return cls(
+            stage_id,
+            stage.get('type'),
+            stage.get('amount'),
+            minimal_step,
+            Decimal(minimal_step).quantize(Decimal('0.01'))
+        )
+
+
 @contextmanager
 def update_auction_document(context, database):
     auction_document = context['auction_document']
     yield auction_document
     database.save_auction_document(auction_document, context['auction_doc_id'])
     context['auction_document'] = auction_document
+    feed = context.get('document_feed')
+    if feed is not None:
+        feed.schedule(auction_document)
 
 
 @contextmanager
 def lock_server(semaphore):
     semaphore.acquire()
-    yield
-    semaphore.release()
+    try:
+        yield
+    finally:
+        semaphore.release()
 
 
 def convert_datetime(datetime_stamp):
@@ -178,7 +212,7 @@ def approve_auction_protocol_info_on_bids_stage(auction_document, auction_protoc
 
 def approve_auction_protocol_info_on_announcement(auction_document, auction_protocol, approved=None):
     auction_protocol['timeline']['results'] = {
-        "time": datetime.now(TIMEZONE).isoformat(),
+        "time": clock.now(TIMEZONE).isoformat(),
         "bids": []
     }
 
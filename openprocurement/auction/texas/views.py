@@ -1,48 +1,45 @@
 # -*- coding: utf-8 -*-
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from urlparse import urljoin
 
 import iso8601
 from dateutil.tz import tzlocal
 from flask import (
-    current_app as app, request, jsonify, url_for, session, abort, redirect
+    current_app as app, request, jsonify, url_for, session, abort, redirect, Response
 )
 
-from openprocurement.auction.event_source import (
-    send_event, send_event_to_client, remove_client,
-)
-from openprocurement.auction.utils import (
-    prepare_extra_journal_fields, get_bidder_id
-)
-
-INVALIDATE_GRANT = timedelta(0, 230)
+from openprocurement.auction.utils import prepare_extra_journal_fields
+from openprocurement.auction.texas.collectors import render_metrics
+from openprocurement.auction.texas.constants import INVALIDATE_GRANT
+from openprocurement.auction.texas.identity import get_bidder_id
+from openprocurement.auction.texas.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from openprocurement.auction.texas.scheduler import SCHEDULER_MONITOR
 
 
 def login():
     if 'bidder_id' in request.args and 'hash' in request.args:
-        for bidder_info in app.context['bidders_data']:
-            if bidder_info['id'] == request.args['bidder_id']:
-                next_url = request.args.get('next') or request.referrer or None
-                if 'X-Forwarded-Path' in request.headers:
-                    callback_url = urljoin(
-                        request.headers['X-Forwarded-Path'],
-                        'authorized'
-                    )
-                else:
-                    callback_url = url_for('authorized', next=next_url, _external=True)
-                response = app.remote_oauth.authorize(
-                    callback=callback_url,
-                    bidder_id=request.args['bidder_id'],
-                    hash=request.args['hash']
+        if request.args['bidder_id'] in app.context['bidders_index']:
+            next_url = request.args.get('next') or request.referrer or None
+            if 'X-Forwarded-Path' in request.headers:
+                callback_url = urljoin(
+                    request.headers['X-Forwarded-Path'],
+                    'authorized'
                 )
-                if 'return_url' in request.args:
-                    session['return_url'] = request.args['return_url']
-                session['login_bidder_id'] = request.args['bidder_id']
-                session['login_hash'] = request.args['hash']
-                session['login_callback'] = callback_url
-                app.logger.debug("Session: {}".format(repr(session)))
-                return response
+            else:
+                callback_url = url_for('authorized', next=next_url, _external=True)
+            response = app.remote_oauth.authorize(
+                callback=callback_url,
+                bidder_id=request.args['bidder_id'],
+                hash=request.args['hash']
+            )
+            if 'return_url' in request.args:
+                session['return_url'] = request.args['return_url']
+            session['login_bidder_id'] = request.args['bidder_id']
+            session['login_hash'] = request.args['hash']
+            session['login_callback'] = callback_url
+            app.logger.debug("Session: {}".format(repr(session)))
+            return response
     return abort(401)
 
 
@@ -50,6 +47,14 @@ def health():
     return jsonify({'health': 'check'})
 
 
+def scheduler_metrics():
+    return jsonify(SCHEDULER_MONITOR.stats)
+
+
+def metrics():
+    return Response(render_metrics(app), content_type=METRICS_CONTENT_TYPE)
+
+
 def authorized():
     if not('error' in request.args and request.args['error'] == 'access_denied'):
         resp = app.remote_oauth.authorized_response()
@@ -126,11 +131,13 @@ def logout():
     if 'remote_oauth' in session and 'client_id' in session:
         bidder_data = get_bidder_id(app, session)
         if bidder_data:
-            remove_client(bidder_data['bidder_id'], session['client_id'])
-            send_event(
-                bidder_data['bidder_id'],
+            app.auction_bidders[bidder_data['bidder_id']]["clients"].pop(session['client_id'], None)
+            app.identity_cache.invalidate(tuple(session['remote_oauth']))
+            app.broadcast_bus.unsubscribe(bidder_data['bidder_id'], session['client_id'])
+            app.broadcast_bus.publish(
+                "ClientsList",
                 app.auction_bidders[bidder_data['bidder_id']]["clients"],
-                "ClientsList"
+                bidder_id=bidder_data['bidder_id']
             )
     session.clear()
     return redirect(
@@ -160,10 +167,10 @@ def kickclient():
             if bidder_data:
                 data['bidder_id'] = bidder_data['bidder_id']
                 if 'client_id' in data:
-                    send_event_to_client(
-                        data['bidder_id'], data['client_id'], {
+                    app.broadcast_bus.send(
+                        data['bidder_id'], data['client_id'], "KickClient", {
                             "from": session['client_id']
-                        }, "KickClient"
+                        }
                     )
                     return jsonify({"status": "ok"})
     abort(401)
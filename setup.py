@@ -31,6 +31,9 @@ ENTRY_POINTS = {
     'openprocurement.auction.robottests': [
         'texas = openprocurement.auction.texas.tests.functional.main:includeme'
     ],
+    'openprocurement.auction.texas.context': [
+        'snapshot = openprocurement.auction.texas.context:snapshot_context'
+    ],
 }
 
 setup(name='openprocurement.auction.texas',